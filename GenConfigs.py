@@ -1,12 +1,29 @@
-from os.path import join
+import os
+from os.path import abspath, dirname, join
 
-FAAS_ROOT="/lhome/trulsas/faas-profiler"
+#: Root of the checkout. Defaults to the directory of this file and
+#: can be overridden with the FAAS_ROOT environment variable.
+FAAS_ROOT = os.environ.get("FAAS_ROOT", dirname(abspath(__file__)))
 WORKLOAD_SPECS=join(FAAS_ROOT, "specs", "workloads")
 #FAAS_ROOT="/home/truls/uni/phd/faas-profiler"
 WSK_PATH = "wsk"
 OPENWHISK_PATH = "/lhome/trulsas/openwhisk"
 
-#: Location of output data
-DATA_DIR = join(FAAS_ROOT, "..", "profiler_results")
+#: Location of output data. Can be overridden with the FAAS_DATA_DIR
+#: environment variable.
+DATA_DIR = os.environ.get("FAAS_DATA_DIR", join(FAAS_ROOT, "..", "profiler_results"))
 
 SYSTEM_CPU_SET = "0,2,4,6,8,10,12,14,16,18,20,22,24,26,28,30"
+
+#: CPUs that the worker processes of a sharded invoker are pinned
+#: to. Must not overlap with SYSTEM_CPU_SET.
+INVOKER_CPU_SET = "1,3,5,7"
+
+#: Directory of compiled schedules and the maximum size (in bytes)
+#: they may take up before the least recently used are removed
+SCHEDULE_CACHE_DIR = join(DATA_DIR, "schedule_cache")
+SCHEDULE_CACHE_SIZE = 10 * 1024**3
+
+#: Location of the local copy of the activation records used by the
+#: analyzers
+ACTIVATION_STORE_DIR = join(DATA_DIR, "activation_store")
@@ -17,6 +17,9 @@ def ScriptLogger(loggername, logfile):
     # create logger
     logger = logging.getLogger(loggername)
     logger.setLevel(logging.DEBUG)
+    # Loggers are global, only add the handlers the first time
+    if logger.handlers:
+        return logger
     # create file handler which logs even debug messages
     lfh = logging.FileHandler(
         os.path.join(
@@ -1,7 +1,9 @@
+import functools
 import os
 import random
 import time
 import subprocess
+from typing import Dict, List, Optional
 
 from GenConfigs import *
 
@@ -9,7 +11,7 @@ def ensure_directory_exists(d: str) -> str:
     if not os.path.isdir(d):
         if os.path.exists(d):
             raise Exception("Path %s exists but is not a directory" % d)
-        os.mkdir(d)
+        os.makedirs(d)
     return d
 
 def gen_random_hex_string(l: int) -> str:
@@ -25,6 +27,80 @@ def get_suite_metadata_file(suiteid: str) -> str:
             os.path.join(DATA_DIR, "suite_%s" % suiteid)),
         "metadata.json")
 
+def parse_cpu_set(cpuset: str) -> List[int]:
+    """Parses a CPU list in taskset format, e.g. "0,2,4-7", into a list
+    of CPU numbers.
+    """
+    cpus: List[int] = []
+    for part in cpuset.split(","):
+        part = part.strip()
+        if "-" in part:
+            (first, last) = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
 def set_cpu_affinity(cpuset: str) -> None:
     subprocess.check_output(["taskset", "-p", "-c", cpuset, f"{os.getpid()}"])
     print(f"Set CPU affinity to {cpuset}")
+
+@functools.lru_cache(maxsize=None)
+def read_wsk_properties(path: Optional[str] = None) -> Dict[str, str]:
+    """Reads the properties file of the wsk CLI (WSK_CONFIG_FILE or
+    ~/.wskprops) and returns its API host, auth key and namespace. The
+    file is parsed once per process.
+    """
+    if path is None:
+        path = os.environ.get("WSK_CONFIG_FILE",
+                              os.path.join(os.path.expanduser("~"), ".wskprops"))
+    props: Dict[str, str] = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    (key, value) = line.split("=", 1)
+                    props[key.strip()] = value.strip()
+    except OSError as e:
+        raise Exception("Cannot read wsk properties file %s: %s" % (path, e))
+
+    for key in ["APIHOST", "AUTH"]:
+        if key not in props:
+            raise Exception("No %s property in %s" % (key, path))
+
+    return {'apihost': props["APIHOST"],
+            'auth': props["AUTH"],
+            'namespace': props.get("NAMESPACE", "_")}
+
+@functools.lru_cache(maxsize=None)
+def git_commit_hash(repo: str) -> str:
+    """Returns the commit hash of HEAD of a git repository. HEAD is
+    resolved from the files in the .git directory, and git is only
+    run if that fails. Returns "unknown" if repo is not a git
+    checkout. The result is cached per process.
+    """
+    git_dir = os.path.join(repo, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r") as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[5:]
+        ref_file = os.path.join(git_dir, ref)
+        if os.path.exists(ref_file):
+            with open(ref_file, "r") as f:
+                return f.read().strip()
+        with open(os.path.join(git_dir, "packed-refs"), "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=repo,
+                                      stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return out.decode("utf-8").strip()
@@ -16,6 +16,7 @@ import sys
 # Local
 from GenConfigs import *
 from commons.Logger import ScriptLogger
+from workload_analyzer.ActivationStore import ActivationStore
 
 logger = ScriptLogger(loggername='comparative_analyzer', logfile='CA.log')
 archive_folder = FAAS_ROOT + "/data_archive/"
@@ -38,7 +39,7 @@ def ComparativePlotting(t_df, p_df_dic):
     t_df['start'] = t_df['start']/1000.0
     t_df['latency'] = t_df['latency']/1000.0
 
-    p_df = p_df_dic['perf_records']
+    p_df = p_df_dic.get('perf_records')
 
     # Add new dimensions if perf data is available
     # p_df['IPC'] = p_df['instructions']/p_df['cycles']
@@ -133,6 +134,30 @@ def CompareArchives(archive_files, plot):
     return [combined_test_df, combined_perf_df_dic, combined_stat_df]
 
 
+def CompareStoredRuns(runids, functions=None):
+    """
+    This function compares test runs read from the local activation store.
+    """
+    store = ActivationStore()
+    frames = []
+    for runid in runids:
+        test_df = store.read(runid=runid, names=functions)
+        if len(test_df) == 0:
+            logger.error("No activations of run " + runid + " in the activation store!")
+            continue
+        test_df['test'] = runid
+        # Like the archives, start is relative to the first activation of
+        # each function of a run
+        test_df['start'] -= test_df.groupby('func_name')['start'].transform('min')
+        frames.append(test_df)
+
+    if len(frames) == 0:
+        return False
+
+    # Performance monitoring records and statistics are only archived
+    return [pd.concat(frames, ignore_index=True), {}, None]
+
+
 def GetRawTestName(test_name):
     """
     Remove the test to be able to compare tests of the same category.
@@ -185,6 +210,14 @@ def main(options):
     logger.info("Comparative Analyzer started")
     print("Log file -> logs/CA.log")
 
+    if options.runs:
+        functions = options.functions.split(',') if options.functions else None
+        compared = CompareStoredRuns(options.runs.split(','), functions)
+        if not compared:
+            return False
+        [combined_test_df, combined_perf_df_dic, combined_stat_df] = compared
+        return PlotComparison(options, combined_test_df, combined_perf_df_dic)
+
     ls_files = os.popen("ls -l " + FAAS_ROOT + "/data_archive/*.pkl")
     archive_files = []
     for line in ls_files:
@@ -203,6 +236,13 @@ def main(options):
     [combined_test_df, combined_perf_df_dic, combined_stat_df] = CompareArchives(
         archive_files, options.plot)
 
+    return PlotComparison(options, combined_test_df, combined_perf_df_dic)
+
+
+def PlotComparison(options, combined_test_df, combined_perf_df_dic):
+    """
+    Plots the compared test results as selected by the options.
+    """
     if options.plot:
         ComparativePlotting(t_df=combined_test_df,
                             p_df_dic=combined_perf_df_dic)
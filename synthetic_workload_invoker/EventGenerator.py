@@ -3,106 +3,214 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-from typing import Any, Dict, List, Optional, Tuple, cast
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import zlib
 import numpy as np
-import random
 
 from commons.Logger import ScriptLogger
+from .arrival_processes import ARRIVAL_PROCESSES, CHUNK_EVENTS
+from .phases import phase_event_stream, phase_instances
+from .schedule_cache import ScheduleCache, schedule_key
+from .trace_replay import trace_event_stream
 
 
-def create_events(instance, dist: str, rate: int, duration: int, seed: Optional[int] =None) -> List[float]:
+def instance_rng(seed: Optional[int], instance: str) -> np.random.Generator:
     """
-    Creates a dictionary of application instances
+    Returns the random generator of an instance. The generator only
+    depends on the seed and the instance name, so schedules are the
+    same in every process and for every value of PYTHONHASHSEED.
     """
-    inter_arrivals = []
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([seed, zlib.crc32(instance.encode('utf-8'))])
 
-    if rate == 0:
-        return inter_arrivals
 
-    if dist == "Uniform":
-        random.seed(seed + hash(instance))
-        shift = random.random()/rate
-        inter_arrivals = int(duration*rate)*[1.0/rate]
-        inter_arrivals[0] += shift
-    elif dist == "Poisson":
-        raise Exception("Poisson distribution is not supported")
-        if not seed is None:
-            np.random.seed(seed)
-        beta = 1.0/rate
-        # Creating inter arrival times using an Exponential process
-        inter_arrivals = list(np.random.exponential(
-            scale=beta,
-            size=int(1.5*duration*rate)))
+def create_event_chunks(instance, desc: Dict[str, Any], duration: int,
+                        seed: Optional[int] =None) -> Iterator[np.ndarray]:
+    """
+    Lazily creates the absolute event times (in seconds from the start
+    of the test) of an application instance, in chunks, using the
+    arrival process named by its distribution
+    """
+    if desc.get('rate') == 0:
+        return iter([])
+
+    rng = instance_rng(seed, instance)
+    return ARRIVAL_PROCESSES[desc['distribution']].generate(rng, desc, duration)
+
+
+def create_events(instance, desc: Dict[str, Any], duration: int, seed: Optional[int] =None) -> np.ndarray:
+    """
+    Creates the absolute event times (in seconds from the start of the
+    test) of an application instance
+    """
+    return _concatenate(create_event_chunks(instance, desc, duration, seed))
+
 
-    return inter_arrivals
+def _concatenate(chunks: Iterable[np.ndarray]) -> np.ndarray:
+    chunks = list(chunks)
+    return np.concatenate(chunks) if chunks else np.empty(0)
 
 
-def EnforceActivityWindow(start_time, end_time, instance_events):
+def EnforceActivityWindow(start_time, end_time, event_times: np.ndarray) -> np.ndarray:
     """
     This function enforces possible activity windows defined in the config file.
     """
-    events_iit = []
-    events_abs = [0] + instance_events
-    event_times = [sum(events_abs[:i]) for i in range(1, len(events_abs))]
-    event_times = [e for e in event_times if (e > start_time)and(e < end_time)]
-    try:
-        events_iit = [event_times[0]] + [event_times[i]-event_times[i-1]
-                                         for i in range(1, len(event_times))]
-    except:
-        pass
-    return events_iit
+    return event_times[(event_times > start_time) & (event_times < end_time)]
 
 
-def generic_event_generator(workload) -> Tuple[Dict[str, List[float]], int]:
+def instance_event_stream(instance, desc: Dict[str, Any], duration: int,
+                          seed: Optional[int] =None) -> Iterator[np.ndarray]:
+    """
+    Yields the schedule of an instance in chunks of increasing
+    absolute event times, enforcing its activity window or, for
+    traces, the test duration. Only one chunk is held in memory at a
+    time (inline traces are already in memory, trace files are read
+    as they are consumed).
+    """
+    if 'trace' in desc.keys():
+        yield from trace_event_stream(instance_rng(seed, instance), desc['trace'], duration)
+        return
+
+    if 'interarrivals_list' in desc.keys():
+        instance_events = np.cumsum(np.asarray(desc['interarrivals_list'],
+                                               dtype=np.float64))
+        # enforcing maximum test duration
+        instance_events = instance_events[
+            :np.searchsorted(instance_events, duration, side='right')]
+        for first in range(0, len(instance_events), CHUNK_EVENTS):
+            yield instance_events[first:first + CHUNK_EVENTS]
+        return
+
+    if 'distribution' not in desc.keys():
+        # Instances driven only by phases
+        return
+    window = desc.get('activity_window') or [0, duration]
+    for chunk in create_event_chunks(instance, desc, duration, seed):
+        events = EnforceActivityWindow(window[0], window[1], chunk)
+        if len(events) > 0:
+            yield events
+        if len(chunk) > 0 and chunk[-1] >= window[1]:
+            break
+
+
+def _next_chunk(stream: Iterator[np.ndarray]) -> Optional[np.ndarray]:
+    for chunk in stream:
+        if len(chunk) > 0:
+            return chunk
+    return None
+
+
+def merge_timelines(streams: List[Iterable[np.ndarray]]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Merges schedules, given as streams of chunks of increasing times,
+    into one ordered stream. Yields batches of event times and the
+    indices (in streams) of the instances they belong to.
+
+    Each batch holds every buffered event up to the earliest end of
+    the buffered chunks, which no later chunk can precede, so batches
+    are merged with one vectorized sort and the streams are consumed
+    lazily.
+    """
+    iterators = [iter(stream) for stream in streams]
+    buffers = [_next_chunk(it) for it in iterators]
+    while True:
+        live = [i for (i, b) in enumerate(buffers) if b is not None]
+        if not live:
+            return
+        horizon = min(buffers[i][-1] for i in live)
+        times = []
+        indices = []
+        for i in live:
+            buffer = buffers[i]
+            count = np.searchsorted(buffer, horizon, side='right')
+            times.append(buffer[:count])
+            indices.append(np.full(count, i, dtype=np.int32))
+            buffers[i] = buffer[count:] if count < len(buffer) else _next_chunk(iterators[i])
+        times = np.concatenate(times)
+        order = np.argsort(times, kind='stable')
+        yield (times[order], np.concatenate(indices)[order])
+
+
+def _merged(streams: List[Iterable[np.ndarray]]) -> Iterator[np.ndarray]:
+    for (times, _) in merge_timelines(streams):
+        yield times
+
+
+def lazy_event_generator(workload) -> Dict[str, Iterator[np.ndarray]]:
     """
-    This function returns a list of times and applications calls given a workload description.
+    Returns the lazily generated schedules of all application
+    instances of a workload, including the requests added by its
+    phases. Events are only generated as the schedules are consumed.
+    """
+    duration = workload['test_duration_in_seconds']
+    seed = workload['random_seed']
+    streams = {}
+    for (instance, desc) in workload['instances'].items():
+        # Closed-loop instances do not follow a schedule
+        if 'concurrency' in desc.keys():
+            continue
+        instance_streams = [instance_event_stream(instance, desc, duration, seed)]
+        for (i, phase) in enumerate(workload.get('phases', [])):
+            if instance in phase_instances(workload, phase):
+                rng = instance_rng(seed, "%s/phase%s" % (instance, i))
+                instance_streams.append(phase_event_stream(rng, phase, duration))
+        streams[instance] = instance_streams[0] if len(instance_streams) == 1 \
+            else _merged(instance_streams)
+    return streams
+
+
+def generic_event_generator(workload) -> Tuple[Dict[str, np.ndarray], int]:
+    """
+    This function returns the absolute event times of every
+    application instance given a workload description.
     """
 
     logger_eg = ScriptLogger('event_generator', "SWI.log")
 
     logger_eg.info("Started Generic Event Generator")
-    test_duration_in_seconds = workload['test_duration_in_seconds']
+    logger_eg.info('random_seed: ' + str(workload['random_seed']))
 
-    all_events = {}
-    event_count = 0
-
-    random_seed = workload['random_seed']
-    logger_eg.info('random_seed: ' + str(random_seed))
-
-    instance: str
-    desc: Dict[str, Any]
-    for (instance, desc) in workload['instances'].items():
-        if 'interarrivals_list' in desc.keys():
-            instance_events = cast(List[Any], desc['interarrivals_list'])
-            logger_eg.info('Read the invocation time trace for ' + instance)
-            # enforcing maximum test duration
-            list_len = 0
-            cutoff_index = None
-            for i in range(len(instance_events)):
-                list_len += instance_events[i]
-                if list_len > test_duration_in_seconds:
-                    cutoff_index = i
-                    break
-            if cutoff_index is not None:
-                instance_events = instance_events[:cutoff_index]
-        else:
-            instance_events = create_events(instance=instance,
-                                           dist=desc['distribution'],
-                                           rate=desc['rate'],
-                                           duration=test_duration_in_seconds,
-                                           seed=random_seed)
-            try:
-                start_time = desc['activity_window'][0]
-                end_time = desc['activity_window'][1]
-                instance_events = EnforceActivityWindow(
-                    start_time, end_time, instance_events)
-            except:
-                instance_events = EnforceActivityWindow(0,
-                                                        workload['test_duration_in_seconds'],
-                                                        instance_events)
-        all_events[instance] = instance_events
-        event_count += len(instance_events)
+    all_events = {instance: _concatenate(stream)
+                  for (instance, stream) in lazy_event_generator(workload).items()}
+    event_count = sum(len(events) for events in all_events.values())
 
     logger_eg.info("Returning workload event list")
 
     return (all_events, event_count)
+
+
+def _chunked(events: np.ndarray) -> Iterator[np.ndarray]:
+    for first in range(0, len(events), CHUNK_EVENTS):
+        yield events[first:first + CHUNK_EVENTS]
+
+
+def event_streams(workload) -> Tuple[Dict[str, Iterable[np.ndarray]], Optional[int]]:
+    """
+    Returns the schedules of the instances of a workload as streams of
+    chunks, as consumed by the dispatchers, and the number of events.
+
+    Schedules of workloads with a random seed and ``schedule_cache``
+    set are compiled into the schedule cache and memory mapped from
+    there. With ``lazy_schedule`` set in the workload, schedules which
+    are not cached yet are generated while they are dispatched and the
+    number of events is not known in advance (None).
+    """
+    lazy = workload.get('lazy_schedule', False)
+    key = schedule_key(workload) if workload.get('schedule_cache', False) else None
+    if key is not None:
+        cache = ScheduleCache()
+        cached = cache.load(key)
+        if cached is None and not lazy:
+            cache.compile(key, lazy_event_generator(workload))
+            cached = cache.load(key)
+        if cached is not None:
+            (all_events, event_count) = cached
+            return ({instance: _chunked(events) for (instance, events) in all_events.items()},
+                    event_count)
+
+    if lazy:
+        return (lazy_event_generator(workload), None)
+    (all_events, event_count) = generic_event_generator(workload)
+    return ({instance: [events] for (instance, events) in all_events.items()},
+            event_count)
@@ -10,10 +10,24 @@ import os
 # Local imports
 from GenConfigs import *
 from commons.Logger import ScriptLogger
+from .arrival_processes import ARRIVAL_PROCESSES
+from .phases import PHASE_TYPES
+from .trace_replay import TRACE_FORMATS, trace_file_path
 
 
+def _is_number(value, minimum=None, positive=False):
+    """
+    Returns whether value is a number (not a boolean), at least
+    minimum or, if positive, larger than zero.
+    """
+    if type(value) not in (int, float):
+        return False
+    if minimum is not None and value < minimum:
+        return False
+    return value > 0 if positive else True
+
 
-def check_workload_validity(workload, supported_distributions):
+def check_workload_validity(workload, supported_distributions, supported_engines=None):
     """
     Checks whether a loaded workload is valid.
     """
@@ -66,6 +80,146 @@ def check_workload_validity(workload, supported_distributions):
         logger_wlch.error(
             'At least one specified distribution is not supported. Supported distribution(s): '+str(supported_distributions))
         return False
+    # 4a - Check that the parameters of the arrival processes are given
+    for (instance, specs) in workload['instances'].items():
+        if specs.get('distribution') in ARRIVAL_PROCESSES:
+            for param in ARRIVAL_PROCESSES[specs['distribution']].required:
+                if param not in specs.keys():
+                    logger_wlch.error('The ' + specs['distribution'] + ' distribution of ' +
+                                      instance + ' requires a ' + param + ' field!')
+                    return False
+    # 4b - Check for a supported dispatch engine
+    if supported_engines is not None and 'engine' in workload.keys():
+        if workload['engine'] not in supported_engines:
+            logger_wlch.error(
+                'The specified engine is not supported. Supported engine(s): '+str(supported_engines))
+            return False
+    # 4b2 - Check the size of the dispatcher pool of the timeline engine
+    if 'dispatchers' in workload.keys():
+        if type(workload['dispatchers']) is not int or workload['dispatchers'] < 1:
+            logger_wlch.error('dispatchers should be a positive integer!')
+            return False
+    # 4c - Check for a valid number of invoker shards
+    if 'shards' in workload.keys():
+        if type(workload['shards']) is not int or workload['shards'] < 1:
+            logger_wlch.error('shards should be a positive integer!')
+            return False
+    # 4d - Check the dispatch lag settings
+    if 'dispatch_lag' in workload.keys():
+        if type(workload['dispatch_lag']) is not dict:
+            logger_wlch.error('dispatch_lag should be an object!')
+            return False
+    # 4d2 - Check the pacing settings
+    if 'pacing' in workload.keys():
+        if type(workload['pacing']) is not dict:
+            logger_wlch.error('pacing should be an object!')
+            return False
+    # 4e - Check the cap on outstanding requests
+    if 'max_outstanding_requests' in workload.keys():
+        if type(workload['max_outstanding_requests']) is not int or \
+           workload['max_outstanding_requests'] < 1:
+            logger_wlch.error('max_outstanding_requests should be a positive integer!')
+            return False
+    # 4f - Check the transport settings
+    if 'transport' in workload.keys():
+        if type(workload['transport']) is not dict:
+            logger_wlch.error('transport should be an object!')
+            return False
+    # 4f2 - Check the rate limiter settings
+    if 'rate_limit' in workload.keys():
+        rate_limit = workload['rate_limit']
+        if type(rate_limit) is not dict or \
+           type(rate_limit.get('invocations_per_minute')) not in (int, float) or \
+           rate_limit['invocations_per_minute'] <= 0:
+            logger_wlch.error('rate_limit should be an object with a positive invocations_per_minute!')
+            return False
+        if rate_limit.get('scope', 'namespace') not in ('namespace', 'action'):
+            logger_wlch.error('The scope of rate_limit should be namespace or action!')
+            return False
+    # 4g - Check the schedule generation and caching modes
+    if 'lazy_schedule' in workload.keys():
+        if type(workload['lazy_schedule']) is not bool:
+            logger_wlch.error('lazy_schedule should be a boolean!')
+            return False
+    if 'schedule_cache' in workload.keys():
+        if type(workload['schedule_cache']) is not bool:
+            logger_wlch.error('schedule_cache should be a boolean!')
+            return False
+    # 4h - Check the concurrency levels of closed-loop instances
+    for (instance, specs) in workload['instances'].items():
+        if 'concurrency' in specs.keys():
+            levels = specs['concurrency']
+            levels = levels if type(levels) is list else [levels]
+            if len(levels) == 0 or \
+               any(type(c) is not int or c < 1 for c in levels):
+                logger_wlch.error('concurrency of ' + instance +
+                                  ' should be a positive integer or a list of them!')
+                return False
+    # 4i - Check the trace files of replayed instances
+    for (instance, specs) in workload['instances'].items():
+        if 'trace' in specs.keys():
+            trace = specs['trace']
+            if type(trace) is not dict or 'file' not in trace.keys():
+                logger_wlch.error('trace of ' + instance + ' should be an object with a file field!')
+                return False
+            if not os.path.isfile(trace_file_path(trace)):
+                logger_wlch.error('The trace file ' + str(trace['file']) + ' of ' +
+                                  instance + ' does not exist!')
+                return False
+            if trace.get('format', 'timestamps') not in TRACE_FORMATS:
+                logger_wlch.error('The trace format of ' + instance +
+                                  ' is not supported. Supported format(s): ' + str(TRACE_FORMATS))
+                return False
+    # 4j - Check the burst and step-load phases
+    for phase in workload.get('phases', []):
+        if type(phase) is not dict or phase.get('type') not in PHASE_TYPES:
+            logger_wlch.error('Every phase should be an object with a type. Supported type(s): ' +
+                              str(PHASE_TYPES))
+            return False
+        for instance in phase.get('instances') or []:
+            if instance not in workload['instances'].keys() or \
+               'concurrency' in workload['instances'][instance].keys():
+                logger_wlch.error('Phase instance ' + str(instance) +
+                                  ' is not an instance with a schedule!')
+                return False
+        if not _is_number(phase.get('start', 0), minimum=0):
+            logger_wlch.error('The start of a phase should be a non-negative number!')
+            return False
+        if phase.get('end') is not None and \
+           (not _is_number(phase['end']) or phase['end'] <= phase.get('start', 0)):
+            logger_wlch.error('The end of a phase should be a number after its start!')
+            return False
+        if phase['type'] == 'burst':
+            if type(phase.get('size')) is not int or phase['size'] < 1:
+                logger_wlch.error('The size of a burst should be a positive integer!')
+                return False
+            if not _is_number(phase.get('spread_ms', 0), minimum=0):
+                logger_wlch.error('The spread_ms of a burst should be a non-negative number!')
+                return False
+            if phase.get('period') is not None:
+                if not _is_number(phase['period'], positive=True):
+                    logger_wlch.error('The period of a burst should be a positive number!')
+                    return False
+                if phase.get('spread_ms', 0) >= phase['period'] * 1000:
+                    logger_wlch.error('The spread of a burst should be shorter than its period!')
+                    return False
+        else:
+            if 'rate' not in phase.keys() and 'rates' not in phase.keys():
+                logger_wlch.error('A step phase requires a rate or rates field!')
+                return False
+            if 'rates' in phase.keys():
+                rates = phase['rates']
+                if type(rates) is not list or len(rates) == 0 or \
+                   any(not _is_number(rate, minimum=0) for rate in rates):
+                    logger_wlch.error('The rates of a step phase should be a non-empty list of non-negative numbers!')
+                    return False
+            elif not _is_number(phase['rate'], minimum=0):
+                logger_wlch.error('The rate of a step phase should be a non-negative number!')
+                return False
+            if phase.get('step_duration') is not None and \
+               not _is_number(phase['step_duration'], positive=True):
+                logger_wlch.error('The step_duration of a step phase should be a positive number!')
+                return False
     # 5 - Check for valid test duration
     try:
         test_duration_in_seconds = workload['test_duration_in_seconds']
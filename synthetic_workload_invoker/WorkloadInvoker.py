@@ -6,78 +6,133 @@
 # Standard imports
 import json
 
+import functools
 import os
 from synthetic_workload_invoker.datatypes import InvocationMetadata
-from requests_futures.sessions import FuturesSession
-import concurrent.futures
 import subprocess
 import math
 import time
 import threading
 import logging
 import asyncio
-from typing import Any, Tuple, Dict, TypedDict
-from mimetypes import MimeTypes
+import numpy as np
+import requests
+from typing import Any, Tuple, Dict, Iterable, List, Optional, TypedDict
 
 # Local imports
 from GenConfigs import *
-from .EventGenerator import generic_event_generator
+from .EventGenerator import event_streams
+from .arrival_processes import ARRIVAL_PROCESSES
 from commons.JSONConfigHelper import check_json_config, read_json_config
 from commons.Logger import ScriptLogger
 from commons import util
 from .WorkloadChecker import check_workload_validity
+from .async_engine import AsyncDispatchEngine
+from .closed_loop import ClosedLoopEngine
+from .timeline import DEFAULT_DISPATCHERS, TimelineDispatchEngine
+from .sharded_invoker import ShardedDispatch
+from .dispatch_lag import DispatchLagMonitor
+from .inflight import DEFAULT_MAX_OUTSTANDING, CompletionTracker
+from .pacing import PacingMonitor
+from .phases import phase_summary
+from .rate_limit import DelayScheduler, OutcomeCounters, RateLimiter
+from .transport import Transport
+from .payloads import PayloadCache, PreparedInvocation, binary_invocation, json_invocation
+from .request_log import RequestLog, activation_id_of, latency_summary, read_request_log
 
 logging.captureWarnings(True)
 
 
 class WorkloadInvoker:
-   supported_distributions = {'Poisson', 'Uniform'}
+   supported_distributions = set(ARRIVAL_PROCESSES.keys())
+   supported_engines = {'threaded', 'asyncio', 'timeline'}
 
    @staticmethod
    def gen_invocation_id(test_name, runid):
-      out = subprocess.check_output(["git", "rev-parse", "HEAD"],
-                                            cwd=FAAS_ROOT)
-      commit_hash = out.decode('utf-8').strip()
+      commit_hash = util.git_commit_hash(FAAS_ROOT)
       test_dir_name = "{}_{}_{}".format(commit_hash[0:10], test_name, runid)
       return (commit_hash, test_dir_name)
 
-   def __init__(self, config_json):
+   @staticmethod
+   def wsk_properties() -> Dict[str, str]:
+      """
+      Returns the API host, auth key and namespace configured for the
+      wsk CLI.
+      """
+      return util.read_wsk_properties()
+
+   def __init__(self, config_json, wsk_properties: Optional[Dict[str, str]] = None):
       # Global variables
 
       self.logger = None
 
-      APIHOST = subprocess.check_output(WSK_PATH + " property get --apihost", shell=True).split()[3].decode("utf-8")
+      # The wsk CLI configuration is used unless the properties are
+      # given explicitly
+      if wsk_properties is None:
+         wsk_properties = WorkloadInvoker.wsk_properties()
+      APIHOST = wsk_properties['apihost']
       APIHOST = APIHOST if APIHOST.lower().startswith("http") else 'https://' + APIHOST
-      AUTH_KEY = subprocess.check_output(WSK_PATH + " property get --auth", shell=True).split()[2]
-      AUTH_KEY = AUTH_KEY.decode("utf-8")
+      AUTH_KEY = wsk_properties['auth']
       self.user_pass = AUTH_KEY.split(':')
-      NAMESPACE = subprocess.check_output(WSK_PATH + " property get --namespace", shell=True).split()[2]
-      NAMESPACE = NAMESPACE.decode("utf-8")
+      NAMESPACE = wsk_properties['namespace']
       self.RESULT = 'false'
       self.base_url = APIHOST + '/api/v1/namespaces/' + NAMESPACE + '/actions/'
       self.base_gust_url = APIHOST + '/api/v1/web/guest/default/'
 
-      # Generate a runid for this instance
-      self.runid = util.gen_random_hex_string(8)
-
       self.param_file_cache = {}   # a cache to keep json of param files
-      self.binary_data_cache = {}  # a cache to keep binary data
+      self.payload_cache = PayloadCache()  # memory maps of binary data
       # (image files, etc.)
 
+      self.config_json = config_json
+      self.workload = WorkloadInvoker.read_json_config(config_json)
+
+      # The transport and the event loop running the asyncio engine
+      # are kept across runs, so that repeated runs reuse connections
+      self.transport = None
+      self.loop = None
+      self.runs = 0
+      self.reset_run()
+
+   def reset_run(self) -> None:
+      """
+      Resets the state of a single run: generates a new runid and
+      result directory and clears the tallies and dispatch statistics.
+      """
+      # Generate a runid for this instance
+      self.runid = util.gen_random_hex_string(8)
+
       # Count of function invocations successfully submitted to FaaS queue
       self.invocation_success_tally = 0
       self.invocation_failure_tally = 0
       self.invocation_expected_tally = 0
       self.tally_lock = threading.Lock()
 
-      self.config_json = config_json
-      self.workload = WorkloadInvoker.read_json_config(config_json)
       # Set name and commit hash and create destination dir if
       # missing
       self.my_commit_hash, test_result_dir_name =\
          WorkloadInvoker.gen_invocation_id(self.workload["test_name"], self.runid)
       self.test_result_dir_path = util.ensure_directory_exists(
          os.path.join(DATA_DIR, test_result_dir_name))
+      self.request_log_dir = os.path.join(self.test_result_dir_path, "request_log")
+      self.request_log = None
+      self.schedule_start = None
+      # Start of the schedule fixed in advance, e.g. by sharded dispatch
+      self.schedule_start_at = None
+      self.lag_monitor = None
+      self.pacing_monitor = None
+      self.limiter = None
+      # Shards sharing every rate limit bucket, set by sharded dispatch
+      self.rate_limit_shares = None
+      self.outcomes = None
+      self.delayed = None
+      self.completions = None
+      self.transport_stats = {}
+      self.dispatch_lag = {}
+      self.pacing = {}
+      self.request_outcomes = {}
+      self.overloaded_instances = []
+      self.dispatch_aborted = False
+      self.closed_loop = {}
 
 
    @staticmethod
@@ -87,7 +142,8 @@ class WorkloadInvoker:
 
       workload = read_json_config(config_json)
       if not check_workload_validity(workload=workload,
-                                     supported_distributions=WorkloadInvoker.supported_distributions):
+                                     supported_distributions=WorkloadInvoker.supported_distributions,
+                                     supported_engines=WorkloadInvoker.supported_engines):
           # Abort the function if json file not valid
           raise Exception("Workload JSON is invalid")
 
@@ -95,30 +151,93 @@ class WorkloadInvoker:
 
 
 
-   def handle_futures(self, futures) -> Tuple[int, int]:
+   def send_request(self, session, instance, prepared, intended) -> None:
+       """
+       Sends a request of the threaded engines, or hands it to the
+       delay scheduler if the rate limiter holds it back.
        """
-       Wait for all futures in futures to complete. Returnes a tuple
-       containing the number of succseful and failed requests.
+       if self.limiter is not None:
+           delay = self.limiter.bucket(instance).reserve()
+           if delay > 0:
+               self.outcomes.limited(time.time(), delay)
+               self.delayed.call_later(delay, functools.partial(
+                  self._post_request, session, instance, prepared, intended, 0))
+               return
+       self._post_request(session, instance, prepared, intended, 0)
+
+   def _post_request(self, session, instance, prepared, intended, attempt) -> None:
+       (url, headers, body) = prepared
+       sent = time.time()
+       try:
+          future = session.post(url, headers=headers, data=body,
+                                timeout=self.transport.request_timeout)
+       except Exception as e:
+          # E.g. the session was closed while the request was delayed
+          self.request_log.record(instance, intended, sent, time.time(), 0, 0, '')
+          self.logger.info("Request failed: " + str(e))
+          self.completions.complete(False)
+          return
+       future.add_done_callback(functools.partial(self.complete_request_future,
+                                                  session, instance, prepared,
+                                                  intended, attempt, sent))
+
+   def _retry_throttled(self, session, instance, prepared, intended, attempt,
+                        res) -> bool:
        """
-       failures = 0
-       successes = 0
-       for future in concurrent.futures.as_completed(futures):
+       Schedules the retry of a throttled request. Returns whether the
+       request is retried.
+       """
+       if self.limiter is None:
+           return False
+       bucket = self.limiter.bucket(instance)
+       bucket.throttled()
+       delay = self.limiter.retry_delay(attempt, res.headers.get('Retry-After'))
+       if delay is None or self.lag_monitor.aborted.is_set():
+           return False
+       self.outcomes.record('retried', time.time())
+       self.delayed.call_later(max(delay, bucket.reserve()),
+                               functools.partial(self._post_request, session, instance,
+                                                 prepared, intended, attempt + 1))
+       return True
+
+   def complete_request_future(self, session, instance, prepared, intended, attempt,
+                               sent, future) -> None:
+       """
+       Done callback of a request future. Records the outcome of the
+       request in the request log and in the completion tally, unless
+       it was throttled and is retried. The future is not referenced
+       afterwards, so its response is released. The request is always
+       completed, even if its bookkeeping fails, since exceptions of
+       done callbacks are swallowed by the executor.
+       """
+       received = time.time()
+       (success, retried) = (False, False)
+       try:
            try:
                res = future.result()
            except Exception as e:
+               self.request_log.record(instance, intended, sent, received, 0, 0, '')
+               self.outcomes.failure(e, received)
                self.logger.info("Request failed: " + str(e))
-               failures += 1
+               return
+
+           self.request_log.record(instance, intended, sent, received,
+                                   res.status_code, len(res.content),
+                                   activation_id_of(res.headers, res.content))
+           self.outcomes.response(res.status_code, received)
+           if res.status_code == 429 and \
+              self._retry_throttled(session, instance, prepared, intended, attempt, res):
+               retried = True
+               return
+           if res.status_code >= 200 and res.status_code <= 299 :
+               if self.limiter is not None:
+                   self.limiter.bucket(instance).succeeded()
+               success = True
            else:
-               prefix = ""
-               if res.status_code >= 200 and res.status_code <= 299 :
-                   prefix = "Request successful: "
-                   successes += 1
-               else:
-                   prefix = "Request failed:     "
-                   failures += 1
-                   self.logger.info(prefix + str(res.status_code) + " " + res.url)
-
-       return (successes, failures)
+               self.logger.info("Request failed:     " + str(res.status_code) + " " + res.url)
+       finally:
+           if not retried:
+               self.completions.complete(success)
 
    # @staticmethod
    # def PROCESSInstanceGenerator(instance, instance_script, instance_times, blocking_cli):
@@ -141,19 +260,15 @@ class WorkloadInvoker:
 
    #class InstanceGenerator(
 
-   def http_instance_generator(self, action, instance_times,
-                               blocking_cli, query_file=None, param_file=None) -> None:
-       if len(instance_times) == 0:
-          raise Exception("http_instance_generator called without instance times")
-       session = FuturesSession(max_workers=100)
-       url = f"{self.base_url}{action}?{self.runid}"
-       assert(self.runid)
+   def http_invocation_args(self, blocking_cli, query_file=None,
+                            param_file=None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+       """
+       Returns the query parameters and the JSON body used when
+       invoking an action through the namespace actions API.
+       """
        parameters = {'blocking': blocking_cli, 'result': self.RESULT}
        args = { 'testid': self.runid,
                 'body': None }
-       authentication = (self.user_pass[0], self.user_pass[1])
-
-       futures = []
 
        if (not param_file is None) and (not query_file is None):
           raise Exception("Only one of param_file and query_stirng can be set")
@@ -165,9 +280,8 @@ class WorkloadInvoker:
           except:
              with open(param_file, 'r') as f:
                 param_file_body = json.load(f)
-                args['body'] = param_file_body
-                param_file_body = args
                 self.param_file_cache[param_file] = param_file_body
+          args['body'] = param_file_body
 
        if query_file:
           try:
@@ -177,79 +291,77 @@ class WorkloadInvoker:
                 query_file_body = json.load(f)
                 self.param_file_cache[query_file] = query_file_body
 
-          print("Updating paramters", str(parameters), str(query_file_body))
+          self.logger.debug("Updating parameters " + str(parameters) + " " +
+                            str(query_file_body))
           parameters.update(query_file_body)
 
+       return (parameters, args)
 
-       print("Final parameters", str(parameters))
-       st = 0
-       after_time, before_time = 0, 0
-       for t in instance_times:
-          st = st + t - (after_time - before_time)
-          before_time = time.time()
-          if st > 0:
-             time.sleep(st)
-
-          # self.logger.info("Url " + url)
-          # self.logger.info("Setting params" + str(parameters))
-          future = session.post(url, params=parameters, auth=authentication,
-                                json=args, verify=False)
-          futures.append(future)
-          #print(future.result())
-          after_time = time.time()
+   def instance_files(self, instance) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+       """
+       Returns the query, parameter and data files configured for an
+       instance of the workload.
+       """
+       desc = self.workload['instances'][instance]
+       try:
+           param_file = os.path.join(FAAS_ROOT, desc['param_file'])
+       except:
+           param_file = None
 
-       (successes, failures) = self.handle_futures(futures)
+       try:
+           query_file = os.path.join(FAAS_ROOT, desc['query_string'])
+       except:
+           query_file = None
 
-       with self.tally_lock:
-          self.invocation_success_tally += successes
-          self.invocation_failure_tally += failures
-          self.invocation_expected_tally += len(instance_times)
+       data_file = desc.get('data_file', None)
 
+       return (query_file, param_file, data_file)
 
-   def binary_data_http_instance_generator(self, action, instance_times, blocking_cli, data_file):
-      """
-      TODO: Automate content type
-      """
-      url = f"{self.base_gust_url}{action}?{self.runid}"
-      session = FuturesSession(max_workers=100)
-      if len(instance_times) == 0:
-         return False
-      after_time, before_time = 0, 0
-
-      futures = []
-
-      if not data_file in self.binary_data_cache:
-         data = open(data_file, 'rb').read()
-         self.binary_data_cache[data_file] = {}
-         self.binary_data_cache[data_file]["body"] = data
-         self.binary_data_cache[data_file]["mime"] = MimeTypes().guess_type(data_file)[0]
-
-      file_body = self.binary_data_cache[data_file]["body"]
-      file_mime = self.binary_data_cache[data_file]["mime"]
-
-      for t in instance_times:
-         st = t - (after_time - before_time)
-         if st > 0:
-            time.sleep(st)
-         before_time = time.time()
-         #self.logger.info("Url " + url)
-         assert(self.runid)
-         future = session.post(url=url, headers={'Content-Type':
-                                                 file_mime},
-                               params={'blocking': blocking_cli,
-                                       'result': self.RESULT,
-                                       'payload': {'testid': self.runid}},
-                               data=file_body, auth=(self.user_pass[0],
-                                                     self.user_pass[1]), verify=False)
-         futures.append(future)
-         after_time = time.time()
-
-      (successes, failures) = self.handle_futures(futures)
-
-      with self.tally_lock:
-         self.invocation_success_tally += successes
-         self.invocation_failure_tally += failures
-         self.invocation_expected_tally += len(instance_times)
+   def prepare_invocation(self, instance, blocking_cli) -> PreparedInvocation:
+       """
+       Encodes the URL, headers and body used for every request of an
+       instance.
+       """
+       assert(self.runid)
+       action = self.workload['instances'][instance]['application']
+       (query_file, param_file, data_file) = self.instance_files(instance)
+
+       if data_file:
+           parameters = {'blocking': blocking_cli,
+                         'result': self.RESULT,
+                         'payload': {'testid': self.runid}}
+           return binary_invocation(f"{self.base_gust_url}{action}?{self.runid}",
+                                    parameters,
+                                    self.payload_cache.mime(data_file),
+                                    self.payload_cache.data(data_file))
+
+       (parameters, args) = self.http_invocation_args(blocking_cli, query_file,
+                                                      param_file)
+       self.logger.debug("Final parameters " + str(parameters))
+       return json_invocation(f"{self.base_url}{action}?{self.runid}",
+                              parameters, args)
+
+   def http_instance_generator(self, instance, prepared, instance_chunks, pacer) -> None:
+       """
+       Sends the requests of an instance at their scheduled times. The
+       payload, JSON parameters or a binary data file, and its content
+       type are given by the prepared invocation.
+       """
+       session = self.transport.futures_session()
+       aborted = self.lag_monitor.aborted
+
+       for instance_times in instance_chunks:
+          with self.tally_lock:
+             self.invocation_expected_tally += len(instance_times)
+          for t in instance_times.tolist():
+             intended = pacer.wait(instance, t)
+             if aborted.is_set():
+                break
+             self.completions.acquire()
+             self.lag_monitor.record(instance, time.time() - intended)
+             self.send_request(session, instance, prepared, intended)
+          if aborted.is_set():
+             break
 
 
    @staticmethod
@@ -272,12 +384,115 @@ class WorkloadInvoker:
 
 
 
+   async def dispatch_events(self, all_events: Dict[str, Iterable[np.ndarray]]) -> None:
+       """
+       Dispatches the requests of all instances in all_events, which
+       maps each instance to its schedule as a stream of chunks, using
+       the engine selected by the workload, runs the closed-loop
+       instances of the workload alongside them and returns once all
+       responses have been handled.
+       """
+       workload = self.workload
+       engine = workload.get('engine', 'threaded')
+       blocking_cli = workload['blocking_cli']
+       closed_loop = [instance for (instance, desc) in workload['instances'].items()
+                      if 'concurrency' in desc.keys()]
+       self.logger.info("Dispatching %s instances (%s engine), %s closed-loop" %
+                        (len(all_events), engine, len(closed_loop)))
+
+       if self.transport is None:
+           self.transport = Transport(self.user_pass, workload.get('transport', {}))
+       self.request_log = RequestLog(self.request_log_dir,
+                                     list(all_events.keys()) + closed_loop)
+       self.lag_monitor = DispatchLagMonitor(list(all_events.keys()),
+                                             workload.get('dispatch_lag', {}))
+       self.pacing_monitor = PacingMonitor(list(all_events.keys()),
+                                           workload.get('pacing', {}))
+       self.outcomes = OutcomeCounters()
+       self.delayed = DelayScheduler()
+       if 'rate_limit' in workload.keys():
+           self.limiter = RateLimiter(workload['rate_limit'],
+                                      {instance: desc['application']
+                                       for (instance, desc) in workload['instances'].items()},
+                                      self.rate_limit_shares)
+       transport_baseline = self.transport.stats()
+       try:
+           dispatchers = [self._dispatch_with_engine(engine, blocking_cli, all_events)]
+           if closed_loop:
+               dispatchers.append(ClosedLoopEngine(self).run(closed_loop))
+           await asyncio.gather(*dispatchers)
+       finally:
+           self.delayed.stop()
+           self.request_log.close()
+
+       self.dispatch_lag = self.lag_monitor.summary()
+       self.pacing = self.pacing_monitor.summary()
+       self.request_outcomes = self.outcomes.summary()
+       self.overloaded_instances = self.lag_monitor.overloaded_instances()
+       self.dispatch_aborted = self.lag_monitor.aborted.is_set()
+       self.transport_stats = self.transport.stats(since=transport_baseline)
+       self.logger.info("Transport: %s requests over %s connections" %
+                        (self.transport_stats['requests'],
+                         self.transport_stats['connections_created']))
+       if self.pacing:
+           self.logger.info("Pacing: wake-up error p99 %s ms, %.1f ms spent spinning" %
+                            (max(p['p99_ms'] for p in self.pacing.values()),
+                             sum(p['spin_ms'] for p in self.pacing.values())))
+       if self.overloaded_instances:
+           self.logger.warning("Dispatch lag exceeded %s ms for instances %s" %
+                               (self.lag_monitor.threshold_ms,
+                                ", ".join(self.overloaded_instances)))
+
+   async def _dispatch_with_engine(self, engine, blocking_cli, all_events) -> None:
+       workload = self.workload
+       self.schedule_start = self.schedule_start_at or time.time()
+       self.pacing_monitor.start(self.schedule_start)
+       self.outcomes.start(self.schedule_start)
+       max_outstanding = workload.get('max_outstanding_requests',
+                                      DEFAULT_MAX_OUTSTANDING)
+       if engine == 'asyncio':
+           await AsyncDispatchEngine(self, blocking_cli, max_outstanding).run(all_events)
+           return
+       if engine == 'timeline':
+           await TimelineDispatchEngine(self, blocking_cli, max_outstanding,
+                                        workload.get('dispatchers', DEFAULT_DISPATCHERS)
+                                        ).run(all_events)
+           return
+
+       self.completions = CompletionTracker(max_outstanding)
+
+       threads = []
+       pacers = len(all_events)
+       for (instance, instance_chunks) in all_events.items():
+           action = workload['instances'][instance]['application']
+           if action == "long_run":
+              print("Invoking long_run")
+           prepared = self.prepare_invocation(instance, blocking_cli)
+           threads.append(threading.Thread(target=self.http_instance_generator, args=[
+                          instance, prepared, instance_chunks,
+                          self.pacing_monitor.pacer(pacers)]))
+
+       for thread in threads:
+           thread.start()
+
+       loop = asyncio.get_running_loop()
+       for thread in threads:
+           await loop.run_in_executor(None, thread.join)
+       await loop.run_in_executor(None, self.completions.wait)
+
+       with self.tally_lock:
+           self.invocation_success_tally += self.completions.successes
+           self.invocation_failure_tally += self.completions.failures
+
    async def invoke_benchmark_async(self) -> InvocationMetadata:
        """
        The main function.
        """
 
        workload = self.workload
+       if self.runs > 0:
+           self.reset_run()
+       self.runs += 1
        #self.logger.info("Workload Invoker started")
        #print("Log file -> ../profiler_results/logs/SWI.log")
 
@@ -288,32 +503,14 @@ class WorkloadInvoker:
        #                               'SWI.log')
        self.logger = ScriptLogger('workload_invoker', "SWI.log")
 
-       (all_events, event_count) = generic_event_generator(workload)
-
-       threads = []
-
-       for (instance, instance_times) in all_events.items():
-           action = workload['instances'][instance]['application']
-           if action == "long_run":
-              print("Invoking long_run")
-           try:
-               param_file = os.path.join(FAAS_ROOT,  workload['instances'][instance]['param_file'])
-           except:
-               param_file = None
-
-           try:
-               query_file = os.path.join(FAAS_ROOT,  workload['instances'][instance]['query_string'])
-           except:
-               query_file = None
-
-           blocking_cli = workload['blocking_cli']
-           if 'data_file' in workload['instances'][instance].keys():
-               data_file = workload['instances'][instance]['data_file']
-               threads.append(threading.Thread(target=self.binary_data_http_instance_generator, args=[
-                              action, instance_times, blocking_cli, data_file]))
-           else:
-               threads.append(threading.Thread(target=self.http_instance_generator, args=[
-                              action, instance_times, blocking_cli, query_file, param_file]))
+       shards = workload.get('shards', 1)
+       sharded = None
+       if shards > 1:
+           sharded = ShardedDispatch(self, shards,
+                                     workload.get('shard_cpu_set', INVOKER_CPU_SET))
+           event_count = await sharded.start()
+       else:
+           (all_events, event_count) = event_streams(workload)
 
        # Dump Test Metadata
        test_metadata: InvocationMetadata = {
@@ -324,6 +521,7 @@ class WorkloadInvoker:
           'commit_hash': self.my_commit_hash,
           'runid': self.runid,
           'runtime_script': False,
+          'shards': shards,
           "failures": 0,
           "successes": 0,
           "expected": 0
@@ -334,8 +532,10 @@ class WorkloadInvoker:
 
 
        self.logger.info("Test started")
-       for thread in threads:
-           thread.start()
+       if sharded:
+           dispatch = asyncio.ensure_future(sharded.release())
+       else:
+           dispatch = asyncio.ensure_future(self.dispatch_events(all_events))
 
        if runtime_script:
           _, _ = await runtime_script.communicate()
@@ -346,19 +546,60 @@ class WorkloadInvoker:
              self.logger.info("Runtime script completed successfully")
              test_metadata['runtime_script'] = True
 
-       for thread in threads:
-          thread.join()
+       await dispatch
+       test_metadata['end_time'] = math.ceil(time.time() * 1000)
 
        # Save post-benchmark stats to metadata
        test_metadata["failures"] = self.invocation_failure_tally
        test_metadata["successes"] = self.invocation_success_tally
        test_metadata["expected"] = self.invocation_expected_tally
+       if event_count is None:
+          # Lazily generated schedules are counted as they are dispatched
+          test_metadata["event_count"] = self.invocation_expected_tally - \
+             sum(level['successes'] + level['failures']
+                 for levels in self.closed_loop.values() for level in levels)
+       request_log = read_request_log(self.request_log_dir)
+       test_metadata["client_latency"] = latency_summary(request_log)
+       test_metadata["phases"] = phase_summary(workload, request_log,
+                                               self.schedule_start)
+       test_metadata["dispatch_lag"] = self.dispatch_lag
+       test_metadata["pacing"] = self.pacing
+       test_metadata["request_outcomes"] = self.request_outcomes
+       test_metadata["overloaded_instances"] = self.overloaded_instances
+       test_metadata["aborted"] = self.dispatch_aborted
+       test_metadata["closed_loop"] = self.closed_loop
+       test_metadata["transport"] = self.transport_stats
 
        self.write_test_metadata(test_metadata, self.test_result_dir_path)
 
+       if self.dispatch_aborted:
+          raise Exception("Test aborted, the invoker could not keep up with the "
+                          "schedule of instances %s" % ", ".join(self.overloaded_instances))
+
        self.logger.info("Test ended")
 
        return test_metadata
 
    def invoke_benchmark(self) -> InvocationMetadata:
-      return asyncio.run(self.invoke_benchmark_async())
+      """
+      Runs the workload. The invoker can be run repeatedly and must be
+      closed when it is no longer used.
+      """
+      if self.loop is None:
+         self.loop = asyncio.new_event_loop()
+      return self.loop.run_until_complete(self.invoke_benchmark_async())
+
+   def close(self) -> None:
+      """
+      Closes the connections of the invoker and releases its event
+      loop and data files.
+      """
+      if self.transport:
+         if self.loop:
+            self.loop.run_until_complete(self.transport.aclose())
+         self.transport.close()
+         self.transport = None
+      if self.loop:
+         self.loop.close()
+         self.loop = None
+      self.payload_cache.close()
@@ -0,0 +1,211 @@
+"""
+Arrival processes of synthetic instances. Every process generates the
+absolute arrival times (in seconds from the start of the test) of an
+instance from its description in the workload specification, using
+NumPy operations on whole arrays and the random generator of the
+instance, so schedules are reproducible from ``random_seed``.
+
+Processes generate arrivals lazily, as a sequence of chunks of about
+CHUNK_EVENTS increasing times, so that schedules of long tests can be
+consumed as a stream without materializing them. The chunks of a
+process are the same whether they are consumed lazily or concatenated
+into a complete schedule.
+
+Processes are registered by name with register_arrival_process. The
+name is what the ``distribution`` field of an instance refers to, and
+the registered required parameters are checked by
+check_workload_validity. The available processes are:
+
+* ``Uniform``: evenly spaced arrivals at ``rate`` per second.
+* ``Poisson``: exponential inter-arrival times with mean ``1/rate``.
+* ``Pareto``: Pareto inter-arrival times with tail index ``shape``
+  (> 1) and mean ``1/rate``.
+* ``Weibull``: Weibull inter-arrival times with shape ``shape`` and
+  mean ``1/rate``.
+* ``MMPP``: a Markov-modulated Poisson process. The process stays in
+  state ``i`` for an exponentially distributed time with mean
+  ``mean_durations[i]`` seconds, during which arrivals are Poisson with
+  rate ``rates[i]``, and then moves to one of the other states chosen
+  uniformly at random.
+* ``Sinusoidal``: a Poisson process whose rate follows
+  ``rate * (1 + amplitude * sin(2 * pi * (t + phase) / period))``.
+* ``Diurnal``: a Poisson process whose rate follows ``rate_curve``, a
+  list of rates at evenly spaced points of a ``period`` (the test
+  duration by default) which is interpolated linearly and repeated.
+"""
+import math
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+Generator = Callable[[np.random.Generator, Dict[str, Any], float], Iterator[np.ndarray]]
+
+#: Approximate number of arrivals generated at a time
+CHUNK_EVENTS = 16384
+
+
+class ArrivalProcess(NamedTuple):
+    generate: Generator
+    required: List[str]
+    mean_rate: Callable[[Dict[str, Any]], float]
+
+
+#: Registered arrival processes by distribution name
+ARRIVAL_PROCESSES: Dict[str, ArrivalProcess] = {}
+
+
+def _rate(desc: Dict[str, Any]) -> float:
+    return desc['rate']
+
+
+def register_arrival_process(name: str, required: List[str] = ['rate'],
+                             mean_rate: Callable[[Dict[str, Any]], float] = _rate):
+    """
+    Decorator registering a generator function as the arrival process
+    name. mean_rate returns the average rate of an instance, which is
+    used to estimate its load.
+    """
+    def register(generate: Generator) -> Generator:
+        ARRIVAL_PROCESSES[name] = ArrivalProcess(generate, required, mean_rate)
+        return generate
+    return register
+
+
+def mean_rate(desc: Dict[str, Any]) -> float:
+    return ARRIVAL_PROCESSES[desc['distribution']].mean_rate(desc)
+
+
+def _windows(rate: float, start: float, end: float) -> Iterator[Tuple[float, float]]:
+    """
+    Splits [start, end) into windows which are expected to contain
+    CHUNK_EVENTS arrivals at the given rate, and yields their start and
+    length.
+    """
+    length = CHUNK_EVENTS / rate if rate > 0 else end - start
+    k = 0
+    while start + k * length < end:
+        window_start = start + k * length
+        yield (window_start, min(length, end - window_start))
+        k += 1
+
+
+def _renewal(draw: Callable[[int], np.ndarray], duration: float) -> Iterator[np.ndarray]:
+    """
+    Yields the arrival times of a renewal process with inter-arrival
+    times drawn by draw, up to duration.
+    """
+    t = 0.0
+    while True:
+        times = t + np.cumsum(draw(CHUNK_EVENTS))
+        if times[-1] >= duration:
+            yield times[:np.searchsorted(times, duration)]
+            return
+        yield times
+        t = times[-1]
+
+
+def _poisson(rng: np.random.Generator, rate: float, start: float,
+             length: float) -> np.ndarray:
+    """
+    Returns the arrival times of a homogeneous Poisson process in
+    [start, start + length): the number of arrivals is Poisson
+    distributed and, given their number, arrivals are uniform.
+    """
+    count = rng.poisson(rate * length)
+    return start + np.sort(rng.random(count)) * length
+
+
+def _thinned(rng: np.random.Generator, rate_at: Callable[[np.ndarray], np.ndarray],
+             max_rate: float, duration: float) -> Iterator[np.ndarray]:
+    """
+    Yields the arrival times of a Poisson process with time varying
+    rate rate_at (bounded by max_rate), generated by thinning a
+    homogeneous process of rate max_rate.
+    """
+    for (start, length) in _windows(max_rate, 0, duration):
+        times = _poisson(rng, max_rate, start, length)
+        yield times[rng.random(len(times)) * max_rate < rate_at(times)]
+
+
+@register_arrival_process("Uniform")
+def uniform(rng: np.random.Generator, desc: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    rate = desc['rate']
+    shift = rng.random()/rate
+    count = int(duration*rate)
+    for first in range(1, count + 1, CHUNK_EVENTS):
+        yield shift + np.arange(first, min(first + CHUNK_EVENTS, count + 1))/rate
+
+
+@register_arrival_process("Poisson")
+def poisson(rng: np.random.Generator, desc: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    rate = desc['rate']
+    for (start, length) in _windows(rate, 0, duration):
+        yield _poisson(rng, rate, start, length)
+
+
+@register_arrival_process("Pareto", required=['rate', 'shape'])
+def pareto(rng: np.random.Generator, desc: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    (rate, shape) = (desc['rate'], desc['shape'])
+    if shape <= 1:
+        raise Exception("The shape of a Pareto distribution must be larger than 1")
+    scale = (shape - 1) / (shape * rate)
+    return _renewal(lambda n: (rng.pareto(shape, n) + 1) * scale, duration)
+
+
+@register_arrival_process("Weibull", required=['rate', 'shape'])
+def weibull(rng: np.random.Generator, desc: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    (rate, shape) = (desc['rate'], desc['shape'])
+    scale = 1 / (rate * math.gamma(1 + 1 / shape))
+    return _renewal(lambda n: rng.weibull(shape, n) * scale, duration)
+
+
+def _mmpp_mean_rate(desc: Dict[str, Any]) -> float:
+    # The time spent in a state is proportional to its mean duration
+    return float(np.average(desc['rates'], weights=desc['mean_durations']))
+
+
+@register_arrival_process("MMPP", required=['rates', 'mean_durations'],
+                          mean_rate=_mmpp_mean_rate)
+def mmpp(rng: np.random.Generator, desc: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    rates = np.asarray(desc['rates'], dtype=np.float64)
+    mean_durations = np.asarray(desc['mean_durations'], dtype=np.float64)
+    states = len(rates)
+    if states < 2 or len(mean_durations) != states:
+        raise Exception("MMPP needs at least two states with a rate and a mean duration each")
+
+    # Start in a state drawn from the stationary distribution
+    state = rng.choice(states, p=mean_durations / mean_durations.sum())
+    t = 0.0
+    while t < duration:
+        sojourn = min(rng.exponential(mean_durations[state]), duration - t)
+        for (start, length) in _windows(rates[state], t, t + sojourn):
+            yield _poisson(rng, rates[state], start, length)
+        t += sojourn
+        state = (state + rng.integers(1, states)) % states
+
+
+@register_arrival_process("Sinusoidal", required=['rate', 'amplitude', 'period'])
+def sinusoidal(rng: np.random.Generator, desc: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    (rate, amplitude, period) = (desc['rate'], desc['amplitude'], desc['period'])
+    phase = desc.get('phase', 0)
+    if amplitude < 0 or amplitude > 1:
+        raise Exception("The amplitude of a sinusoidal rate must be between 0 and 1")
+    return _thinned(rng,
+                    lambda t: rate * (1 + amplitude * np.sin(2 * np.pi * (t + phase) / period)),
+                    rate * (1 + amplitude), duration)
+
+
+def _diurnal_mean_rate(desc: Dict[str, Any]) -> float:
+    return float(np.mean(desc['rate_curve']))
+
+
+@register_arrival_process("Diurnal", required=['rate_curve'],
+                          mean_rate=_diurnal_mean_rate)
+def diurnal(rng: np.random.Generator, desc: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    curve = np.asarray(desc['rate_curve'], dtype=np.float64)
+    period = desc.get('period') or duration
+    # The curve wraps around, so the last point is followed by the first
+    points = np.linspace(0, period, len(curve) + 1)
+    values = np.append(curve, curve[0])
+    return _thinned(rng, lambda t: np.interp(np.mod(t, period), points, values),
+                    curve.max(), duration)
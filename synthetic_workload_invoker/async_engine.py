@@ -0,0 +1,130 @@
+"""
+Asyncio based dispatch engine for the workload invoker. Instead of
+starting one thread per instance, every instance of a workload is
+driven from a single event loop sharing a non-blocking aiohttp
+client. Requests are paced by a single Pacer against absolute
+deadlines, so a slow response or a late wake-up of one instance never
+shifts the schedule of the others.
+
+The engine is selected by setting ``"engine": "asyncio"`` in the
+workload specification.
+"""
+import asyncio
+import time
+from typing import Any, Dict, Iterable
+
+import aiohttp
+import numpy as np
+from yarl import URL
+
+from .inflight import AsyncCompletionTracker
+from .pacing import Pacer
+from .request_log import activation_id_of
+
+
+class AsyncDispatchEngine:
+
+    def __init__(self, invoker, blocking_cli: bool, max_outstanding: int) -> None:
+        self.invoker = invoker
+        self.blocking_cli = blocking_cli
+        self.completions = AsyncCompletionTracker(max_outstanding)
+
+    async def _post(self, session: aiohttp.ClientSession, instance: str,
+                    intended: float, url: URL, kwargs: Dict[str, Any]) -> bool:
+        """
+        Sends a single request and returns whether it succeeded. A
+        request failing in its bookkeeping is completed as a failure.
+        """
+        try:
+            return await self._send(session, instance, intended, url, kwargs)
+        except Exception as e:
+            self.invoker.logger.info("Request failed: " + str(e))
+            return False
+
+    async def _send(self, session: aiohttp.ClientSession, instance: str,
+                    intended: float, url: URL, kwargs: Dict[str, Any]) -> bool:
+        """
+        Sends a single request, once the rate limiter (if any) admits
+        it, retrying it while it is throttled. Records every attempt in
+        the request log and returns whether the request succeeded.
+        """
+        invoker = self.invoker
+        request_log = invoker.request_log
+        outcomes = invoker.outcomes
+        invoker.lag_monitor.record(instance, time.time() - intended)
+        bucket = invoker.limiter.bucket(instance) if invoker.limiter is not None else None
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay > 0:
+                outcomes.limited(time.time(), delay)
+                await asyncio.sleep(delay)
+
+        attempt = 0
+        while True:
+            sent = time.time()
+            try:
+                async with session.post(url, **kwargs) as res:
+                    body = await res.read()
+            except Exception as e:
+                received = time.time()
+                request_log.record(instance, intended, sent, received, 0, 0, '')
+                outcomes.failure(e, received)
+                invoker.logger.info("Request failed: " + str(e))
+                return False
+            received = time.time()
+            request_log.record(instance, intended, sent, received, res.status,
+                               len(body), activation_id_of(res.headers, body))
+            outcomes.response(res.status, received)
+            if res.status != 429 or bucket is None:
+                break
+            bucket.throttled()
+            delay = invoker.limiter.retry_delay(attempt, res.headers.get('Retry-After'))
+            if delay is None or invoker.lag_monitor.aborted.is_set():
+                break
+            outcomes.record('retried', received)
+            await asyncio.sleep(max(delay, bucket.reserve()))
+            attempt += 1
+
+        if res.status >= 200 and res.status <= 299:
+            if bucket is not None:
+                bucket.succeeded()
+            return True
+        self.invoker.logger.info("Request failed:     " + str(res.status) +
+                                 " " + str(url))
+        return False
+
+    async def _instance_generator(self, session: aiohttp.ClientSession,
+                                  pacer: Pacer, instance: str,
+                                  instance_chunks: Iterable[np.ndarray]) -> None:
+        (url, headers, body) = self.invoker.prepare_invocation(instance,
+                                                               self.blocking_cli)
+        url = URL(url, encoded=True)
+        kwargs = {'headers': headers, 'data': body}
+
+        aborted = self.invoker.lag_monitor.aborted
+        for instance_times in instance_chunks:
+            with self.invoker.tally_lock:
+                self.invoker.invocation_expected_tally += len(instance_times)
+            for t in instance_times.tolist():
+                if aborted.is_set():
+                    return
+                intended = await pacer.wait_async(instance, t)
+                await self.completions.submit(
+                    self._post(session, instance, intended, url, kwargs))
+
+    async def run(self, all_events: Dict[str, Iterable[np.ndarray]]) -> None:
+        """
+        Dispatches the requests of all instances in all_events, given
+        as streams of chunks of event times, and waits for their
+        responses.
+        """
+        session = self.invoker.transport.aiohttp_session()
+        pacer = self.invoker.pacing_monitor.pacer()
+        await asyncio.gather(
+            *[self._instance_generator(session, pacer, instance, instance_chunks)
+              for (instance, instance_chunks) in all_events.items()])
+        await self.completions.wait()
+
+        with self.invoker.tally_lock:
+            self.invoker.invocation_success_tally += self.completions.successes
+            self.invoker.invocation_failure_tally += self.completions.failures
@@ -0,0 +1,192 @@
+"""
+Capacity search. Finds the highest request rate an application
+sustains without violating a service level objective (SLO) by running
+a sequence of short workload suites at varying rates.
+
+For every application (instance) of a workload, the search starts at
+the rate given in the workload (at least 1 request per second) and
+doubles it until a step violates
+the SLO or ``max_rate`` is reached. It then bisects between the last
+sustained and the first violating rate until the two are within
+``tolerance`` of each other. A step violates the SLO when the p99
+client latency exceeds ``p99_ms``, when the fraction of requests that
+did not succeed exceeds ``max_failure_rate``, when its throughput (the
+successful requests over the time the step actually took) falls more
+than ``tolerance`` below its rate or when the invoker could not keep
+up with the schedule, in which case the measured capacity is that of
+the invoker and not of the platform. Steps therefore never
+abort on dispatch lag, they only record it. With ``blocking_cli``
+disabled the client latency only covers the admission of a request,
+so latency SLOs should be used with blocking workloads.
+
+Each step is written as a workload specification to the search
+directory and run through WorkloadSuite, so steps wait for the
+OpenWhisk backlog to drain like the runs of a suite do. The result,
+containing the maximum sustainable rate of each application and every
+step measured, is written to ``capacity_<searchid>/result.json`` in
+DATA_DIR.
+"""
+import copy
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from commons import util
+from GenConfigs import *
+from synthetic_workload_invoker.datatypes import (CapacitySearchResult, CapacityStep,
+                                                  InvocationType)
+from synthetic_workload_invoker.WorkloadInvoker import WorkloadInvoker
+from synthetic_workload_invoker.workload_suite import WorkloadSuite
+
+DEFAULT_STEP_DURATION = 10
+DEFAULT_TOLERANCE = 0.05
+DEFAULT_MAX_STEPS = 20
+
+
+class CapacitySearch:
+
+    def __init__(self,
+                 workload_config: str,
+                 invocation_type: InvocationType,
+                 p99_ms: Optional[float] = None,
+                 max_failure_rate: float = 0.0,
+                 step_duration: int = DEFAULT_STEP_DURATION,
+                 max_rate: Optional[float] = None,
+                 tolerance: float = DEFAULT_TOLERANCE,
+                 max_steps: int = DEFAULT_MAX_STEPS) -> None:
+        self.workload_config = workload_config
+        self.workload = WorkloadInvoker.read_json_config(workload_config)
+        self.invocation_type = invocation_type
+        self.p99_ms = p99_ms
+        self.max_failure_rate = max_failure_rate
+        self.step_duration = step_duration
+        self.max_rate = max_rate
+        self.tolerance = tolerance
+        self.max_steps = max_steps
+
+        self.searchid = util.gen_random_hex_string(7).strip()
+        self.search_dir = util.ensure_directory_exists(
+            os.path.join(util.ensure_directory_exists(DATA_DIR),
+                         "capacity_%s" % self.searchid))
+
+    def _step_workload(self, instance: str, rate: float) -> str:
+        """
+        Writes the workload of a step, which runs instance alone at
+        the given rate, and returns its path.
+        """
+        workload = copy.deepcopy(self.workload)
+        desc = workload['instances'][instance]
+        desc['rate'] = rate
+        desc['activity_window'] = None
+        workload['instances'] = {instance: desc}
+        # Phases would add load to, or name instances other than, the
+        # instance measured alone
+        workload.pop('phases', None)
+        # Overloaded steps are recorded as violations instead of
+        # ending the search
+        workload['dispatch_lag'] = dict(workload.get('dispatch_lag', {}), abort=False)
+        workload['test_name'] = "%s_capacity_%s" % (self.workload['test_name'], instance)
+        workload['test_duration_in_seconds'] = self.step_duration
+        path = os.path.join(self.search_dir, "%s_%s.json" % (instance, rate))
+        with open(path, 'w') as f:
+            f.write(json.dumps(workload))
+        return path
+
+    def _violation(self, step: Dict[str, Any]) -> Optional[str]:
+        if step['overloaded']:
+            return "invoker overloaded"
+        if step['failure_rate'] > self.max_failure_rate:
+            return "failure rate %.4f" % step['failure_rate']
+        if step['throughput'] < step['rate'] * (1.0 - self.tolerance):
+            return "throughput %.1f rps" % step['throughput']
+        if self.p99_ms is not None and \
+           (step['p99_ms'] is None or step['p99_ms'] > self.p99_ms):
+            return "p99 latency %s ms" % step['p99_ms']
+        return None
+
+    def _run_step(self, instance: str, rate: float) -> CapacityStep:
+        suite = WorkloadSuite(self._step_workload(instance, rate),
+                              self.invocation_type, 1).run_suite()
+        run = suite['benchmarks'][0]
+        expected = run['expected']
+        latency = run.get('client_latency')
+        # A step which falls behind takes longer than step_duration
+        elapsed = (run['end_time'] - run['start_time']) / 1000.0
+        if elapsed <= 0:
+            elapsed = self.step_duration
+        step: CapacityStep = {
+            'rate': rate,
+            'runid': run['runid'],
+            'suiteid': suite['suiteid'],
+            'throughput': run['successes'] / elapsed,
+            'failure_rate': 1.0 - run['successes'] / expected if expected else 0.0,
+            'p99_ms': latency['p99'] if latency else None,
+            'overloaded': bool(run['overloaded_instances']) or run['aborted'],
+            'violation': None
+        }
+        step['violation'] = self._violation(step)
+        print("Capacity step %s at %s rps: %s" %
+              (instance, rate, step['violation'] or "sustained"))
+        return step
+
+    def _search_instance(self, instance: str) -> Dict[str, Any]:
+        steps: List[CapacityStep] = []
+        sustained: Optional[float] = None
+        violated: Optional[float] = None
+
+        # Exponential phase
+        rate = max(float(self.workload['instances'][instance]['rate']), 1.0)
+        while len(steps) < self.max_steps:
+            step = self._run_step(instance, rate)
+            steps.append(step)
+            if step['violation']:
+                violated = rate
+                break
+            sustained = rate
+            if self.max_rate is not None and rate >= self.max_rate:
+                break
+            rate = rate * 2
+            if self.max_rate is not None:
+                rate = min(rate, self.max_rate)
+
+        # Binary search phase
+        low = sustained if sustained is not None else 0.0
+        while violated is not None and len(steps) < self.max_steps and \
+              violated - low > self.tolerance * max(low, 1.0):
+            rate = round((low + violated) / 2, 2)
+            step = self._run_step(instance, rate)
+            steps.append(step)
+            if step['violation']:
+                violated = rate
+            else:
+                low = rate
+                sustained = rate
+
+        return {'application': self.workload['instances'][instance]['application'],
+                'max_sustainable_rate': sustained,
+                'first_violating_rate': violated,
+                'steps': sorted(steps, key=lambda s: s['rate'])}
+
+    def run(self) -> CapacitySearchResult:
+        # The rate of trace and closed-loop instances, and of instances
+        # with a list of interarrival times, does not set their load
+        instances = [instance for (instance, desc) in self.workload['instances'].items()
+                     if 'rate' in desc.keys() and not
+                     {'trace', 'concurrency', 'interarrivals_list'} & set(desc.keys())]
+        if not instances:
+            raise Exception("Capacity search requires instances with a rate")
+
+        result: CapacitySearchResult = {
+            'searchid': self.searchid,
+            'workload_name': self.workload['test_name'],
+            'slo': {'p99_ms': self.p99_ms,
+                    'max_failure_rate': self.max_failure_rate},
+            'step_duration': self.step_duration,
+            'instances': {instance: self._search_instance(instance)
+                          for instance in instances}
+        }
+
+        with open(os.path.join(self.search_dir, "result.json"), 'w') as f:
+            f.write(json.dumps(result))
+
+        return result
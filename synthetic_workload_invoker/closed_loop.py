@@ -0,0 +1,161 @@
+"""
+Closed-loop invocation. Instead of following a schedule of arrival
+times, a closed-loop instance keeps a fixed number of requests
+outstanding for its whole activity window: each of ``concurrency``
+workers sends a blocking request, waits for the action to complete,
+optionally waits ``think_time`` seconds and then sends the next one.
+The throughput achieved at a concurrency level is therefore the
+saturation throughput of the action at that level.
+
+An instance is closed-loop when it specifies ``concurrency`` instead
+of a distribution or a trace. ``concurrency`` is either a single level
+or a list of levels, in which case the activity window is split into
+equally long steps, one per level. The achieved throughput and the
+latency of every level are stored in the test metadata. With a
+``rate_limit``, every request first takes a token from its bucket; a
+throttled request is counted and not retried.
+"""
+import array
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from yarl import URL
+
+from .request_log import activation_id_of
+
+
+class _LevelStats:
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self.successes = 0
+        self.failures = 0
+        self.latencies = array.array('d')
+        self.first_sent = None
+        self.last_received = None
+
+    def add(self, success: bool, sent: float, received: float) -> None:
+        if self.first_sent is None:
+            self.first_sent = sent
+        self.last_received = received
+        if success:
+            self.successes += 1
+            self.latencies.append((received - sent) * 1000.0)
+        else:
+            self.failures += 1
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {'concurrency': self.concurrency,
+                                   'successes': self.successes,
+                                   'failures': self.failures,
+                                   'throughput': 0.0,
+                                   'latency_ms': None}
+        if self.successes > 0:
+            elapsed = self.last_received - self.first_sent
+            latencies = np.frombuffer(self.latencies, dtype='f8')
+            (p50, p90, p99) = np.percentile(latencies, [50, 90, 99])
+            summary['throughput'] = self.successes / elapsed if elapsed > 0 else 0.0
+            summary['latency_ms'] = {'mean': float(latencies.mean()),
+                                     'p50': float(p50),
+                                     'p90': float(p90),
+                                     'p99': float(p99)}
+        return summary
+
+
+def concurrency_levels(desc: Dict[str, Any]) -> List[int]:
+    levels = desc['concurrency']
+    return list(levels) if isinstance(levels, list) else [levels]
+
+
+class ClosedLoopEngine:
+
+    def __init__(self, invoker) -> None:
+        self.invoker = invoker
+
+    async def _worker(self, session, instance: str, url: URL,
+                      kwargs: Dict[str, Any], until: float, think_time: float,
+                      stats: _LevelStats) -> None:
+        loop = asyncio.get_running_loop()
+        request_log = self.invoker.request_log
+        aborted = self.invoker.lag_monitor.aborted
+        limiter = self.invoker.limiter
+        bucket = limiter.bucket(instance) if limiter is not None else None
+        while loop.time() < until and not aborted.is_set():
+            if bucket is not None:
+                delay = bucket.reserve()
+                if delay > 0:
+                    self.invoker.outcomes.limited(time.time(), delay)
+                    await asyncio.sleep(delay)
+            sent = time.time()
+            try:
+                async with session.post(url, **kwargs) as res:
+                    body = await res.read()
+            except Exception as e:
+                received = time.time()
+                request_log.record(instance, sent, sent, received, 0, 0, '')
+                self.invoker.outcomes.failure(e, received)
+                self.invoker.logger.info("Request failed: " + str(e))
+                stats.add(False, sent, received)
+            else:
+                received = time.time()
+                request_log.record(instance, sent, sent, received, res.status,
+                                   len(body), activation_id_of(res.headers, body))
+                self.invoker.outcomes.response(res.status, received)
+                if bucket is not None:
+                    if res.status == 429:
+                        bucket.throttled()
+                    elif res.status >= 200 and res.status <= 299:
+                        bucket.succeeded()
+                stats.add(res.status >= 200 and res.status <= 299, sent, received)
+            if think_time > 0:
+                await asyncio.sleep(think_time)
+
+    async def _instance(self, session, start: float,
+                        instance: str) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        workload = self.invoker.workload
+        desc = workload['instances'][instance]
+        levels = concurrency_levels(desc)
+        think_time = desc.get('think_time', 0)
+        (begin, end) = desc.get('activity_window') or \
+            [0, workload['test_duration_in_seconds']]
+        step = (end - begin) / len(levels)
+
+        (url, headers, body) = self.invoker.prepare_invocation(instance, True)
+        url = URL(url, encoded=True)
+        kwargs = {'headers': headers, 'data': body}
+
+        results = []
+        for (i, concurrency) in enumerate(levels):
+            level_start = start + begin + i * step
+            delay = level_start - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stats = _LevelStats(concurrency)
+            await asyncio.gather(
+                *[self._worker(session, instance, url, kwargs,
+                               level_start + step, think_time, stats)
+                  for _ in range(concurrency)])
+            results.append(stats.summary())
+            self.invoker.logger.info("Closed loop %s at concurrency %s: %.1f rps" %
+                                     (instance, concurrency, results[-1]['throughput']))
+
+        with self.invoker.tally_lock:
+            for r in results:
+                self.invoker.invocation_success_tally += r['successes']
+                self.invoker.invocation_failure_tally += r['failures']
+                self.invoker.invocation_expected_tally += r['successes'] + r['failures']
+        return results
+
+    async def run(self, instances: List[str]) -> None:
+        """
+        Runs the closed-loop instances and stores the results of every
+        concurrency level in the closed_loop attribute of the invoker.
+        """
+        session = self.invoker.transport.aiohttp_session()
+        start = asyncio.get_running_loop().time()
+        results = await asyncio.gather(
+            *[self._instance(session, start, instance) for instance in instances])
+        self.invoker.closed_loop = dict(zip(instances, results))
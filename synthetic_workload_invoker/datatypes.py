@@ -1,5 +1,5 @@
 from enum import Enum, unique
-from typing import Any, Dict, List, TypedDict
+from typing import Any, Dict, List, Optional, TypedDict
 
 
 @unique
@@ -24,15 +24,26 @@ class InvocationMetadata(TypedDict):
 benchmarking run.
     """
     start_time: int
+    end_time: int
     workload_name: str
     test_config: Dict[str, Any]
     event_count: int
     commit_hash: str
     runid: str
     runtime_script: bool
+    shards: int
     failures: int
     successes: int
     expected: int
+    client_latency: Optional[Dict[str, float]]
+    dispatch_lag: Dict[str, Dict[str, Any]]
+    pacing: Dict[str, Dict[str, Any]]
+    request_outcomes: Dict[str, Dict[str, Any]]
+    overloaded_instances: List[str]
+    aborted: bool
+    closed_loop: Dict[str, List[Dict[str, Any]]]
+    phases: List[Dict[str, Any]]
+    transport: Dict[str, Any]
 
 class WorkloadSuiteMetadata(TypedDict):
     """The specification of the metadata associated with a workload suite.
@@ -47,3 +58,28 @@ class WorkloadSuiteMetadata(TypedDict):
     total_successes: int
     total_failures: int
     total_expected: int
+
+
+class CapacityStep(TypedDict):
+    """A single rate measured by a capacity search.
+    """
+    rate: float
+    runid: str
+    suiteid: str
+    throughput: float
+    failure_rate: float
+    p99_ms: Optional[float]
+    overloaded: bool
+    violation: Optional[str]
+
+
+class CapacitySearchResult(TypedDict):
+    """The result of a capacity search. instances maps each searched
+    instance to its application, its maximum sustainable rate and the
+    steps measured.
+    """
+    searchid: str
+    workload_name: str
+    slo: Dict[str, Any]
+    step_duration: int
+    instances: Dict[str, Dict[str, Any]]
@@ -0,0 +1,108 @@
+"""
+Dispatch lag instrumentation. The dispatch lag of a request is the
+time between its scheduled dispatch time and the time it was actually
+sent. When the invoker cannot keep up with a schedule the lag grows,
+and the request rate achieved by the run is lower than the one the
+workload asks for.
+
+The lag of every request is added to a per-instance histogram, which
+is stored in the test metadata. An instance is considered overloaded
+when more than ``1 - quantile`` of its requests were sent more than
+``threshold_ms`` late. Overloaded runs are flagged in the metadata and,
+if ``abort`` is set, stopped as soon as the overload is detected.
+These parameters are set with the optional ``dispatch_lag`` object of
+the workload specification.
+"""
+import bisect
+import threading
+from typing import Any, Dict, List, Sequence
+
+#: Upper bounds (in milliseconds) of the histogram buckets. The last
+#: bucket holds everything above the last bound.
+BUCKET_BOUNDS_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+                    1000, 2000, 5000]
+
+DEFAULT_THRESHOLD_MS = 10.0
+DEFAULT_QUANTILE = 0.99
+
+#: Number of requests an instance must have sent before it can be
+#: considered overloaded
+MIN_SAMPLES = 100
+
+
+class LagHistogram:
+
+    def __init__(self, threshold_ms: float,
+                 bounds_ms: Sequence[float] = BUCKET_BOUNDS_MS) -> None:
+        self.threshold_ms = threshold_ms
+        self.bounds_ms = bounds_ms
+        self.counts = [0] * (len(bounds_ms) + 1)
+        self.count = 0
+        self.over_threshold = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, lag_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds_ms, lag_ms)] += 1
+        self.count += 1
+        self.total_ms += lag_ms
+        if lag_ms > self.threshold_ms:
+            self.over_threshold += 1
+        if lag_ms > self.max_ms:
+            self.max_ms = lag_ms
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket containing the q
+        quantile, but no more than the maximum lag. Lags beyond the
+        last bound are reported as the maximum lag.
+        """
+        target = q * self.count
+        seen = 0
+        for (i, c) in enumerate(self.counts):
+            seen += c
+            if seen >= target and c > 0:
+                return min(self.bounds_ms[i], self.max_ms) if i < len(self.bounds_ms) else self.max_ms
+        return 0.0
+
+    def overloaded(self, quantile: float) -> bool:
+        return (self.count >= MIN_SAMPLES and
+                self.over_threshold > (1 - quantile) * self.count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'bounds_ms': list(self.bounds_ms),
+                'counts': self.counts,
+                'count': self.count,
+                'mean_ms': self.total_ms / self.count if self.count else 0.0,
+                'p50_ms': self.quantile(0.5),
+                'p99_ms': self.quantile(0.99),
+                'max_ms': self.max_ms}
+
+
+class DispatchLagMonitor:
+
+    def __init__(self, instances: List[str], config: Dict[str, Any]) -> None:
+        self.threshold_ms = config.get('threshold_ms', DEFAULT_THRESHOLD_MS)
+        self.quantile = config.get('quantile', DEFAULT_QUANTILE)
+        self.abort = config.get('abort', False)
+        # Each histogram is only written by the dispatcher of its instance
+        self.histograms = {instance: LagHistogram(self.threshold_ms)
+                           for instance in instances}
+        self.aborted = threading.Event()
+
+    def record(self, instance: str, lag: float) -> None:
+        """
+        Records the dispatch lag (in seconds) of a request.
+        """
+        histogram = self.histograms[instance]
+        histogram.add(lag * 1000.0)
+        if (self.abort and not self.aborted.is_set() and
+                histogram.overloaded(self.quantile)):
+            self.aborted.set()
+
+    def overloaded_instances(self) -> List[str]:
+        return [instance for (instance, h) in self.histograms.items()
+                if h.overloaded(self.quantile)]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {instance: h.to_dict() for (instance, h) in self.histograms.items()}
@@ -0,0 +1,97 @@
+"""
+Bounded tracking of outstanding requests. Instead of keeping every
+future of a test until the whole schedule has been dispatched, the
+dispatch engines hand each request to a completion tracker, which
+tallies its outcome as soon as its response arrives and then drops
+it. The number of outstanding requests is capped, so memory use does
+not depend on the length of the test. When the cap is reached the
+dispatchers block until a response arrives, which shows up as
+dispatch lag.
+
+The cap is set with ``max_outstanding_requests`` in the workload
+specification.
+"""
+import asyncio
+import threading
+from typing import Awaitable, Set
+
+DEFAULT_MAX_OUTSTANDING = 10000
+
+
+class CompletionTracker:
+    """
+    Completion tracker for the threaded engine. acquire is called by
+    the dispatching threads, complete by the callbacks of the request
+    futures.
+    """
+
+    def __init__(self, max_outstanding: int) -> None:
+        self.slots = threading.BoundedSemaphore(max_outstanding)
+        self.idle = threading.Condition()
+        self.outstanding = 0
+        self.successes = 0
+        self.failures = 0
+
+    def acquire(self) -> None:
+        """
+        Reserves a slot for a new request, blocking while the maximum
+        number of requests is outstanding.
+        """
+        self.slots.acquire()
+        with self.idle:
+            self.outstanding += 1
+
+    def complete(self, success: bool) -> None:
+        with self.idle:
+            self.outstanding -= 1
+            if success:
+                self.successes += 1
+            else:
+                self.failures += 1
+            if self.outstanding == 0:
+                self.idle.notify_all()
+        self.slots.release()
+
+    def wait(self) -> None:
+        """
+        Waits until no requests are outstanding.
+        """
+        with self.idle:
+            self.idle.wait_for(lambda: self.outstanding == 0)
+
+
+class AsyncCompletionTracker:
+    """
+    Completion tracker for the asyncio engine. Requests are coroutines
+    returning whether they succeeded.
+    """
+
+    def __init__(self, max_outstanding: int) -> None:
+        self.slots = asyncio.Semaphore(max_outstanding)
+        self.tasks: Set[asyncio.Future] = set()
+        self.successes = 0
+        self.failures = 0
+
+    async def submit(self, request: Awaitable[bool]) -> None:
+        """
+        Schedules a request once a slot is available.
+        """
+        await self.slots.acquire()
+        task = asyncio.ensure_future(request)
+        self.tasks.add(task)
+        task.add_done_callback(self._complete)
+
+    def _complete(self, task: asyncio.Future) -> None:
+        self.tasks.discard(task)
+        self.slots.release()
+        if not task.cancelled() and task.exception() is None and task.result():
+            self.successes += 1
+        else:
+            self.failures += 1
+
+    async def wait(self) -> None:
+        """
+        Waits until no requests are outstanding.
+        """
+        while self.tasks:
+            await asyncio.wait(set(self.tasks))
@@ -0,0 +1,167 @@
+"""
+Precision pacing of requests. All dispatch engines wait for the
+scheduled time of a request through a Pacer, so they share one notion
+of when a request is due and how accurately that time is met.
+
+Deadlines are absolute times on the monotonic clock, computed from the
+start of the schedule, so neither wake-up overshoot nor wall clock
+adjustments accumulate into drift. Sleeping is only accurate to about
+a millisecond (more under load), so a pacer sleeps until
+``spin_margin_ms`` before the deadline and spins for the rest. Spinning
+burns CPU, so all pacers of a run together spin at most a
+``spin_budget`` fraction of one CPU. A pacer that has used up its share
+of the budget sleeps for the rest of the margin instead, trading
+accuracy for CPU time. Threads release the GIL while spinning and
+coroutines yield to the event loop, so spinning never blocks other
+dispatchers. The coroutines of the asyncio engine share one pacer,
+which counts the time several of them spin at once only once.
+
+The wake-up error of every request, i.e. how late the pacer returned
+after the deadline, is added to a per-instance histogram, which is
+stored with the time spent spinning under ``pacing`` in the test
+metadata. These parameters are set with the optional ``pacing`` object
+of the workload specification.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from .dispatch_lag import LagHistogram
+
+DEFAULT_SPIN_MARGIN_MS = 1.0
+DEFAULT_SPIN_BUDGET = 0.25
+
+#: Upper bounds (in milliseconds) of the wake-up error histogram
+#: buckets
+WAKE_BOUNDS_MS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+                  1, 2, 5, 10, 20, 50]
+
+
+class Pacer:
+    """
+    Waits for the deadlines of the requests of one dispatcher. A pacer
+    is used by a single thread, or by all coroutines of one event loop.
+    Coroutines spinning at the same time share one CPU, so the time
+    they spin together is only counted once.
+    """
+
+    def __init__(self, monitor: 'PacingMonitor', budget: float) -> None:
+        self.monitor = monitor
+        self.budget = budget
+        self.margin = monitor.spin_margin
+        self.created = time.monotonic()
+        self.spun = 0.0
+        # Number of waiters currently spinning and the time up to which
+        # their spinning has been counted
+        self.spinners = 0
+        self.spin_mark = 0.0
+
+    def _may_spin(self, now: float) -> bool:
+        return self.spun <= self.budget * (now - self.created)
+
+    def _spin_begin(self, now: float) -> None:
+        if self.spinners == 0:
+            self.spin_mark = now
+        self.spinners += 1
+
+    def _spin_tick(self, now: float) -> float:
+        # Counts the time since the last tick of any spinning waiter
+        spun = now - self.spin_mark
+        self.spin_mark = now
+        self.spun += spun
+        return spun
+
+    def _done(self, instance: str, t: float, deadline: float,
+              spun: float, now: float) -> float:
+        self.monitor.record(instance, now - deadline, spun)
+        return self.monitor.schedule_start + t
+
+    def wait(self, instance: str, t: float) -> float:
+        """
+        Blocks until t seconds after the start of the schedule and
+        returns the intended (wall clock) time of the request.
+        """
+        deadline = self.monitor.origin + t
+        now = time.monotonic()
+        if deadline - now > self.margin:
+            time.sleep(deadline - now - self.margin)
+            now = time.monotonic()
+        if now < deadline and not self._may_spin(now):
+            time.sleep(deadline - now)
+            now = time.monotonic()
+        spun = 0.0
+        if now < deadline:
+            self._spin_begin(now)
+            try:
+                while now < deadline:
+                    time.sleep(0)
+                    now = time.monotonic()
+                    spun += self._spin_tick(now)
+            finally:
+                self.spinners -= 1
+        return self._done(instance, t, deadline, spun, now)
+
+    async def wait_async(self, instance: str, t: float) -> float:
+        """
+        Waits on the event loop until t seconds after the start of the
+        schedule and returns the intended (wall clock) time of the
+        request.
+        """
+        deadline = self.monitor.origin + t
+        now = time.monotonic()
+        if deadline - now > self.margin:
+            await asyncio.sleep(deadline - now - self.margin)
+            now = time.monotonic()
+        if now < deadline and not self._may_spin(now):
+            await asyncio.sleep(deadline - now)
+            now = time.monotonic()
+        spun = 0.0
+        if now < deadline:
+            self._spin_begin(now)
+            try:
+                while now < deadline:
+                    await asyncio.sleep(0)
+                    now = time.monotonic()
+                    spun += self._spin_tick(now)
+            finally:
+                self.spinners -= 1
+        return self._done(instance, t, deadline, spun, now)
+
+
+class PacingMonitor:
+
+    def __init__(self, instances: List[str], config: Dict[str, Any]) -> None:
+        self.spin_margin = config.get('spin_margin_ms', DEFAULT_SPIN_MARGIN_MS) / 1000.0
+        self.spin_budget = config.get('spin_budget', DEFAULT_SPIN_BUDGET)
+        # Each histogram is only written by the pacer of its instance
+        self.histograms = {instance: LagHistogram(float('inf'), WAKE_BOUNDS_MS)
+                           for instance in instances}
+        self.spin = {instance: 0.0 for instance in instances}
+        self.schedule_start = None
+        self.origin = None
+
+    def start(self, schedule_start: float) -> None:
+        """
+        Anchors the schedule, which starts at the wall clock time
+        schedule_start, on the monotonic clock.
+        """
+        self.schedule_start = schedule_start
+        self.origin = time.monotonic() - (time.time() - schedule_start)
+
+    def pacer(self, pacers: int = 1) -> Pacer:
+        """
+        Returns a pacer for one of pacers dispatchers sharing the spin
+        budget.
+        """
+        return Pacer(self, self.spin_budget / pacers)
+
+    def record(self, instance: str, error: float, spun: float) -> None:
+        self.histograms[instance].add(error * 1000.0)
+        self.spin[instance] += spun
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        summary = {}
+        for (instance, h) in self.histograms.items():
+            summary[instance] = h.to_dict()
+            summary[instance]['spin_ms'] = self.spin[instance] * 1000.0
+        return summary
@@ -0,0 +1,86 @@
+"""
+Pre-serialized invocation requests. The URL with its query string,
+the headers and the body of the requests of an instance are the same
+for every dispatch, so they are encoded once when the instance is
+prepared and the resulting bytes are reused for every request.
+
+Data files sent to web actions are memory mapped instead of read into
+memory, so instances (and forked shards) sending the same file share
+one copy of it.
+"""
+import json
+import mmap
+import threading
+from mimetypes import MimeTypes
+from typing import Any, Dict, NamedTuple, Union
+from urllib.parse import urlencode
+
+
+class PreparedInvocation(NamedTuple):
+    url: str
+    headers: Dict[str, str]
+    body: Union[bytes, memoryview]
+
+
+def encode_url(base: str, parameters: Dict[str, Any]) -> str:
+    """
+    Appends the query parameters to a base URL that already carries
+    a query string. The parameters are encoded the same way requests
+    encodes a params dict.
+    """
+    return base + "&" + urlencode(parameters, doseq=True)
+
+
+def json_invocation(base_url: str, parameters: Dict[str, Any],
+                    args: Dict[str, Any]) -> PreparedInvocation:
+    return PreparedInvocation(encode_url(base_url, parameters),
+                              {'Content-Type': 'application/json'},
+                              json.dumps(args).encode('utf-8'))
+
+
+def binary_invocation(base_url: str, parameters: Dict[str, Any],
+                      mime: str, body: Union[bytes, memoryview]) -> PreparedInvocation:
+    return PreparedInvocation(encode_url(base_url, parameters),
+                              {'Content-Type': mime}, body)
+
+
+class PayloadCache:
+    """
+    Cache of memory mapped data files and their MIME types.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.maps: Dict[str, Any] = {}
+        self.bodies: Dict[str, Union[bytes, memoryview]] = {}
+        self.mimes: Dict[str, str] = {}
+
+    def data(self, path: str) -> Union[bytes, memoryview]:
+        with self.lock:
+            if path not in self.bodies:
+                with open(path, 'rb') as f:
+                    try:
+                        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    except ValueError:
+                        # Empty files cannot be mapped
+                        self.bodies[path] = b''
+                    else:
+                        self.maps[path] = m
+                        self.bodies[path] = memoryview(m)
+            return self.bodies[path]
+
+    def mime(self, path: str) -> str:
+        with self.lock:
+            if path not in self.mimes:
+                self.mimes[path] = MimeTypes().guess_type(path)[0]
+            return self.mimes[path]
+
+    def close(self) -> None:
+        with self.lock:
+            for body in self.bodies.values():
+                if isinstance(body, memoryview):
+                    body.release()
+            for m in self.maps.values():
+                m.close()
+            self.maps = {}
+            self.bodies = {}
@@ -0,0 +1,181 @@
+"""
+Burst and step-load phases. Phases are declared for the whole workload
+with the optional ``phases`` list and add requests to the schedules of
+several instances at exactly the same times, on top of their own
+arrival processes. All instances share the start of the schedule (the
+shards of a sharded run are released from a shared barrier with a
+common start time), so the requests of a phase arrive at the platform
+together, as in the thundering herds that drive cold starts.
+
+Every phase applies to the instances listed in ``instances``, or to all
+instances which follow a schedule if omitted. Two types of phases are
+supported, selected with ``type``:
+
+* ``burst``: ``size`` requests per instance at ``start`` seconds into
+  the test, spread uniformly at random over ``spread_ms`` milliseconds
+  (default 0, i.e. all at once). With ``period`` the burst is repeated
+  every ``period`` seconds until ``end`` (default the end of the test).
+  The spread must be shorter than the period.
+* ``step``: evenly spaced requests at ``rate`` per second and instance
+  from ``start`` until ``end``. Alternatively ``rates`` gives a list of
+  rates which are applied one after the other for ``step_duration``
+  seconds each (by default the interval is split equally). Every step
+  starts with a request on all instances at once.
+
+After the test the requests intended during every burst or step are
+summarized under ``phases`` in the test metadata: their number,
+failures, latency and, for bursts, the time from the burst until its
+last response (``drain_ms``), which bounds how fast the platform
+provisioned containers for it.
+"""
+import math
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from .arrival_processes import CHUNK_EVENTS
+
+PHASE_TYPES = {'burst', 'step'}
+
+#: Tolerance (in seconds) when matching logged requests to the windows
+#: of phases
+_EPSILON = 1e-6
+
+
+def phase_instances(workload: Dict[str, Any], phase: Dict[str, Any]) -> List[str]:
+    """
+    Returns the instances a phase applies to.
+    """
+    if phase.get('instances') is not None:
+        return phase['instances']
+    return [instance for (instance, desc) in workload['instances'].items()
+            if 'concurrency' not in desc.keys()]
+
+
+def _burst_starts(phase: Dict[str, Any], duration: float) -> np.ndarray:
+    start = phase.get('start', 0)
+    end = min(phase.get('end') or duration, duration)
+    if not phase.get('period'):
+        return np.array([start] if start < end else [], dtype=np.float64)
+    return np.arange(start, end, phase['period'], dtype=np.float64)
+
+
+def _step_windows(phase: Dict[str, Any], duration: float) -> List[Tuple[float, float, float]]:
+    """
+    Returns the start, end and rate of every step of a step phase.
+    """
+    rates = phase['rates'] if 'rates' in phase.keys() else [phase['rate']]
+    if len(rates) == 0:
+        return []
+    start = phase.get('start', 0)
+    end = min(phase.get('end') or duration, duration)
+    step = phase.get('step_duration') or (end - start) / len(rates)
+    windows = []
+    for (i, rate) in enumerate(rates):
+        window_start = start + i * step
+        window_end = min(window_start + step, end)
+        if window_start < window_end:
+            windows.append((window_start, window_end, rate))
+    return windows
+
+
+def _phase_windows(phase: Dict[str, Any], duration: float) -> List[Tuple[float, float]]:
+    if phase['type'] == 'burst':
+        spread = phase.get('spread_ms', 0) / 1000.0
+        return [(start, start + spread) for start in _burst_starts(phase, duration).tolist()]
+    return [(start, end) for (start, end, _) in _step_windows(phase, duration)]
+
+
+def _burst_stream(rng: np.random.Generator, phase: Dict[str, Any],
+                  duration: float) -> Iterator[np.ndarray]:
+    size = phase['size']
+    spread = phase.get('spread_ms', 0) / 1000.0
+    starts = _burst_starts(phase, duration)
+    per_chunk = max(1, CHUNK_EVENTS // max(size, 1))
+    for first in range(0, len(starts), per_chunk):
+        group = starts[first:first + per_chunk]
+        times = np.sort(np.repeat(group, size) + rng.random(len(group) * size) * spread)
+        times = times[times < duration]
+        if len(times) > 0:
+            yield times
+
+
+def _step_stream(phase: Dict[str, Any], duration: float) -> Iterator[np.ndarray]:
+    for (start, end, rate) in _step_windows(phase, duration):
+        if rate <= 0:
+            continue
+        count = math.ceil((end - start) * rate)
+        for first in range(0, count, CHUNK_EVENTS):
+            yield start + np.arange(first, min(first + CHUNK_EVENTS, count)) / rate
+
+
+def phase_requests(phase: Dict[str, Any], duration: float) -> float:
+    """
+    Returns the number of requests a phase adds to each of its
+    instances.
+    """
+    if phase['type'] == 'burst':
+        return phase['size'] * len(_burst_starts(phase, duration))
+    return sum((end - start) * rate for (start, end, rate) in _step_windows(phase, duration))
+
+
+def phase_event_stream(rng: np.random.Generator, phase: Dict[str, Any],
+                       duration: float) -> Iterator[np.ndarray]:
+    """
+    Yields the absolute event times a phase adds to the schedule of
+    each of its instances, in chunks.
+    """
+    if phase['type'] == 'burst':
+        return _burst_stream(rng, phase, duration)
+    return _step_stream(phase, duration)
+
+
+def _window_summary(log: Dict[str, np.ndarray], selected: np.ndarray,
+                    window_start: float) -> Dict[str, Any]:
+    ok = selected & (log['status'] >= 200) & (log['status'] <= 299)
+    latency = (log['received'][ok] - log['sent'][ok]) * 1000.0
+    summary = {'requests': int(selected.sum()),
+               'failures': int(selected.sum() - ok.sum()),
+               'latency_ms': None}
+    if len(latency) > 0:
+        (p50, p99) = np.percentile(latency, [50, 99])
+        summary['latency_ms'] = {'p50': float(p50), 'p99': float(p99),
+                                 'max': float(latency.max())}
+        summary['drain_ms'] = float(log['received'][ok].max() - window_start) * 1000.0
+    return summary
+
+
+def phase_summary(workload: Dict[str, Any], log: Dict[str, np.ndarray],
+                  schedule_start: float) -> List[Dict[str, Any]]:
+    """
+    Summarizes the requests of a request log intended during every
+    burst and step of the phases of a workload.
+    """
+    duration = workload['test_duration_in_seconds']
+    intended = log['intended'] - schedule_start
+    summaries = []
+    for phase in workload.get('phases', []):
+        instances = phase_instances(workload, phase)
+        of_phase = np.isin(log['instance_name'], instances)
+        windows = []
+        for (start, end) in _phase_windows(phase, duration):
+            # Bursts include their end, steps leave it to the next step
+            end = end + _EPSILON if phase['type'] == 'burst' else end - _EPSILON
+            selected = of_phase & (intended >= start - _EPSILON) & (intended < end)
+            window = _window_summary(log, selected, schedule_start + start)
+            window['start'] = start
+            windows.append(window)
+
+        summary: Dict[str, Any] = {'type': phase['type'], 'instances': instances}
+        if phase['type'] == 'burst':
+            drains = [w['drain_ms'] for w in windows if 'drain_ms' in w.keys()]
+            summary['bursts'] = windows
+            summary['drain_ms'] = {'mean': float(np.mean(drains)),
+                                   'max': float(np.max(drains))} if drains else None
+        else:
+            for (window, (_, _, rate)) in zip(windows, _step_windows(phase, duration)):
+                window['rate'] = rate
+                window.pop('drain_ms', None)
+            summary['steps'] = windows
+        summaries.append(summary)
+    return summaries
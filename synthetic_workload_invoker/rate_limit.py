@@ -0,0 +1,284 @@
+"""
+Client-side rate limiting and request outcome accounting. OpenWhisk
+rejects invocations with 429 once a namespace exceeds its
+``invocationsPerMinute`` or ``concurrentInvocations`` limits. Counted
+as plain failures, these rejections waste the run and cannot be told
+apart from the platform failing under load.
+
+With the optional ``rate_limit`` object of the workload specification,
+requests pass a token bucket before they are sent, one per namespace
+(``"scope": "namespace"``, default) or per action (``"scope":
+"action"``), refilled at ``invocations_per_minute`` and holding at most
+``burst`` tokens (default one second worth of requests). Throttled
+requests are retried up to ``max_retries`` times (default 3) after an
+exponential backoff with jitter starting at ``backoff_ms`` (default
+100) and capped at ``max_backoff_ms`` (default 10000), or after the
+time given by a Retry-After header. Every 429 also halves the refill
+rate of its bucket (at most once per second), which then recovers
+gradually with every successful request.
+
+Closed-loop instances take a token from the bucket of their namespace
+or action before every request too, but a throttled closed-loop
+request is not retried: its worker goes on with its next request. In a
+sharded run every shard holds its own buckets, so the rate and burst
+of a bucket are divided by the number of shards holding instances
+which share it.
+
+Whether or not a limiter is configured, throttled (429), retried,
+timed out and server error (5xx) requests, and requests delayed by the
+limiter, are counted. For each kind the count, the time of the first
+and last occurrence and the count per second of the test are stored
+under ``request_outcomes`` in the test metadata. Dispatch lag is
+measured before the limiter, so requests held back by the limiter do
+not flag the invoker as overloaded, and they do not hold up the
+dispatch of the following requests.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_MS = 100
+DEFAULT_MAX_BACKOFF_MS = 10000
+
+#: Fraction of the gap to the configured rate recovered per successful
+#: request
+RECOVERY = 0.01
+#: Lowest fraction of the configured rate backoff reduces a bucket to
+MIN_RATE_FRACTION = 0.05
+#: Minimum time (in seconds) between two reductions of the rate of a
+#: bucket, so that the responses to requests sent before a reduction
+#: do not reduce it again
+DECREASE_INTERVAL = 1.0
+
+OUTCOMES = ['throttled', 'retried', 'timed_out', 'server_error', 'limited']
+
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError, requests.exceptions.Timeout)
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.configured = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.decreased = float('-inf')
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how long (in seconds) the caller
+        must wait before using it. Tokens can be taken ahead of time,
+        so concurrent callers are spaced out.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def throttled(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.decreased >= DECREASE_INTERVAL:
+                self.rate = max(self.rate / 2, self.configured * MIN_RATE_FRACTION)
+                self.decreased = now
+
+    def succeeded(self) -> None:
+        with self.lock:
+            self.rate += (self.configured - self.rate) * RECOVERY
+
+
+def _bucket_key(config: Dict[str, Any], action: str) -> str:
+    return action if config.get('scope', 'namespace') == 'action' else ''
+
+
+def shard_shares(config: Dict[str, Any], actions: Dict[str, str],
+                 groups: List[List[str]]) -> Dict[str, int]:
+    """
+    Returns the number of shards holding instances of every bucket,
+    given the action of every instance and the instances of every
+    shard.
+    """
+    shares: Dict[str, int] = {}
+    for group in groups:
+        for key in set(_bucket_key(config, actions[instance]) for instance in group):
+            shares[key] = shares.get(key, 0) + 1
+    return shares
+
+
+class RateLimiter:
+
+    def __init__(self, config: Dict[str, Any], actions: Dict[str, str],
+                 shares: Optional[Dict[str, int]] = None) -> None:
+        """
+        Creates the buckets of the instances in actions, which maps
+        every instance to its action. With shares, the rate and burst
+        of every bucket are divided by its number of shards.
+        """
+        rate = config['invocations_per_minute'] / 60.0
+        capacity = config.get('burst', max(1.0, rate))
+        self.max_retries = config.get('max_retries', DEFAULT_MAX_RETRIES)
+        self.backoff = config.get('backoff_ms', DEFAULT_BACKOFF_MS) / 1000.0
+        self.max_backoff = config.get('max_backoff_ms', DEFAULT_MAX_BACKOFF_MS) / 1000.0
+        buckets: Dict[str, TokenBucket] = {}
+        for key in set(_bucket_key(config, action) for action in actions.values()):
+            share = (shares or {}).get(key, 1)
+            buckets[key] = TokenBucket(rate / share, capacity / share)
+        self.buckets = {instance: buckets[_bucket_key(config, action)]
+                        for (instance, action) in actions.items()}
+
+    def bucket(self, instance: str) -> TokenBucket:
+        return self.buckets[instance]
+
+    def retry_delay(self, attempt: int, retry_after: Optional[str]) -> Optional[float]:
+        """
+        Returns the delay (in seconds) before retrying a request
+        throttled after attempt retries, or None if it is not retried.
+        """
+        if attempt >= self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        try:
+            delay = max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+
+class DelayScheduler:
+    """
+    Sends the requests of the threaded engines which are held back by
+    the limiter or wait for a retry from a single thread, so that
+    waiting requests hold neither a dispatcher nor a sending thread.
+    """
+
+    def __init__(self) -> None:
+        self.queue: List[Any] = []
+        self.counter = itertools.count()
+        self.wakeup = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = False
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        with self.wakeup:
+            heapq.heappush(self.queue, (time.monotonic() + delay, next(self.counter), callback))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.wakeup.notify()
+
+    def stop(self) -> None:
+        """
+        Stops the thread once the pending requests have been sent.
+        """
+        with self.wakeup:
+            self.stopped = True
+            self.wakeup.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self.wakeup:
+                while not self.queue or self.queue[0][0] > time.monotonic():
+                    if self.stopped and not self.queue:
+                        return
+                    self.wakeup.wait(self.queue[0][0] - time.monotonic() if self.queue else None)
+                (_, _, callback) = heapq.heappop(self.queue)
+            try:
+                callback()
+            except Exception:
+                # Callbacks complete their requests themselves, a
+                # failing one must not stop the sending of the others
+                pass
+
+
+class OutcomeCounters:
+
+    def __init__(self) -> None:
+        self.schedule_start = None
+        self.lock = threading.Lock()
+        self.outcomes = {kind: {'count': 0, 'first': None, 'last': None, 'per_second': []}
+                         for kind in OUTCOMES}
+        self.limited_delay = 0.0
+
+    def start(self, schedule_start: float) -> None:
+        """
+        Sets the start of the schedule from which the per-second
+        counts are counted.
+        """
+        self.schedule_start = schedule_start
+
+    def record(self, kind: str, when: float) -> None:
+        second = max(0, int(when - (self.schedule_start or when)))
+        with self.lock:
+            outcome = self.outcomes[kind]
+            outcome['count'] += 1
+            if outcome['first'] is None:
+                outcome['first'] = when
+            outcome['last'] = when
+            per_second = outcome['per_second']
+            if len(per_second) <= second:
+                per_second.extend([0] * (second + 1 - len(per_second)))
+            per_second[second] += 1
+
+    def response(self, status: int, when: float) -> None:
+        """
+        Records the outcome of a response with the given status.
+        """
+        if status == 429:
+            self.record('throttled', when)
+        elif status >= 500:
+            self.record('server_error', when)
+
+    def failure(self, error: BaseException, when: float) -> None:
+        """
+        Records a request which failed without a response.
+        """
+        if isinstance(error, TIMEOUT_ERRORS):
+            self.record('timed_out', when)
+
+    def limited(self, when: float, delay: float) -> None:
+        self.record('limited', when)
+        with self.lock:
+            self.limited_delay += delay
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            summary: Dict[str, Any] = {
+                kind: dict(outcome, per_second=list(outcome['per_second']))
+                for (kind, outcome) in self.outcomes.items()}
+            summary['limited']['delay_ms'] = self.limited_delay * 1000.0
+        return summary
+
+
+def merge_outcomes(into: Dict[str, Any], other: Dict[str, Any]) -> None:
+    """
+    Adds the request outcomes other to into. Both must be counted
+    from the same schedule start.
+    """
+    for kind in OUTCOMES:
+        if kind not in into.keys():
+            into[kind] = other[kind]
+            continue
+        (a, b) = (into[kind], other[kind])
+        a['count'] += b['count']
+        firsts = [t for t in (a['first'], b['first']) if t is not None]
+        lasts = [t for t in (a['last'], b['last']) if t is not None]
+        a['first'] = min(firsts) if firsts else None
+        a['last'] = max(lasts) if lasts else None
+        if len(a['per_second']) < len(b['per_second']):
+            a['per_second'].extend([0] * (len(b['per_second']) - len(a['per_second'])))
+        for (second, count) in enumerate(b['per_second']):
+            a['per_second'][second] += count
+        if 'delay_ms' in b.keys():
+            a['delay_ms'] = a.get('delay_ms', 0.0) + b['delay_ms']
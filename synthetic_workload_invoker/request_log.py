@@ -0,0 +1,152 @@
+"""
+Client-side timing log of the requests sent by the invoker. For every
+request the log records the intended dispatch time, the time the
+request was actually sent, the time its response was received, the
+HTTP status, the size of the response body and the activation id
+returned by OpenWhisk. All times are UNIX timestamps in seconds.
+
+Records are kept in preallocated NumPy arrays which are appended to
+one binary file per column whenever they fill up, so the memory used
+by the log does not grow with the number of requests. A log directory
+contains the column files and a ``schema.json`` describing them and
+can be read back with read_request_log.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from commons import util
+
+#: Number of records buffered in memory before they are written out
+CHUNK_SIZE = 65536
+
+COLUMNS = {
+    'instance': np.dtype('u2'),
+    'intended': np.dtype('f8'),
+    'sent': np.dtype('f8'),
+    'received': np.dtype('f8'),
+    'status': np.dtype('i2'),
+    'size': np.dtype('u4'),
+    'activation_id': np.dtype('S32'),
+}
+
+SCHEMA_FILE = "schema.json"
+
+
+def activation_id_of(headers, body: bytes) -> str:
+    """
+    Extracts the activation id from an OpenWhisk response. Web actions
+    return it in a header, while the actions API returns it in the
+    body of non-blocking invocations.
+    """
+    activation_id = headers.get('X-Openwhisk-Activation-Id')
+    if activation_id:
+        return activation_id
+    if len(body) < 256 and b'activationId' in body:
+        try:
+            return json.loads(body)['activationId']
+        except (ValueError, KeyError, TypeError):
+            pass
+    return ''
+
+
+class RequestLog:
+
+    def __init__(self, path: str, instances: List[str],
+                 chunk_size: int = CHUNK_SIZE) -> None:
+        self.path = util.ensure_directory_exists(path)
+        self.instances = list(instances)
+        self.instance_index = {instance: i for (i, instance) in enumerate(self.instances)}
+        self.chunk = {name: np.zeros(chunk_size, dtype=dtype)
+                      for (name, dtype) in COLUMNS.items()}
+        self.chunk_size = chunk_size
+        self.fill = 0
+        self.count = 0
+        self.lock = threading.Lock()
+        self.files = {name: open(os.path.join(self.path, name + ".bin"), 'wb')
+                      for name in COLUMNS.keys()}
+
+    def record(self, instance: str, intended: float, sent: float,
+               received: float, status: int, size: int,
+               activation_id: str) -> None:
+        with self.lock:
+            i = self.fill
+            chunk = self.chunk
+            chunk['instance'][i] = self.instance_index[instance]
+            chunk['intended'][i] = intended
+            chunk['sent'][i] = sent
+            chunk['received'][i] = received
+            chunk['status'][i] = status
+            chunk['size'][i] = size
+            chunk['activation_id'][i] = activation_id.encode('ascii', 'ignore')
+            self.fill += 1
+            if self.fill == self.chunk_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        for (name, column) in self.chunk.items():
+            column[:self.fill].tofile(self.files[name])
+        self.count += self.fill
+        self.fill = 0
+
+    def close(self) -> None:
+        """
+        Writes out the buffered records and the schema of the log.
+        """
+        with self.lock:
+            self._flush()
+            for f in self.files.values():
+                f.close()
+            schema = {'count': self.count,
+                      'instances': self.instances,
+                      'columns': {name: dtype.str for (name, dtype) in COLUMNS.items()}}
+            with open(os.path.join(self.path, SCHEMA_FILE), 'w') as f:
+                f.write(json.dumps(schema))
+
+
+def read_request_log(path: str) -> Dict[str, np.ndarray]:
+    """
+    Reads the request log in path. The columns are memory mapped
+    and an ``instance_name`` column is added. The logs written by the
+    shards of a sharded run are stored in subdirectories of path and
+    are concatenated.
+    """
+    schema_file = os.path.join(path, SCHEMA_FILE)
+    if not os.path.exists(schema_file):
+        shards = sorted(os.path.join(path, d) for d in os.listdir(path)
+                        if os.path.isdir(os.path.join(path, d)))
+        if len(shards) == 0:
+            raise FileNotFoundError(schema_file)
+        logs = [read_request_log(shard) for shard in shards]
+        return {name: np.concatenate([log[name] for log in logs])
+                for name in list(COLUMNS.keys()) + ['instance_name']}
+
+    with open(schema_file) as f:
+        schema = json.load(f)
+
+    log: Dict[str, np.ndarray] = {}
+    for (name, dtype) in schema['columns'].items():
+        if schema['count'] == 0:
+            log[name] = np.zeros(0, dtype=dtype)
+        else:
+            log[name] = np.memmap(os.path.join(path, name + ".bin"),
+                                  dtype=dtype, mode='r', shape=(schema['count'],))
+    log['instance_name'] = np.array(schema['instances'], dtype=object)[log['instance']]
+    return log
+
+
+def latency_summary(log: Dict[str, np.ndarray]) -> Optional[Dict[str, float]]:
+    """
+    Returns percentiles of the client-observed latency in
+    milliseconds of the successful requests in a request log.
+    """
+    ok = (log['status'] >= 200) & (log['status'] <= 299)
+    latency = (log['received'][ok] - log['sent'][ok]) * 1000.0
+    if len(latency) == 0:
+        return None
+    (p50, p90, p99, p999) = np.percentile(latency, [50, 90, 99, 99.9])
+    return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99),
+            'p99.9': float(p999), 'max': float(latency.max())}
@@ -0,0 +1,169 @@
+"""
+Compiled schedule cache. Generating the schedule of a workload is
+deterministic given its specification and random seed, so instead of
+regenerating it for every run, the schedule is compiled once into a
+binary file in SCHEDULE_CACHE_DIR and memory mapped by later runs.
+Every run of the same specification thereby sees the identical
+timeline.
+
+A compiled schedule is a directory named after the hash of the
+schedule relevant parts of the workload (the test duration, the seed,
+the arrival process of every instance, the phases and the size and
+modification time of replayed trace files). It holds ``schedule.f8``,
+the event times of all instances as consecutive float64 arrays, and
+``index.json``, giving the offset and event count of each instance.
+Schedules are compiled chunk by chunk, so compiling does not hold a
+whole schedule in memory.
+
+The cache is bounded to SCHEDULE_CACHE_SIZE bytes. When it grows
+beyond that, the least recently used schedules are removed.
+
+Caching is enabled per workload with ``"schedule_cache": true``.
+Workloads without a random seed are never cached.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from GenConfigs import *
+from commons import util
+from commons.Logger import ScriptLogger
+from .trace_replay import trace_file_stat
+
+#: Version of the schedule format and of the arrival processes. Must
+#: be increased when the generated schedules change.
+SCHEDULE_FORMAT_VERSION = 1
+
+INDEX_FILE = "index.json"
+SCHEDULE_FILE = "schedule.f8"
+
+#: Instance fields which do not affect the schedule
+_NON_SCHEDULE_FIELDS = {'application', 'param_file', 'query_string', 'data_file'}
+
+
+def _schedule_spec(desc: Dict[str, Any]) -> Dict[str, Any]:
+    spec = {k: v for (k, v) in desc.items() if k not in _NON_SCHEDULE_FIELDS}
+    if 'trace' in desc.keys():
+        spec['trace_file_stat'] = trace_file_stat(desc['trace'])
+    return spec
+
+
+def schedule_key(workload: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns the cache key of the schedule of a workload, or None if
+    the schedule is not deterministic.
+    """
+    if workload.get('random_seed') is None:
+        return None
+    spec = {'version': SCHEDULE_FORMAT_VERSION,
+            'duration': workload['test_duration_in_seconds'],
+            'seed': workload['random_seed'],
+            'phases': workload.get('phases', []),
+            'instances': {instance: _schedule_spec(desc)
+                          for (instance, desc) in workload['instances'].items()
+                          if 'concurrency' not in desc.keys()}}
+    encoded = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _entry_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+class ScheduleCache:
+
+    def __init__(self, cache_dir: str = SCHEDULE_CACHE_DIR,
+                 max_size: int = SCHEDULE_CACHE_SIZE) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, np.ndarray], int]]:
+        """
+        Maps a compiled schedule. Returns the event times of every
+        instance, as read-only memory mapped arrays, and the event
+        count, or None if the schedule is not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, INDEX_FILE), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # The modification time of the index records the last use. A
+        # read-only cache is still used, it is just not reordered.
+        try:
+            os.utime(os.path.join(path, INDEX_FILE))
+        except OSError:
+            pass
+
+        if index['event_count'] > 0:
+            data = np.memmap(os.path.join(path, SCHEDULE_FILE), dtype=np.float64, mode='r')
+        else:
+            data = np.empty(0)
+        all_events = {instance: data[offset:offset + count]
+                      for (instance, (offset, count)) in index['instances'].items()}
+        return (all_events, index['event_count'])
+
+    def compile(self, key: str, streams: Dict[str, Iterable[np.ndarray]]) -> None:
+        """
+        Writes a schedule, given as streams of chunks of event times
+        per instance, into the cache.
+        """
+        logger = ScriptLogger('schedule_cache', "SWI.log")
+        logger.info("Compiling schedule " + key + " into " + self.cache_dir +
+                    " (bounded to " + str(self.max_size) + " bytes)")
+        util.ensure_directory_exists(self.cache_dir)
+        tmp = tempfile.mkdtemp(prefix=".compile_", dir=self.cache_dir)
+        try:
+            instances = {}
+            offset = 0
+            with open(os.path.join(tmp, SCHEDULE_FILE), 'wb') as f:
+                for (instance, stream) in streams.items():
+                    count = 0
+                    for chunk in stream:
+                        np.asarray(chunk, dtype=np.float64).tofile(f)
+                        count += len(chunk)
+                    instances[instance] = [offset, count]
+                    offset += count
+            with open(os.path.join(tmp, INDEX_FILE), 'w') as f:
+                f.write(json.dumps({'event_count': offset,
+                                    'instances': instances}))
+            try:
+                os.rename(tmp, self._path(key))
+            except OSError:
+                # Compiled concurrently by another invoker
+                pass
+        finally:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Removes the least recently used schedules until the cache is
+        no larger than max_size. The schedule keep is never removed.
+        """
+        entries: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.cache_dir):
+            path = self._path(name)
+            index = os.path.join(path, INDEX_FILE)
+            if name.startswith('.') or not os.path.exists(index):
+                continue
+            entries.append((os.path.getmtime(index), _entry_size(path), name))
+
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, name) in sorted(entries):
+            if total <= self.max_size:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(self._path(name), ignore_errors=True)
+            total -= size
@@ -0,0 +1,197 @@
+"""
+Null-endpoint self-benchmark. Measures how fast the invoker itself can
+dispatch requests, so that results of real tests can be checked
+against the invoker's own ceiling.
+
+A local HTTP server standing in for OpenWhisk is started in a separate
+process. It answers requests to the actions API
+(``/api/v1/namespaces/<namespace>/actions/``) with 202 and an
+activation id, or with 200 for blocking requests, and requests to web
+actions (``/api/v1/web/guest/default/``) with 200, without doing any
+work. The invoker is then run against it for every combination of
+engine, total request rate and instance count of the sweep. Half of
+the instances invoke actions, the other half web actions with a small
+data file.
+
+For every point of the sweep the achieved request rate (over the time
+the point actually took, from its start to its end time), the dispatch
+lag, the CPU time used by the invoker per request and whether the
+invoker was overloaded are reported. Nothing but the local machine is
+needed, neither the wsk CLI nor an OpenWhisk deployment.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import tempfile
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+from commons import util
+from GenConfigs import *
+from synthetic_workload_invoker.WorkloadInvoker import WorkloadInvoker
+
+DEFAULT_RATES = [100, 500, 1000, 2000, 5000]
+DEFAULT_INSTANCE_COUNTS = [1, 4, 16]
+DEFAULT_DURATION = 10
+
+NAMESPACE = "guest"
+AUTH = "null:endpoint"
+
+
+async def _handle(request: web.Request) -> web.Response:
+    await request.read()
+    if request.path.startswith("/api/v1/web/"):
+        return web.Response(status=200)
+    status = 200 if request.query.get('blocking') == 'True' else 202
+    return web.json_response({'activationId': os.urandom(16).hex()},
+                             status=status)
+
+
+async def _serve(sock: socket.socket) -> None:
+    app = web.Application()
+    app.router.add_route('POST', '/{tail:.*}', _handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.SockSite(runner, sock).start()
+    await asyncio.Event().wait()
+
+
+def _null_server(sock: socket.socket) -> None:
+    asyncio.run(_serve(sock))
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class SelfBenchmark:
+
+    def __init__(self,
+                 engines: List[str],
+                 rates: List[float] = DEFAULT_RATES,
+                 instance_counts: List[int] = DEFAULT_INSTANCE_COUNTS,
+                 duration: int = DEFAULT_DURATION) -> None:
+        for engine in engines:
+            if engine not in WorkloadInvoker.supported_engines:
+                raise Exception("Unsupported engine %s" % engine)
+        self.engines = engines
+        self.rates = rates
+        self.instance_counts = instance_counts
+        self.duration = duration
+        self.workdir = None
+        self.data_file = None
+
+    def _workload(self, engine: str, rate: float, instance_count: int) -> str:
+        instances = {}
+        for i in range(instance_count):
+            desc: Dict[str, Any] = {'application': "null",
+                                    'distribution': "Uniform",
+                                    'rate': rate / instance_count,
+                                    'activity_window': None}
+            if i % 2 == 1:
+                desc['data_file'] = self.data_file
+            instances["instance%s" % i] = desc
+        workload = {'test_name': "selfbench_%s_%s_%s" % (engine, rate, instance_count),
+                    'test_duration_in_seconds': self.duration,
+                    'random_seed': 100,
+                    'blocking_cli': False,
+                    'engine': engine,
+                    'instances': instances,
+                    'perf_monitoring': {'runtime_script': None,
+                                        'post_script': None}}
+        path = os.path.join(self.workdir, workload['test_name'] + ".json")
+        with open(path, 'w') as f:
+            f.write(json.dumps(workload))
+        return path
+
+    def _run_point(self, wsk_properties: Dict[str, str], engine: str,
+                   rate: float, instance_count: int) -> Dict[str, Any]:
+        invoker = WorkloadInvoker(self._workload(engine, rate, instance_count),
+                                  wsk_properties=wsk_properties)
+        cpu_start = _cpu_seconds()
+        try:
+            metadata = invoker.invoke_benchmark()
+        finally:
+            invoker.close()
+        cpu = _cpu_seconds() - cpu_start
+
+        requests = metadata['successes'] + metadata['failures']
+        # A point which falls behind takes longer than its nominal
+        # duration, so the rate is computed from the time it took
+        elapsed = (metadata['end_time'] - metadata['start_time']) / 1000.0
+        if elapsed <= 0:
+            elapsed = self.duration
+        # Instances which dispatched no requests have no lag samples
+        lags = list(metadata['dispatch_lag'].values()) or [
+            {'mean_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}]
+        point = {'engine': engine,
+                 'rate': rate,
+                 'instances': instance_count,
+                 'runid': metadata['runid'],
+                 'achieved_rps': metadata['successes'] / elapsed,
+                 'elapsed_s': elapsed,
+                 'failures': metadata['failures'],
+                 'lag_mean_ms': max(lag['mean_ms'] for lag in lags),
+                 'lag_p99_ms': max(lag['p99_ms'] for lag in lags),
+                 'lag_max_ms': max(lag['max_ms'] for lag in lags),
+                 'cpu_ms_per_request': 1000.0 * cpu / requests if requests else None,
+                 'overloaded': bool(metadata['overloaded_instances'])}
+        print("%-8s %8s rps x %3s instances: %9.1f rps, lag p99 %7.1f ms, %.3f ms CPU/request%s" %
+              (engine, rate, instance_count, point['achieved_rps'], point['lag_p99_ms'],
+               point['cpu_ms_per_request'] or 0.0,
+               ", overloaded" if point['overloaded'] else ""))
+        return point
+
+    def run(self) -> Dict[str, Any]:
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1024)
+        port = sock.getsockname()[1]
+        server = multiprocessing.get_context('fork').Process(target=_null_server,
+                                                             args=(sock,), daemon=True)
+        server.start()
+        sock.close()
+
+        wsk_properties = {'apihost': "http://127.0.0.1:%s" % port,
+                          'auth': AUTH,
+                          'namespace': NAMESPACE}
+        points = []
+        # The workloads and their data file only live for the run
+        self.workdir = tempfile.mkdtemp(prefix="selfbench_")
+        self.data_file = os.path.join(self.workdir, "payload.bin")
+        with open(self.data_file, 'wb') as f:
+            f.write(os.urandom(1024))
+        try:
+            for engine in self.engines:
+                for instance_count in self.instance_counts:
+                    for rate in self.rates:
+                        points.append(self._run_point(wsk_properties, engine,
+                                                      rate, instance_count))
+        finally:
+            server.terminate()
+            server.join()
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+        ceilings = {}
+        for engine in self.engines:
+            sustained = [p['achieved_rps'] for p in points
+                         if p['engine'] == engine and not p['overloaded']]
+            ceilings[engine] = {
+                'max_rps': max(p['achieved_rps'] for p in points if p['engine'] == engine),
+                'max_rps_without_overload': max(sustained) if sustained else None}
+
+        result = {'duration': self.duration,
+                  'ceilings': ceilings,
+                  'points': points}
+        destfile = os.path.join(util.ensure_directory_exists(DATA_DIR),
+                                "selfbench_%s.json" % util.gen_random_hex_string(7).strip())
+        with open(destfile, 'w') as f:
+            f.write(json.dumps(result))
+        print("Wrote self-benchmark results to", destfile)
+        return result
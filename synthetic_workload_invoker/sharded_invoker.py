@@ -0,0 +1,262 @@
+"""
+Multi-process sharded dispatch. The instances of a workload are split
+across a number of worker processes, each pinned to a CPU of the
+invoker CPU set, so that the load generated by a single host is not
+limited by what one Python process can dispatch.
+
+Workers are forked from the invoker, generate the events of their own
+instances and then wait on a shared barrier, which the invoker passes
+once every worker is ready, together with a common start time of the
+schedule. This makes all shards start dispatching at the same time.
+When a worker is done it reports its success/failure/expected
+tallies, its dispatch lag, its closed-loop results and its transport
+statistics back to the invoker, which adds them to its own so that
+the run is described by a single InvocationMetadata.
+
+Sharding is enabled by setting ``"shards"`` to a value larger than one
+in the workload specification. The CPUs used by the workers are taken
+from ``"shard_cpu_set"`` or from ``INVOKER_CPU_SET`` in GenConfigs.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from GenConfigs import *
+from commons import util
+from .EventGenerator import event_streams
+from .arrival_processes import mean_rate
+from .closed_loop import concurrency_levels
+from .phases import phase_instances, phase_requests
+from .rate_limit import merge_outcomes, shard_shares
+
+#: Delay (in seconds) between releasing the shards and the common start
+#: of their schedules, which covers the wake-up of the workers
+START_DELAY = 0.05
+
+#: Interval (in seconds) at which the invoker checks that the shards it
+#: waits for are still alive
+LIVENESS_INTERVAL = 1.0
+
+
+def _instance_load(desc: Dict[str, Any], duration: float) -> float:
+    """
+    Returns the approximate number of requests generated by an
+    instance. Used to balance instances across shards.
+    """
+    if 'interarrivals_list' in desc.keys():
+        return len(desc['interarrivals_list'])
+    if 'trace' in desc.keys():
+        # Trace files are not read ahead, an optional rate gives the
+        # expected average rate of the replayed trace
+        return desc.get('rate', 1) * duration
+    window = desc.get('activity_window') or [0, duration]
+    length = max(0, min(window[1], duration) - window[0])
+    if 'concurrency' in desc.keys():
+        # Assume about one request per second per outstanding request
+        return max(concurrency_levels(desc)) * length
+    if 'distribution' not in desc.keys():
+        # Driven only by phases
+        return 0.0
+    return mean_rate(desc) * length
+
+
+def split_instances(workload: Dict[str, Any], shards: int) -> List[List[str]]:
+    """
+    Splits the instances of a workload into (at most) shards groups
+    of approximately equal load by assigning each instance, heaviest
+    first, to the least loaded shard.
+    """
+    duration = workload['test_duration_in_seconds']
+    instance_loads = {instance: _instance_load(desc, duration)
+                      for (instance, desc) in workload['instances'].items()}
+    for phase in workload.get('phases', []):
+        for instance in phase_instances(workload, phase):
+            if instance in instance_loads:
+                instance_loads[instance] += phase_requests(phase, duration)
+    instances = sorted(instance_loads.items(), key=lambda x: x[1], reverse=True)
+    groups: List[List[str]] = [[] for _ in range(min(shards, len(instances)))]
+    loads = [0.0] * len(groups)
+    for (instance, load) in instances:
+        target = loads.index(min(loads))
+        groups[target].append(instance)
+        loads[target] += load
+    return groups
+
+
+async def _dispatch(invoker, all_events: Dict[str, Iterable[np.ndarray]]) -> None:
+    try:
+        await invoker.dispatch_events(all_events)
+    finally:
+        if invoker.transport is not None:
+            await invoker.transport.aclose()
+            invoker.transport.close()
+
+
+def _shard_worker(invoker, shard: int, groups: List[List[str]], cpus: str,
+                  barrier, schedule_start, results) -> None:
+    """
+    Entry point of a worker process.
+    """
+    try:
+        util.set_cpu_affinity(cpus)
+        instances = groups[shard]
+        workload = dict(invoker.workload)
+        if 'rate_limit' in workload.keys():
+            invoker.rate_limit_shares = shard_shares(
+                workload['rate_limit'],
+                {i: desc['application'] for (i, desc) in workload['instances'].items()},
+                groups)
+        workload['instances'] = {i: workload['instances'][i] for i in instances}
+        invoker.workload = workload
+        invoker.tally_lock = threading.Lock()
+        # Connections and event loops of the parent are not usable
+        # after a fork
+        invoker.transport = None
+        invoker.loop = None
+        invoker.request_log_dir = os.path.join(invoker.request_log_dir,
+                                               "shard%s" % shard)
+
+        (all_events, event_count) = event_streams(workload)
+        results.put(('ready', shard, event_count))
+        barrier.wait()
+        invoker.schedule_start_at = schedule_start.value
+
+        asyncio.run(_dispatch(invoker, all_events))
+        results.put(('done', shard, {'successes': invoker.invocation_success_tally,
+                                     'failures': invoker.invocation_failure_tally,
+                                     'expected': invoker.invocation_expected_tally,
+                                     'dispatch_lag': invoker.dispatch_lag,
+                                     'pacing': invoker.pacing,
+                                     'request_outcomes': invoker.request_outcomes,
+                                     'overloaded_instances': invoker.overloaded_instances,
+                                     'aborted': invoker.dispatch_aborted,
+                                     'closed_loop': invoker.closed_loop,
+                                     'transport': invoker.transport_stats}))
+    except Exception as e:
+        barrier.abort()
+        results.put(('error', shard, str(e)))
+
+
+class ShardedDispatch:
+
+    def __init__(self, invoker, shards: int, cpu_set: str) -> None:
+        cpus = util.parse_cpu_set(cpu_set)
+        overlap = set(cpus) & set(util.parse_cpu_set(SYSTEM_CPU_SET))
+        if overlap:
+            raise Exception("Shard CPU set %s overlaps SYSTEM_CPU_SET on CPUs %s" %
+                            (cpu_set, sorted(overlap)))
+
+        self.invoker = invoker
+        self.groups = split_instances(invoker.workload, shards)
+        self.cpus = cpus
+        self.context = multiprocessing.get_context('fork')
+        self.barrier = self.context.Barrier(len(self.groups) + 1)
+        self.schedule_start = self.context.Value('d', 0.0)
+        self.results = self.context.Queue()
+        self.processes: List[Any] = []
+
+    def _fail(self, message: str) -> None:
+        """
+        Stops all shards and raises.
+        """
+        self.barrier.abort()
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join()
+        raise Exception(message)
+
+    def _collect(self, kind: str) -> List[Any]:
+        """
+        Waits for a message of the given kind from every shard and
+        returns their payloads. Raises, and stops the other shards, if
+        any shard reports an error or exits without reporting.
+        """
+        payloads = {}
+        while len(payloads) < len(self.groups):
+            try:
+                (msg, shard, payload) = self.results.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                for (shard, process) in enumerate(self.processes):
+                    if shard not in payloads.keys() and process.exitcode is not None:
+                        # The message of a shard may arrive just after it exited
+                        try:
+                            (msg, shard, payload) = self.results.get(timeout=LIVENESS_INTERVAL)
+                            break
+                        except queue.Empty:
+                            self._fail("Shard %s exited with code %s" %
+                                       (shard, process.exitcode))
+                else:
+                    continue
+            if msg == 'error':
+                self._fail("Shard %s failed: %s" % (shard, payload))
+            if msg == kind:
+                payloads[shard] = payload
+        return [payloads[shard] for shard in sorted(payloads.keys())]
+
+    async def start(self) -> Optional[int]:
+        """
+        Forks the worker processes and waits until all of them have
+        generated their events. Returns the total event count, or None
+        if the schedules are generated lazily.
+        """
+        util.ensure_directory_exists(self.invoker.request_log_dir)
+        for (shard, instances) in enumerate(self.groups):
+            cpu = str(self.cpus[shard % len(self.cpus)])
+            self.invoker.logger.info("Shard %s on CPU %s: %s" %
+                                     (shard, cpu, ", ".join(instances)))
+            process = self.context.Process(
+                target=_shard_worker,
+                args=(self.invoker, shard, self.groups, cpu, self.barrier,
+                      self.schedule_start, self.results))
+            process.start()
+            self.processes.append(process)
+
+        loop = asyncio.get_running_loop()
+        event_counts = await loop.run_in_executor(None, self._collect, 'ready')
+        if None in event_counts:
+            return None
+        return sum(event_counts)
+
+    async def release(self) -> None:
+        """
+        Releases the barrier and waits for all shards to finish. The
+        tallies of the shards are added to those of the invoker.
+        """
+        loop = asyncio.get_running_loop()
+        # All shards start their schedules at the same time
+        self.schedule_start.value = time.time() + START_DELAY
+        self.invoker.schedule_start = self.schedule_start.value
+        await loop.run_in_executor(None, self.barrier.wait)
+        tallies = await loop.run_in_executor(None, self._collect, 'done')
+        for process in self.processes:
+            process.join()
+
+        invoker = self.invoker
+        with invoker.tally_lock:
+            for result in tallies:
+                invoker.invocation_success_tally += result['successes']
+                invoker.invocation_failure_tally += result['failures']
+                invoker.invocation_expected_tally += result['expected']
+                invoker.dispatch_lag.update(result['dispatch_lag'])
+                invoker.pacing.update(result['pacing'])
+                merge_outcomes(invoker.request_outcomes, result['request_outcomes'])
+                invoker.overloaded_instances.extend(result['overloaded_instances'])
+                invoker.dispatch_aborted |= result['aborted']
+                invoker.closed_loop.update(result['closed_loop'])
+                for (key, value) in result['transport'].items():
+                    if key != 'reuse_ratio':
+                        invoker.transport_stats[key] = \
+                            invoker.transport_stats.get(key, 0) + value
+
+        sent = invoker.transport_stats.get('requests', 0)
+        if sent:
+            invoker.transport_stats['reuse_ratio'] = \
+                1.0 - invoker.transport_stats['connections_created'] / sent
@@ -0,0 +1,92 @@
+"""
+Merged timeline dispatch engine. Instead of one sleeping thread per
+instance, the schedules of all instances are merged into a single
+ordered stream of (time, instance) events, which a small, fixed pool
+of dispatcher threads works through, firing each request at its
+absolute deadline. Adding instances therefore adds events to a stream
+rather than threads contending for the GIL.
+
+Instances are assigned to dispatchers, balanced by their expected
+load, and each dispatcher merges the timelines of its own instances.
+An instance is only ever handled by one dispatcher, so its dispatch
+lag, request log entries and tallies are accounted exactly as with
+the threaded engine.
+
+The engine is selected by setting ``"engine": "timeline"`` in the
+workload specification, and the size of the pool with
+``"dispatchers"``.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .EventGenerator import merge_timelines
+from .inflight import CompletionTracker
+from .pacing import Pacer
+from .sharded_invoker import split_instances
+
+DEFAULT_DISPATCHERS = 4
+
+
+class TimelineDispatchEngine:
+
+    def __init__(self, invoker, blocking_cli: bool, max_outstanding: int,
+                 dispatchers: int) -> None:
+        self.invoker = invoker
+        self.blocking_cli = blocking_cli
+        self.max_outstanding = max_outstanding
+        self.dispatchers = dispatchers
+
+    def _dispatcher(self, instances: List[str],
+                    streams: List[Iterable[np.ndarray]], pacer: Pacer) -> None:
+        invoker = self.invoker
+        session = invoker.transport.futures_session()
+        prepared = [invoker.prepare_invocation(instance, self.blocking_cli)
+                    for instance in instances]
+        aborted = invoker.lag_monitor.aborted
+
+        for (times, indices) in merge_timelines(streams):
+            with invoker.tally_lock:
+                invoker.invocation_expected_tally += len(times)
+            for (t, i) in zip(times.tolist(), indices.tolist()):
+                intended = pacer.wait(instances[i], t)
+                if aborted.is_set():
+                    return
+                invoker.completions.acquire()
+                invoker.lag_monitor.record(instances[i], time.time() - intended)
+                invoker.send_request(session, instances[i], prepared[i], intended)
+
+    async def run(self, all_events: Dict[str, Iterable[np.ndarray]]) -> None:
+        """
+        Dispatches the requests of all instances in all_events, given
+        as streams of chunks of event times, and waits for their
+        responses.
+        """
+        invoker = self.invoker
+        invoker.completions = CompletionTracker(self.max_outstanding)
+
+        workload = dict(invoker.workload)
+        workload['instances'] = {instance: workload['instances'][instance]
+                                 for instance in all_events.keys()}
+        groups = split_instances(workload, self.dispatchers)
+        threads = []
+        for instances in groups:
+            threads.append(threading.Thread(
+                target=self._dispatcher,
+                args=[instances, [all_events[instance] for instance in instances],
+                      invoker.pacing_monitor.pacer(len(groups))]))
+
+        for thread in threads:
+            thread.start()
+
+        loop = asyncio.get_running_loop()
+        for thread in threads:
+            await loop.run_in_executor(None, thread.join)
+        await loop.run_in_executor(None, invoker.completions.wait)
+
+        with invoker.tally_lock:
+            invoker.invocation_success_tally += invoker.completions.successes
+            invoker.invocation_failure_tally += invoker.completions.failures
@@ -0,0 +1,176 @@
+"""
+Replay of external arrival traces. Instead of embedding an
+``interarrivals_list`` in the workload specification, an instance can
+reference a trace file with a ``trace`` object. The file is read in
+batches of READ_ROWS rows and converted into chunks of absolute event
+times (in seconds from the start of the test) while the schedule is
+consumed, so traces with millions of rows are never loaded as a whole.
+
+Two kinds of traces are supported, selected with ``format``:
+
+* ``timestamps`` (default): one row per invocation, with the time of
+  the invocation in ``timestamp_column`` (default ``timestamp``), in
+  the unit ``timestamp_unit`` (``s``, ``ms`` or ``us``, default ``s``).
+  Rows must be sorted by time. The time given by ``origin`` (by default
+  the first selected invocation) is replayed at the start of the test.
+* ``counts``: one row per function, with the number of invocations in
+  consecutive bins of ``bin_seconds`` (default 60) seconds in the
+  columns named ``1``, ``2``, ... as in the Azure Functions traces.
+  Invocations are spread uniformly at random within their bin. Replay
+  starts at the bin containing ``origin`` (default 0) seconds.
+
+A relative ``file`` is resolved against FAAS_ROOT, like the parameter
+files of the other instances. Files ending in ``.parquet`` are read with pyarrow, which is then
+required; all other files are read as CSV. Rows can be restricted to
+one or more functions by giving their names in ``function``, matched
+against ``function_column`` (default ``function``). The selected rows
+of several functions are replayed as one instance.
+
+The trace is compressed in time by ``time_scale`` (a value of 60 replays
+one minute of the trace per second) and its rate is multiplied by
+``rate_multiplier``. A fractional multiplier replays every invocation
+``floor(rate_multiplier)`` times and once more with the remaining
+probability, so a multiplier below 1 thins the trace.
+"""
+import math
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from GenConfigs import FAAS_ROOT
+from .arrival_processes import CHUNK_EVENTS
+
+#: Number of rows read from a trace file at a time
+READ_ROWS = 65536
+
+TRACE_FORMATS = {'timestamps', 'counts'}
+
+_TIMESTAMP_UNITS = {'s': 1.0, 'ms': 1e-3, 'us': 1e-6}
+
+
+def trace_file_path(trace: Dict[str, Any]) -> str:
+    """
+    Returns the path of a trace file, resolving a relative path against
+    FAAS_ROOT.
+    """
+    return os.path.join(FAAS_ROOT, trace['file'])
+
+
+def trace_file_stat(trace: Dict[str, Any]) -> List[int]:
+    """
+    Returns the size and modification time of a trace file, which
+    identify its version in the schedule cache.
+    """
+    stat = os.stat(trace_file_path(trace))
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_batches(path: str, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Replaying Parquet traces requires pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=READ_ROWS,
+                                                       columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=READ_ROWS)
+
+
+def _selected(batch: pd.DataFrame, trace: Dict[str, Any]) -> pd.DataFrame:
+    functions = trace.get('function')
+    if functions is None:
+        return batch
+    if type(functions) is not list:
+        functions = [functions]
+    column = trace.get('function_column', 'function')
+    return batch[batch[column].astype(str).isin([str(f) for f in functions])]
+
+
+def _multiplied(rng: np.random.Generator, times: np.ndarray, multiplier: float) -> np.ndarray:
+    """
+    Replays every event floor(multiplier) times and once more with
+    the fractional remainder of multiplier as probability.
+    """
+    if multiplier == 1:
+        return times
+    whole = math.floor(multiplier)
+    copies = whole + (rng.random(len(times)) < multiplier - whole)
+    return np.repeat(times, copies)
+
+
+def _timestamp_stream(rng: np.random.Generator, trace: Dict[str, Any],
+                      duration: float) -> Iterator[np.ndarray]:
+    column = trace.get('timestamp_column', 'timestamp')
+    unit = _TIMESTAMP_UNITS[trace.get('timestamp_unit', 's')]
+    time_scale = trace.get('time_scale', 1)
+    multiplier = trace.get('rate_multiplier', 1)
+    columns = [column]
+    if trace.get('function') is not None:
+        columns.append(trace.get('function_column', 'function'))
+
+    origin = trace.get('origin')
+    for batch in _read_batches(trace_file_path(trace), columns):
+        stamps = _selected(batch, trace)[column].to_numpy(dtype=np.float64) * unit
+        if len(stamps) == 0:
+            continue
+        if origin is None:
+            origin = stamps[0]
+        times = (stamps - origin) / time_scale
+        times = _multiplied(rng, times[times >= 0], multiplier)
+        end = np.searchsorted(times, duration)
+        if end > 0:
+            yield times[:end]
+        if end < len(times):
+            return
+
+
+def _count_stream(rng: np.random.Generator, trace: Dict[str, Any],
+                  duration: float) -> Iterator[np.ndarray]:
+    # The counts of the selected functions are summed per bin. Only
+    # one count per bin is held, whatever the number of rows.
+    counts = None
+    for batch in _read_batches(trace_file_path(trace)):
+        bins = sorted((c for c in batch.columns if str(c).isdigit()), key=int)
+        selected = _selected(batch, trace)[bins].fillna(0).to_numpy(dtype=np.float64).sum(axis=0)
+        counts = selected if counts is None else counts + selected
+    if counts is None:
+        return
+
+    bin_seconds = trace.get('bin_seconds', 60)
+    bin_length = bin_seconds / trace.get('time_scale', 1)
+    counts = counts[int(trace.get('origin', 0) // bin_seconds):]
+    counts = counts[:math.ceil(duration / bin_length)] * trace.get('rate_multiplier', 1)
+    # Fractional counts are rounded up with the remainder as probability
+    whole = np.floor(counts)
+    counts = (whole + (rng.random(len(counts)) < counts - whole)).astype(np.int64)
+
+    # Groups of bins holding about CHUNK_EVENTS invocations each
+    total = np.cumsum(counts)
+    bounds = np.searchsorted(total, np.arange(CHUNK_EVENTS, total[-1] if len(total) else 0,
+                                              CHUNK_EVENTS))
+    first = 0
+    for last in list(bounds + 1) + [len(counts)]:
+        if last <= first:
+            continue
+        group = counts[first:last]
+        starts = np.repeat(np.arange(first, last) * bin_length, group)
+        times = np.sort(starts + rng.random(len(starts)) * bin_length)
+        times = times[times < duration]
+        if len(times) > 0:
+            yield times
+        first = last
+
+
+def trace_event_stream(rng: np.random.Generator, trace: Dict[str, Any],
+                       duration: float) -> Iterator[np.ndarray]:
+    """
+    Yields the absolute event times of a trace, in chunks, up to the
+    test duration.
+    """
+    if trace.get('format', 'timestamps') == 'counts':
+        return _count_stream(rng, trace, duration)
+    return _timestamp_stream(rng, trace, duration)
@@ -0,0 +1,190 @@
+"""
+Shared HTTP transport of the invoker. All instances dispatched by an
+invoker share one explicitly sized connection pool instead of each
+opening its own, so connections to the API host are set up once and
+then reused for the whole test. The pool is configured with the
+optional ``transport`` object of the workload specification:
+
+* ``pool_size``: maximum number of connections kept per host
+* ``max_workers``: number of threads sending requests for the
+  threaded engine (defaults to ``pool_size``)
+* ``keep_alive``: whether connections are kept open between requests
+* ``keep_alive_timeout``: idle time in seconds before a kept-alive
+  connection is probed (threaded engine) or closed (asyncio engine)
+* ``request_timeout``: time in seconds after which a request is given
+  up and counted as timed out (by default requests of the threaded
+  engines never time out and those of the asyncio engines after the
+  aiohttp default of five minutes)
+
+Both engines use a single TLS context without certificate
+verification. A transport outlives a single run: an invoker reused for
+the repeats of a suite keeps its connections open between them. The
+number of requests sent and connections opened during a run is
+reported by stats, which is stored in the test metadata.
+"""
+import asyncio
+import socket
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from requests_futures.sessions import FuturesSession
+
+DEFAULT_POOL_SIZE = 256
+DEFAULT_KEEP_ALIVE_TIMEOUT = 30
+
+
+def _unverified_ssl_context() -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class _PoolAdapter(HTTPAdapter):
+    """
+    HTTPAdapter which passes socket options and a shared TLS context
+    to the connection pools it creates.
+    """
+
+    def __init__(self, socket_options, ssl_context, **kwargs) -> None:
+        self.socket_options = socket_options
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        kwargs['socket_options'] = self.socket_options
+        kwargs['ssl_context'] = self.ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+
+class Transport:
+
+    def __init__(self, user_pass, config: Dict[str, Any]) -> None:
+        self.pool_size = config.get('pool_size', DEFAULT_POOL_SIZE)
+        self.max_workers = config.get('max_workers', self.pool_size)
+        self.keep_alive = config.get('keep_alive', True)
+        self.keep_alive_timeout = config.get('keep_alive_timeout',
+                                             DEFAULT_KEEP_ALIVE_TIMEOUT)
+        self.request_timeout = config.get('request_timeout')
+        self.user_pass = (user_pass[0], user_pass[1])
+        self.ssl_context = _unverified_ssl_context()
+
+        self._futures_session: Optional[FuturesSession] = None
+        self._adapter: Optional[_PoolAdapter] = None
+        self._aiohttp_session: Optional[aiohttp.ClientSession] = None
+        self._aiohttp_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Connection counters of the aiohttp sessions
+        self.async_created = 0
+        self.async_reused = 0
+
+    def futures_session(self) -> FuturesSession:
+        """
+        Returns the FuturesSession shared by the threads of the
+        threaded engine.
+        """
+        if self._futures_session is None:
+            socket_options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+            if self.keep_alive:
+                socket_options += [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                                   (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE,
+                                    int(self.keep_alive_timeout))]
+            self._adapter = _PoolAdapter(socket_options, self.ssl_context,
+                                         pool_connections=16,
+                                         pool_maxsize=self.pool_size,
+                                         pool_block=True)
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            session.auth = self.user_pass
+            session.verify = False
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            self._futures_session = FuturesSession(
+                executor=ThreadPoolExecutor(max_workers=self.max_workers),
+                session=session)
+        return self._futures_session
+
+    async def _on_connection_create(self, session, context, params) -> None:
+        self.async_created += 1
+
+    async def _on_connection_reuse(self, session, context, params) -> None:
+        self.async_reused += 1
+
+    def aiohttp_session(self) -> aiohttp.ClientSession:
+        """
+        Returns the aiohttp session shared by the coroutines of the
+        asyncio engine. Sessions are bound to an event loop, so a new
+        one is created if the running loop changed.
+        """
+        loop = asyncio.get_running_loop()
+        if self._aiohttp_session is None or self._aiohttp_loop is not loop:
+            self._aiohttp_session = self._new_aiohttp_session()
+            self._aiohttp_loop = loop
+        return self._aiohttp_session
+
+    def _new_aiohttp_session(self) -> aiohttp.ClientSession:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+        if self.keep_alive:
+            connector = aiohttp.TCPConnector(limit=0,
+                                             limit_per_host=self.pool_size,
+                                             keepalive_timeout=self.keep_alive_timeout,
+                                             ssl=self.ssl_context)
+        else:
+            connector = aiohttp.TCPConnector(limit=0,
+                                             limit_per_host=self.pool_size,
+                                             force_close=True,
+                                             ssl=self.ssl_context)
+        kwargs = {}
+        if self.request_timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=self.request_timeout)
+        return aiohttp.ClientSession(
+            connector=connector,
+            auth=aiohttp.BasicAuth(self.user_pass[0], self.user_pass[1]),
+            trace_configs=[trace_config],
+            **kwargs)
+
+    def stats(self, since: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Returns the number of requests sent and of connections
+        created and reused by the transport, counted from the stats
+        given as since if any.
+        """
+        requests_sent = self.async_created + self.async_reused
+        created = self.async_created
+        if self._adapter is not None:
+            pools = self._adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+                    created += pool.num_connections
+        if since is not None:
+            requests_sent -= since['requests']
+            created -= since['connections_created']
+        return {'requests': requests_sent,
+                'connections_created': created,
+                'connections_reused': max(0, requests_sent - created),
+                'reuse_ratio': (1.0 - created / requests_sent) if requests_sent else 0.0}
+
+    async def aclose(self) -> None:
+        """
+        Closes the aiohttp session. Must be run on the loop the
+        session was created on.
+        """
+        if self._aiohttp_session is not None:
+            await self._aiohttp_session.close()
+            self._aiohttp_session = None
+            self._aiohttp_loop = None
+
+    def close(self) -> None:
+        if self._futures_session is not None:
+            self._futures_session.executor.shutdown()
+            self._futures_session.session.close()
+            self._futures_session = None
+            self._adapter = None
@@ -18,7 +18,7 @@ from synthetic_workload_invoker.WorkloadInvoker import InvocationMetadata, Workl
 from time import sleep
 import hashlib
 import yaml
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import docker
 
@@ -146,6 +146,7 @@ class WorkloadSuite:
         self.workload_config = workload_config
         self.invocation_type = invocation_type
         self.repeat_times = repeat_times
+        self.invoker: Optional[WorkloadInvoker] = None
 
     @staticmethod
     def _write_suite_metadata(metadata):
@@ -155,10 +156,13 @@ class WorkloadSuite:
 
 
     def _run_workload(self, workload) -> InvocationMetadata:
-        invoker = WorkloadInvoker(workload)
+        # All runs of the suite share one invoker, which keeps its
+        # connections open between runs
+        if self.invoker is None:
+            self.invoker = WorkloadInvoker(workload)
         if self.invocation_type is InvocationType.COLD:
             _reset_openwhisk()
-        run_metadata = invoker.invoke_benchmark()
+        run_metadata = self.invoker.invoke_benchmark()
         _wait_for_openwhisk_backlog()
         return run_metadata
 
@@ -168,12 +172,17 @@ class WorkloadSuite:
         if not self.invocation_type is InvocationType.QUICK:
             _reset_openwhisk()
 
-        # Do warmup run
-        if self.invocation_type is InvocationType.WARM:
-            self._run_workload(self.workload_config)
-
-        invocations = list(map(self._run_workload,
-                               [self.workload_config]*self.repeat_times))
+        try:
+            # Do warmup run
+            if self.invocation_type is InvocationType.WARM:
+                self._run_workload(self.workload_config)
+
+            invocations = list(map(self._run_workload,
+                                   [self.workload_config]*self.repeat_times))
+        finally:
+            if self.invoker is not None:
+                self.invoker.close()
+                self.invoker = None
         invocation_stats = map(lambda x: (x["runid"], x["successes"], x["failures"],
                                      x["expected"]), invocations)
         runids, successes, failures, expected = map(list, zip(*invocation_stats))
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The packages import GenConfigs and each other from the root of the
+# checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from workload_analyzer import ActivationStore as activation_store
+from workload_analyzer.ActivationStore import SYNC_OVERLAP_MS, ActivationStore
+
+
+def _activations(first, count, runid='run', names=('f', 'g')):
+    rows = []
+    for i in range(first, first + count):
+        start = 1000 * i
+        rows.append({'func_name': names[i % len(names)], 'activationId': 'id%06d' % i,
+                     'start': start, 'end': start + 5, 'duration': 5, 'waitTime': 1,
+                     'initTime': 0, 'latency': 6, 'lang': 'python:3', 'runid': runid})
+    return pd.DataFrame(rows)
+
+
+def test_empty_store(tmp_path):
+    store = ActivationStore(str(tmp_path))
+    assert store.count() == 0
+    assert len(store.read()) == 0
+    assert store.activation_ids() == set()
+
+
+def test_append_and_read(tmp_path):
+    store = ActivationStore(str(tmp_path))
+    store.append(_activations(0, 10, runid='a'))
+    store.append(_activations(10, 10, runid='b', names=('g', 'h')))
+
+    df = store.read()
+    assert len(df) == 20
+    assert list(df['activationId'][:2]) == ['id000000', 'id000001']
+    assert df['start'].dtype == 'int64'
+    assert len(store.read(runid='b')) == 10
+    assert len(store.read(runid='c')) == 0
+    assert set(store.read(names=['h'])['func_name']) == {'h'}
+    assert list(store.read(since=5000, until=7000)['start']) == [5000, 6000, 7000]
+    assert store.activation_ids(since=18000) == {'id000018', 'id000019'}
+
+
+def test_store_is_reopened(tmp_path):
+    ActivationStore(str(tmp_path)).append(_activations(0, 5))
+    store = ActivationStore(str(tmp_path))
+    assert store.count() == 5
+    assert list(store.read(columns=['start'])['start']) == [0, 1000, 2000, 3000, 4000]
+
+
+def test_compact(tmp_path, monkeypatch):
+    monkeypatch.setattr(activation_store, 'MAX_SEGMENTS', 3)
+    store = ActivationStore(str(tmp_path))
+    expected = []
+    for (i, runid) in enumerate(['a', 'b', 'c', 'd']):
+        df = _activations(10 * i, 10, runid=runid, names=(runid, 'shared'))
+        store.append(df)
+        expected.append(df)
+    assert len(store.manifest['segments']) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['segment_4', 'store.json']
+
+    df = store.read()
+    expected = pd.concat(expected, ignore_index=True)
+    pd.testing.assert_frame_equal(df[expected.columns].astype(expected.dtypes), expected)
+    assert len(store.read(runid='c')) == 10
+    assert len(store.read(names=['shared'])) == 20
+
+
+def test_sync_start(tmp_path):
+    store = ActivationStore(str(tmp_path))
+    # The first sync starts at the analyzed test
+    assert store.sync_start(5000) == 5000
+    store.append(_activations(5, 1000))
+    store.synced(5000)
+    latest = 1004 * 1000
+    assert store.sync_start(6000) == latest - SYNC_OVERLAP_MS
+    # A test before the synced range is read from its start
+    assert store.sync_start(1000) == 1000
+    store.synced(1000)
+    assert store.manifest['synced_since'] == 1000
+    assert ActivationStore(str(tmp_path)).manifest['synced_since'] == 1000
+
+
+def test_sync_start_is_not_before_synced_range(tmp_path):
+    store = ActivationStore(str(tmp_path))
+    store.append(_activations(0, 10))
+    store.synced(0)
+    assert store.sync_start(0) == 0
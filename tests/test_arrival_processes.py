@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from synthetic_workload_invoker.arrival_processes import (
+    ARRIVAL_PROCESSES, CHUNK_EVENTS, mean_rate, register_arrival_process)
+from synthetic_workload_invoker.EventGenerator import (
+    create_event_chunks, create_events, instance_event_stream)
+
+DURATION = 200
+
+PROCESSES = {
+    'Uniform': {'rate': 50},
+    'Poisson': {'rate': 50},
+    'Pareto': {'rate': 50, 'shape': 2.5},
+    'Weibull': {'rate': 50, 'shape': 0.8},
+    'MMPP': {'rates': [20, 80], 'mean_durations': [5, 5]},
+    'Sinusoidal': {'rate': 50, 'amplitude': 0.5, 'period': 20},
+    'Diurnal': {'rate_curve': [20, 80, 50]},
+}
+
+
+def _desc(distribution):
+    return dict(PROCESSES[distribution], distribution=distribution)
+
+
+def test_all_processes_are_covered():
+    assert set(PROCESSES) <= set(ARRIVAL_PROCESSES)
+
+
+@pytest.mark.parametrize('distribution', sorted(PROCESSES))
+def test_arrivals_are_ordered_and_in_test(distribution):
+    events = create_events('i', _desc(distribution), DURATION, seed=3)
+    assert len(events) > 0
+    assert np.all(np.diff(events) >= 0)
+    # Arrivals past the end are dropped by the activity window
+    scheduled = np.concatenate(list(instance_event_stream('i', _desc(distribution),
+                                                          DURATION, seed=3)))
+    assert scheduled[0] > 0 and scheduled[-1] < DURATION
+    assert np.array_equal(scheduled, events[(events > 0) & (events < DURATION)])
+
+
+@pytest.mark.parametrize('distribution', sorted(PROCESSES))
+def test_mean_rate(distribution):
+    desc = _desc(distribution)
+    events = create_events('i', desc, DURATION, seed=3)
+    assert len(events) / DURATION == pytest.approx(mean_rate(desc), rel=0.25)
+
+
+@pytest.mark.parametrize('distribution', sorted(PROCESSES))
+def test_schedules_are_reproducible(distribution):
+    desc = _desc(distribution)
+    first = create_events('i', desc, DURATION, seed=3)
+    assert np.array_equal(first, create_events('i', desc, DURATION, seed=3))
+    assert not np.array_equal(first, create_events('j', desc, DURATION, seed=3)) \
+        or distribution == 'Uniform'
+
+
+def test_long_schedules_are_chunked():
+    desc = {'distribution': 'Poisson', 'rate': 1000}
+    chunks = list(create_event_chunks('i', desc, 100, seed=1))
+    assert len(chunks) > 1
+    assert max(len(c) for c in chunks) < 2 * CHUNK_EVENTS
+
+
+def test_zero_rate_has_no_arrivals():
+    assert len(create_events('i', {'distribution': 'Poisson', 'rate': 0}, 10, seed=1)) == 0
+
+
+def test_invalid_parameters_are_rejected():
+    with pytest.raises(Exception):
+        create_events('i', {'distribution': 'Pareto', 'rate': 1, 'shape': 1}, 10, seed=1)
+    with pytest.raises(Exception):
+        create_events('i', {'distribution': 'Sinusoidal', 'rate': 1,
+                            'amplitude': 2, 'period': 1}, 10, seed=1)
+    with pytest.raises(Exception):
+        create_events('i', {'distribution': 'MMPP', 'rates': [1],
+                            'mean_durations': [1]}, 10, seed=1)
+
+
+def test_register_arrival_process():
+    @register_arrival_process('TestConstant', required=['times'],
+                              mean_rate=lambda desc: len(desc['times']))
+    def constant(rng, desc, duration):
+        yield np.asarray(desc['times'], dtype=np.float64)
+
+    try:
+        desc = {'distribution': 'TestConstant', 'times': [1.0, 2.0]}
+        assert ARRIVAL_PROCESSES['TestConstant'].required == ['times']
+        assert mean_rate(desc) == 2
+        assert create_events('i', desc, 10, seed=1).tolist() == [1.0, 2.0]
+    finally:
+        del ARRIVAL_PROCESSES['TestConstant']
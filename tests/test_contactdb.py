@@ -0,0 +1,202 @@
+import threading
+
+import pytest
+
+from workload_analyzer import ContactDB
+
+
+class StubCouch:
+    """
+    Answers the _find queries of ContactDB from a list of activation
+    records, paging with bookmarks like CouchDB.
+    """
+
+    def __init__(self, docs, warning=None):
+        self.docs = sorted(docs, key=lambda d: d['start'])
+        self.warning = warning
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def _matches(self, doc, selector):
+        for (field, condition) in selector.items():
+            value = doc.get(field)
+            if not isinstance(condition, dict):
+                if value != condition:
+                    return False
+                continue
+            for (op, operand) in condition.items():
+                if op == '$gte' and not value >= operand:
+                    return False
+                if op == '$lt' and not value < operand:
+                    return False
+                if op == '$lte' and not value <= operand:
+                    return False
+                if op == '$in' and value not in operand:
+                    return False
+        return True
+
+    def request(self, method, path, body=None):
+        assert (method, path) == ('POST', ContactDB.ACTIVATIONS_DB + '/_find')
+        with self.lock:
+            self.requests.append(dict(body))
+        docs = [d for d in self.docs if self._matches(d, body['selector'])]
+        if body.get('sort') == [{'start': 'desc'}]:
+            docs.reverse()
+        offset = int(body.get('bookmark', 0))
+        page = docs[offset:offset + body['limit']]
+        if 'fields' in body.keys():
+            page = [{f: d[f] for f in body['fields'] if f in d.keys()} for d in page]
+        result = {'docs': page, 'bookmark': str(offset + len(page))}
+        if self.warning is not None:
+            result['warning'] = self.warning
+        return result
+
+    def close(self):
+        pass
+
+
+def _activations(count, step=10):
+    return [{'_id': 'guest/%04d' % i, 'name': 'f%d' % (i % 3),
+             'start': 1000 + i * step, 'end': 1005 + i * step}
+            for i in range(count)]
+
+
+@pytest.fixture
+def couch(monkeypatch):
+    def install(docs, **kwargs):
+        client = StubCouch(docs, **kwargs)
+        monkeypatch.setattr(ContactDB, '_client', client)
+        return client
+    return install
+
+
+def test_pages_follow_bookmark(couch):
+    client = couch(_activations(25))
+    pages = list(ContactDB.GetActivationPagesSince(1000, page_size=10))
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert [d['_id'] for p in pages for d in p] == \
+        ['guest/%04d' % i for i in range(25)]
+    # Every request continues from the bookmark of the previous page and
+    # the short third page ends the query
+    assert [r.get('bookmark') for r in client.requests] == [None, '10', '20']
+    assert all(r['use_index'] == [ContactDB.INDEX_DDOC, 'start'] for r in client.requests)
+
+
+def test_pages_stop_on_empty_page(couch):
+    client = couch(_activations(20))
+    pages = list(ContactDB.GetActivationPagesSince(1000, page_size=10))
+
+    # A full last page needs one more request, whose empty page is not
+    # yielded
+    assert [len(p) for p in pages] == [10, 10]
+    assert len(client.requests) == 3
+
+
+def test_pages_of_names_and_fields(couch):
+    client = couch(_activations(30))
+    pages = list(ContactDB.GetActivationPagesSince(1100, page_size=4, names=['f1'],
+                                                   fields=['_id', 'start']))
+
+    docs = [d for p in pages for d in p]
+    assert [d['_id'] for d in docs] == ['guest/%04d' % i for i in range(10, 30) if i % 3 == 1]
+    assert set(docs[0].keys()) == {'_id', 'start'}
+    assert client.requests[0]['use_index'] == [ContactDB.INDEX_DDOC, 'start-name']
+
+
+def test_no_pages(couch):
+    client = couch([])
+    assert list(ContactDB.GetActivationPagesSince(1000, page_size=10)) == []
+    assert len(client.requests) == 1
+
+
+def test_warnings(couch):
+    warnings = []
+    couch(_activations(25), warning='No matching index found, create an index to optimize query time.')
+    list(ContactDB.GetActivationPagesSince(1000, page_size=10, warn=warnings.append))
+    assert len(warnings) == 1
+    assert warnings[0].startswith('Activation query fell back to a full scan')
+
+    warnings = []
+    couch(_activations(5), warning='The number of documents examined is high')
+    list(ContactDB.GetActivationPagesSince(1000, page_size=10, warn=warnings.append))
+    assert warnings == ['CouchDB warning on activation query: '
+                        'The number of documents examined is high']
+
+
+def _slice_bounds(client):
+    # The first request of every slice, i.e. without bookmark or sort
+    return sorted((r['selector']['start']['$gte'], r['selector']['start']['$lt'])
+                  for r in client.requests
+                  if 'bookmark' not in r.keys() and 'sort' not in r.keys())
+
+
+@pytest.mark.parametrize('slices', [2, 3, 8])
+def test_parallel_slices_cover_the_window(couch, slices):
+    docs = _activations(100, step=7)
+    client = couch(docs)
+    pages = list(ContactDB.GetActivationPagesSince(0, page_size=6, slices=slices))
+
+    # The slices run from the earliest to the latest activation without
+    # gaps or overlap
+    bounds = _slice_bounds(client)
+    assert len(bounds) == slices
+    assert bounds[0][0] == docs[0]['start']
+    assert bounds[-1][1] == docs[-1]['start'] + 1
+    assert all(bounds[i][1] == bounds[i + 1][0] for i in range(len(bounds) - 1))
+
+    # Every activation is fetched exactly once
+    ids = [d['_id'] for p in pages for d in p]
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == [d['_id'] for d in docs]
+
+
+def test_parallel_slices_until(couch):
+    docs = _activations(50)
+    client = couch(docs)
+    until = docs[29]['start']
+    pages = list(ContactDB.GetActivationPagesSince(docs[10]['start'], page_size=4,
+                                                   slices=4, until=until))
+
+    bounds = _slice_bounds(client)
+    assert (bounds[0][0], bounds[-1][1]) == (docs[10]['start'], until + 1)
+    ids = sorted(d['_id'] for p in pages for d in p)
+    assert ids == [d['_id'] for d in docs[10:30]]
+
+
+def test_parallel_slices_of_a_short_window(couch):
+    # A window shorter than the number of slices leaves no empty slices
+    docs = [{'_id': 'guest/a', 'name': 'f', 'start': 5},
+            {'_id': 'guest/b', 'name': 'f', 'start': 6}]
+    client = couch(docs)
+    pages = list(ContactDB.GetActivationPagesSince(0, slices=8))
+
+    assert _slice_bounds(client) == [(5, 6), (6, 7)]
+    assert sorted(d['_id'] for p in pages for d in p) == ['guest/a', 'guest/b']
+
+
+def test_parallel_slices_without_activations(couch):
+    client = couch([])
+    assert list(ContactDB.GetActivationPagesSince(0, slices=4)) == []
+    assert _slice_bounds(client) == []
+
+
+def test_parallel_slices_raise_errors(couch, monkeypatch):
+    client = couch(_activations(40))
+    request = client.request
+
+    def failing(method, path, body=None):
+        if 'bookmark' in body.keys():
+            return {'error': 'timeout', 'reason': 'The request could not be processed'}
+        return request(method, path, body)
+
+    monkeypatch.setattr(client, 'request', failing)
+    with pytest.raises(Exception, match='DB error: timeout'):
+        list(ContactDB.GetActivationPagesSince(0, page_size=5, slices=4))
+
+
+def test_parallel_slices_stop_early(couch):
+    couch(_activations(200))
+    pages = ContactDB.GetActivationPagesSince(0, page_size=5, slices=4)
+    assert len(next(pages)) == 5
+    pages.close()
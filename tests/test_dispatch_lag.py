@@ -0,0 +1,49 @@
+import pytest
+
+from synthetic_workload_invoker.dispatch_lag import (
+    MIN_SAMPLES, DispatchLagMonitor, LagHistogram)
+from synthetic_workload_invoker.pacing import WAKE_BOUNDS_MS
+
+
+def test_quantiles_do_not_exceed_maximum():
+    histogram = LagHistogram(10.0)
+    for lag_ms in [0.05] * 98 + [110.0, 125.8]:
+        histogram.add(lag_ms)
+    summary = histogram.to_dict()
+    assert summary['max_ms'] == 125.8
+    assert summary['p99_ms'] <= summary['max_ms']
+    assert summary['p99_ms'] == 125.8
+    assert summary['p50_ms'] == 0.1
+
+
+def test_quantiles_of_wake_up_errors_do_not_exceed_maximum():
+    histogram = LagHistogram(float('inf'), WAKE_BOUNDS_MS)
+    for error_ms in [0.0005, 0.003, 23.0]:
+        histogram.add(error_ms)
+    assert histogram.quantile(0.99) == 23.0
+    assert histogram.quantile(0.5) == 0.005
+
+
+def test_lags_beyond_last_bound_report_maximum():
+    histogram = LagHistogram(10.0, [1, 2])
+    histogram.add(0.5)
+    histogram.add(40.0)
+    assert histogram.quantile(0.99) == 40.0
+    assert histogram.over_threshold == 1
+
+
+def test_empty_histogram():
+    summary = LagHistogram(10.0).to_dict()
+    assert summary['count'] == 0
+    assert summary['mean_ms'] == 0.0
+    assert summary['p99_ms'] == 0.0
+
+
+def test_overload_needs_enough_samples():
+    monitor = DispatchLagMonitor(['a'], {'threshold_ms': 10, 'abort': True})
+    for _ in range(MIN_SAMPLES - 1):
+        monitor.record('a', 1.0)
+    assert not monitor.aborted.is_set()
+    monitor.record('a', 1.0)
+    assert monitor.aborted.is_set()
+    assert monitor.overloaded_instances() == ['a']
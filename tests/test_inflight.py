@@ -0,0 +1,83 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic_workload_invoker.inflight import AsyncCompletionTracker, CompletionTracker
+
+
+def test_completions_are_counted():
+    tracker = CompletionTracker(10)
+    outcomes = [True, True, False, True]
+    for _ in outcomes:
+        tracker.acquire()
+    assert tracker.outstanding == 4
+    for success in outcomes:
+        tracker.complete(success)
+    tracker.wait()
+    assert tracker.outstanding == 0
+    assert (tracker.successes, tracker.failures) == (3, 1)
+
+
+def test_acquire_blocks_at_the_cap():
+    tracker = CompletionTracker(2)
+    tracker.acquire()
+    tracker.acquire()
+    acquired = threading.Event()
+
+    def dispatch():
+        tracker.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=dispatch)
+    thread.start()
+    assert not acquired.wait(0.1)
+    tracker.complete(True)
+    assert acquired.wait(5)
+    thread.join()
+    assert tracker.outstanding == 2
+
+
+def test_timed_out_request_counts_as_failure():
+    # Mirrors complete_request_future: a request whose future raises
+    # (e.g. on request_timeout) still frees its slot as a failure.
+    tracker = CompletionTracker(1)
+
+    def request(timeout):
+        if timeout:
+            raise TimeoutError()
+        return 200
+
+    def done(future):
+        tracker.complete(future.exception() is None)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for timeout in [True, False, True]:
+            tracker.acquire()
+            pool.submit(request, timeout).add_done_callback(done)
+        tracker.wait()
+    assert (tracker.successes, tracker.failures) == (1, 2)
+
+
+def test_async_tracker_caps_and_counts():
+    tracker = AsyncCompletionTracker(2)
+    running = []
+    peak = []
+
+    async def request(outcome):
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        if outcome == 'timeout':
+            raise asyncio.TimeoutError()
+        return outcome
+
+    async def run():
+        for outcome in [True, False, 'timeout', True, True]:
+            await tracker.submit(request(outcome))
+        await tracker.wait()
+
+    asyncio.run(run())
+    assert max(peak) <= 2
+    assert not tracker.tasks
+    assert (tracker.successes, tracker.failures) == (3, 2)
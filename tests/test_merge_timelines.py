@@ -0,0 +1,58 @@
+import numpy as np
+
+from synthetic_workload_invoker.EventGenerator import merge_timelines
+
+
+def _merge(streams):
+    batches = list(merge_timelines(streams))
+    if not batches:
+        return (np.empty(0), np.empty(0, dtype=np.int32))
+    return (np.concatenate([t for (t, _) in batches]),
+            np.concatenate([i for (_, i) in batches]))
+
+
+def test_merges_in_order_with_instance_indices():
+    a = [np.array([0.0, 2.0]), np.array([4.0, 6.0])]
+    b = [np.array([1.0]), np.array([3.0, 5.0, 7.0])]
+    (times, indices) = _merge([a, b])
+    assert times.tolist() == [0, 1, 2, 3, 4, 5, 6, 7]
+    assert indices.tolist() == [0, 1, 0, 1, 0, 1, 0, 1]
+
+
+def test_ties_keep_stream_order():
+    (times, indices) = _merge([[np.array([1.0, 2.0])], [np.array([1.0, 2.0])]])
+    assert times.tolist() == [1, 1, 2, 2]
+    assert indices.tolist() == [0, 1, 0, 1]
+
+
+def test_skips_empty_chunks_and_streams():
+    streams = [[np.empty(0), np.array([1.0])], [], [np.empty(0)], [np.array([0.5])]]
+    (times, indices) = _merge(streams)
+    assert times.tolist() == [0.5, 1.0]
+    assert indices.tolist() == [3, 0]
+    assert _merge([])[0].tolist() == []
+
+
+def test_matches_sorting_all_events():
+    rng = np.random.default_rng(7)
+    events = [np.sort(rng.random(1000)) for _ in range(5)]
+    streams = [np.array_split(e, 7) for e in events]
+    (times, indices) = _merge(streams)
+    assert np.array_equal(times, np.sort(np.concatenate(events)))
+    for (i, e) in enumerate(events):
+        assert np.array_equal(times[indices == i], e)
+
+
+def test_consumes_streams_lazily():
+    consumed = []
+
+    def stream(name, chunks):
+        for chunk in chunks:
+            consumed.append(name)
+            yield chunk
+
+    batches = merge_timelines([stream('a', [np.array([0.0]), np.array([10.0])]),
+                               stream('b', [np.array([1.0]), np.array([2.0])])])
+    (times, _) = next(batches)
+    assert times.tolist() == [0.0]
+    assert consumed == ['a', 'b', 'a']
@@ -0,0 +1,43 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from synthetic_workload_invoker.payloads import (
+    PayloadCache, binary_invocation, encode_url, json_invocation)
+
+BASE = 'https://172.17.0.1/api/v1/web/guest/default/action?blocking=false'
+
+
+def test_encode_url_round_trip():
+    parameters = {'name': 'a b&c=d', 'list': ['x', 'ü'], 'n': 3}
+    url = encode_url(BASE, parameters)
+    query = parse_qs(urlsplit(url).query)
+    assert query == {'blocking': ['false'], 'name': ['a b&c=d'],
+                     'list': ['x', 'ü'], 'n': ['3']}
+
+
+def test_encode_url_matches_requests():
+    parameters = {'name': 'a b&c=d', 'list': ['x', 'ü'], 'n': 3}
+    prepared = requests.Request('POST', BASE, params=parameters).prepare()
+    assert encode_url(BASE, parameters) == prepared.url
+
+
+def test_json_invocation():
+    prepared = json_invocation(BASE, {'p': 1}, {'arg': [1, 2]})
+    assert prepared.url == BASE + '&p=1'
+    assert prepared.headers == {'Content-Type': 'application/json'}
+    assert json.loads(prepared.body) == {'arg': [1, 2]}
+
+
+def test_binary_invocation_shares_mapped_data(tmp_path):
+    path = tmp_path / 'image.jpg'
+    path.write_bytes(b'\xff\xd8data')
+    cache = PayloadCache()
+    body = cache.data(str(path))
+    prepared = binary_invocation(BASE, {}, cache.mime(str(path)), body)
+    assert prepared.headers == {'Content-Type': 'image/jpeg'}
+    assert bytes(prepared.body) == b'\xff\xd8data'
+    assert cache.data(str(path)) is body
+    del body, prepared
+    cache.close()
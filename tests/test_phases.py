@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from synthetic_workload_invoker.phases import (
+    phase_event_stream, phase_instances, phase_requests, phase_summary)
+
+
+def _events(phase, duration, seed=1):
+    chunks = list(phase_event_stream(np.random.default_rng(seed), phase, duration))
+    return np.concatenate(chunks) if chunks else np.empty(0)
+
+
+def test_phase_instances_default_to_scheduled_instances():
+    workload = {'instances': {'a': {'rate': 1}, 'b': {'concurrency': 2}, 'c': {'rate': 1}}}
+    assert phase_instances(workload, {'type': 'burst'}) == ['a', 'c']
+    assert phase_instances(workload, {'type': 'burst', 'instances': ['c']}) == ['c']
+
+
+def test_burst_without_spread_is_simultaneous():
+    times = _events({'type': 'burst', 'size': 5, 'start': 2}, 10)
+    assert times.tolist() == [2.0] * 5
+
+
+def test_periodic_burst_stays_in_spread_and_test():
+    phase = {'type': 'burst', 'size': 3, 'start': 1, 'period': 2, 'spread_ms': 100}
+    times = _events(phase, 7)
+    assert len(times) == 3 * 3
+    assert np.all(np.diff(times) >= 0)
+    offsets = (times - 1) % 2
+    assert np.all(offsets <= 0.1)
+    assert phase_requests(phase, 7) == 9
+
+
+def test_burst_is_cut_at_end():
+    phase = {'type': 'burst', 'size': 2, 'period': 1, 'end': 3}
+    assert _events(phase, 10).tolist() == [0.0, 0.0, 1.0, 1.0, 2.0, 2.0]
+
+
+def test_step_rate():
+    phase = {'type': 'step', 'rate': 4, 'start': 1, 'end': 3}
+    times = _events(phase, 10)
+    assert np.allclose(times, 1 + np.arange(8) / 4)
+    assert phase_requests(phase, 10) == pytest.approx(8)
+
+
+def test_step_rates_split_interval():
+    phase = {'type': 'step', 'rates': [1, 0, 2], 'start': 0, 'end': 6}
+    times = _events(phase, 10)
+    assert np.allclose(times, [0, 1, 4, 4.5, 5, 5.5])
+    assert phase_requests(phase, 10) == pytest.approx(6)
+
+
+def test_step_duration_and_empty_rates():
+    phase = {'type': 'step', 'rates': [2, 1], 'step_duration': 1}
+    assert np.allclose(_events(phase, 10), [0, 0.5, 1])
+    assert _events({'type': 'step', 'rates': []}, 10).tolist() == []
+    assert phase_requests({'type': 'step', 'rates': []}, 10) == 0
+
+
+def test_phase_summary_counts_bursts_and_steps():
+    workload = {'test_duration_in_seconds': 10,
+                'instances': {'a': {'rate': 1}},
+                'phases': [{'type': 'burst', 'size': 2, 'start': 1},
+                           {'type': 'step', 'rates': [1, 2], 'start': 4, 'end': 6}]}
+    intended = np.array([1.0, 1.0, 4.0, 5.0, 5.5, 8.0])
+    log = {'instance_name': np.array(['a'] * 6),
+           'intended': intended,
+           'sent': intended,
+           'received': intended + 0.01,
+           'status': np.array([200, 500, 200, 200, 200, 200])}
+    (burst, step) = phase_summary(workload, log, 0.0)
+    assert burst['bursts'][0]['requests'] == 2
+    assert burst['bursts'][0]['failures'] == 1
+    assert burst['drain_ms']['max'] == pytest.approx(10.0)
+    assert [s['requests'] for s in step['steps']] == [1, 2]
+    assert [s['rate'] for s in step['steps']] == [1, 2]
@@ -0,0 +1,62 @@
+from synthetic_workload_invoker.rate_limit import (
+    OUTCOMES, OutcomeCounters, RateLimiter, merge_outcomes, shard_shares)
+
+
+def _counters(schedule_start, events):
+    counters = OutcomeCounters()
+    counters.start(schedule_start)
+    for (kind, when) in events:
+        counters.record(kind, when)
+    return counters
+
+
+def test_merge_outcomes_adds_counts_and_per_second():
+    a = _counters(100.0, [('throttled', 100.5), ('throttled', 102.5)]).summary()
+    b = _counters(100.0, [('throttled', 101.5), ('throttled', 104.5),
+                          ('timed_out', 103.0)]).summary()
+    merge_outcomes(a, b)
+    assert a['throttled']['count'] == 4
+    assert a['throttled']['first'] == 100.5
+    assert a['throttled']['last'] == 104.5
+    assert a['throttled']['per_second'] == [1, 1, 1, 0, 1]
+    assert a['timed_out']['count'] == 1
+    assert a['timed_out']['first'] == a['timed_out']['last'] == 103.0
+    assert a['retried'] == {'count': 0, 'first': None, 'last': None, 'per_second': []}
+
+
+def test_merge_outcomes_adds_limited_delay():
+    a = OutcomeCounters()
+    a.limited(1.0, 0.25)
+    b = OutcomeCounters()
+    b.limited(2.0, 0.5)
+    into = a.summary()
+    merge_outcomes(into, b.summary())
+    assert into['limited']['count'] == 2
+    assert into['limited']['delay_ms'] == 750.0
+
+
+def test_merge_outcomes_into_empty():
+    into = {}
+    other = _counters(0.0, [('server_error', 0.5)]).summary()
+    merge_outcomes(into, other)
+    assert set(OUTCOMES) <= set(into)
+    assert into['server_error']['count'] == 1
+
+
+def test_shard_shares_divide_buckets():
+    config = {'invocations_per_minute': 600, 'burst': 10}
+    actions = {'a': 'f', 'b': 'f', 'c': 'g'}
+    shares = shard_shares(config, actions, [['a'], ['b', 'c']])
+    assert shares == {'': 2}
+    limiter = RateLimiter(config, actions, shares)
+    assert limiter.bucket('a').rate == 5.0
+    assert limiter.bucket('a').capacity == 5.0
+    assert limiter.bucket('a') is limiter.bucket('c')
+
+    config = dict(config, scope='action')
+    shares = shard_shares(config, actions, [['a'], ['b', 'c']])
+    assert shares == {'f': 2, 'g': 1}
+    limiter = RateLimiter(config, actions, shares)
+    assert limiter.bucket('a').rate == 5.0
+    assert limiter.bucket('c').rate == 10.0
+    assert limiter.bucket('a') is not limiter.bucket('c')
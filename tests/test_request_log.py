@@ -0,0 +1,57 @@
+import pytest
+
+from synthetic_workload_invoker.request_log import (
+    RequestLog, activation_id_of, latency_summary, read_request_log)
+
+
+def test_round_trip(tmp_path):
+    log = RequestLog(str(tmp_path), ['a', 'b'])
+    log.record('b', 10.0, 10.001, 10.051, 202, 44, 'e107e05a84cf469c87e05a84cf669c16')
+    log.close()
+
+    read = read_request_log(str(tmp_path))
+    assert len(read['sent']) == 1
+    assert read['instance_name'][0] == 'b'
+    assert read['activation_id'][0].decode() == 'e107e05a84cf469c87e05a84cf669c16'
+    assert read['status'][0] == 202
+    assert read['size'][0] == 44
+    assert read['received'][0] - read['sent'][0] == pytest.approx(0.05)
+    assert latency_summary(read)['max'] == pytest.approx(50.0)
+
+
+def test_records_beyond_a_chunk(tmp_path):
+    log = RequestLog(str(tmp_path), ['a'], chunk_size=4)
+    for i in range(10):
+        log.record('a', i, i, i + 0.5, 200 if i % 2 else 429, 0, '')
+    log.close()
+
+    read = read_request_log(str(tmp_path))
+    assert list(read['intended']) == list(range(10))
+    assert list(read['status'][:2]) == [429, 200]
+
+
+def test_empty_log(tmp_path):
+    RequestLog(str(tmp_path), ['a']).close()
+
+    read = read_request_log(str(tmp_path))
+    assert len(read['sent']) == 0
+    assert len(read['instance_name']) == 0
+    assert latency_summary(read) is None
+
+
+def test_shard_logs_are_concatenated(tmp_path):
+    for (shard, instance) in enumerate(['a', 'b']):
+        log = RequestLog(str(tmp_path / str(shard)), [instance])
+        log.record(instance, 1.0, 1.0, 1.1, 200, 0, 'id%d' % shard)
+        log.close()
+
+    read = read_request_log(str(tmp_path))
+    assert list(read['instance_name']) == ['a', 'b']
+    assert [i.decode() for i in read['activation_id']] == ['id0', 'id1']
+
+
+def test_activation_id_of():
+    assert activation_id_of({'X-Openwhisk-Activation-Id': 'h'}, b'') == 'h'
+    assert activation_id_of({}, b'{"activationId": "b"}') == 'b'
+    assert activation_id_of({}, b'not json activationId') == ''
+    assert activation_id_of({}, b'{}') == ''
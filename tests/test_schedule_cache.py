@@ -0,0 +1,95 @@
+import copy
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from synthetic_workload_invoker import schedule_cache
+from synthetic_workload_invoker.schedule_cache import (
+    INDEX_FILE, ScheduleCache, schedule_key)
+
+WORKLOAD = {
+    'test_name': 'cache',
+    'test_duration_in_seconds': 10,
+    'random_seed': 7,
+    'instances': {
+        'a': {'application': 'fa', 'distribution': 'Poisson', 'rate': 5,
+              'activity_window': None},
+        'b': {'application': 'fb', 'distribution': 'Uniform', 'rate': 2,
+              'activity_window': [2, 8]},
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def quiet_logger(monkeypatch):
+    # Keep the compile log out of DATA_DIR
+    monkeypatch.setattr(schedule_cache, 'ScriptLogger',
+                        lambda name, logfile: logging.getLogger(name))
+
+
+def _compile(cache, key, size):
+    cache.compile(key, {'a': [np.arange(size, dtype=np.float64)]})
+
+
+def test_schedule_key():
+    key = schedule_key(WORKLOAD)
+    assert key == schedule_key(copy.deepcopy(WORKLOAD))
+
+    # Fields that do not affect the schedule do not change the key
+    renamed = copy.deepcopy(WORKLOAD)
+    renamed['instances']['a']['application'] = 'other'
+    assert schedule_key(renamed) == key
+
+    for (path, value) in [(('random_seed',), 8),
+                          (('test_duration_in_seconds',), 11),
+                          (('instances', 'a', 'rate'), 6),
+                          (('instances', 'b', 'activity_window'), [2, 9])]:
+        changed = copy.deepcopy(WORKLOAD)
+        target = changed
+        for field in path[:-1]:
+            target = target[field]
+        target[path[-1]] = value
+        assert schedule_key(changed) != key
+
+    unseeded = copy.deepcopy(WORKLOAD)
+    del unseeded['random_seed']
+    assert schedule_key(unseeded) is None
+
+
+def test_compile_and_load(tmp_path):
+    cache = ScheduleCache(str(tmp_path), max_size=1 << 20)
+    key = schedule_key(WORKLOAD)
+    assert cache.load(key) is None
+
+    streams = {'a': [np.array([0.5, 1.5]), np.array([2.5])],
+               'b': [np.array([], dtype=np.float64)],
+               'c': [np.array([3.0, 4.0])]}
+    cache.compile(key, streams)
+
+    (all_events, event_count) = cache.load(key)
+    assert event_count == 5
+    assert isinstance(all_events['a'].base, np.memmap)
+    assert list(all_events['a']) == [0.5, 1.5, 2.5]
+    assert len(all_events['b']) == 0
+    assert list(all_events['c']) == [3.0, 4.0]
+    assert not all_events['a'].flags.writeable
+
+
+def test_eviction_keeps_the_size_cap(tmp_path):
+    # Every schedule holds 100 float64 events plus its index
+    cache = ScheduleCache(str(tmp_path), max_size=1 << 20)
+    for (i, key) in enumerate(['old', 'unused', 'new']):
+        _compile(cache, key, 100)
+        os.utime(os.path.join(str(tmp_path), key, INDEX_FILE), (i, i))
+    # Loading marks a schedule as recently used
+    assert cache.load('old') is not None
+
+    cache.max_size = 2000
+    cache.evict()
+    assert sorted(os.listdir(str(tmp_path))) == ['new', 'old']
+
+    # The schedule just compiled is kept even if it alone exceeds the cap
+    _compile(cache, 'large', 1000)
+    assert os.listdir(str(tmp_path)) == ['large']
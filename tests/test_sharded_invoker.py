@@ -0,0 +1,39 @@
+from synthetic_workload_invoker.sharded_invoker import split_instances
+
+
+def _workload(rates):
+    return {'test_duration_in_seconds': 10,
+            'instances': {'i%d' % i: {'application': 'a', 'distribution': 'Poisson',
+                                      'rate': rate}
+                          for (i, rate) in enumerate(rates)}}
+
+
+def _rates(workload, group):
+    return sum(workload['instances'][instance]['rate'] for instance in group)
+
+
+def test_shard_rates_add_up_to_workload():
+    workload = _workload([100, 80, 60, 40, 20, 10, 5])
+    groups = split_instances(workload, 3)
+    assert len(groups) == 3
+    assert sum(_rates(workload, g) for g in groups) == 315
+    assert sorted(i for g in groups for i in g) == sorted(workload['instances'])
+    # Heaviest first into the least loaded shard
+    assert sorted(_rates(workload, g) for g in groups) == [100, 105, 110]
+
+
+def test_more_shards_than_instances():
+    workload = _workload([5, 50])
+    groups = split_instances(workload, 8)
+    assert len(groups) == 2
+    assert sorted(i for g in groups for i in g) == ['i0', 'i1']
+    assert all(len(g) == 1 for g in groups)
+
+
+def test_phases_and_closed_loop_instances_are_balanced():
+    workload = _workload([10, 10])
+    workload['instances']['loop'] = {'application': 'a', 'concurrency': [1, 4]}
+    workload['phases'] = [{'type': 'burst', 'size': 500, 'instances': ['i0']}]
+    groups = split_instances(workload, 2)
+    assert sorted(i for g in groups for i in g) == ['i0', 'i1', 'loop']
+    assert ['i0'] in groups
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from synthetic_workload_invoker import trace_replay
+from synthetic_workload_invoker.trace_replay import trace_event_stream
+
+TIMESTAMPS = """timestamp,function
+100.0,f
+100.5,g
+101.0,f
+102.0,f
+104.0,f
+"""
+
+COUNTS = """owner,function,1,2,3
+o,f,2,0,3
+o,g,1,1,1
+"""
+
+
+def _events(trace, duration, seed=1):
+    chunks = list(trace_event_stream(np.random.default_rng(seed), trace, duration))
+    return np.concatenate(chunks) if chunks else np.empty(0)
+
+
+@pytest.fixture
+def timestamps(tmp_path):
+    path = tmp_path / 'timestamps.csv'
+    path.write_text(TIMESTAMPS)
+    return str(path)
+
+
+@pytest.fixture
+def counts(tmp_path):
+    path = tmp_path / 'counts.csv'
+    path.write_text(COUNTS)
+    return str(path)
+
+
+def test_timestamps(timestamps):
+    events = _events({'file': timestamps}, 10)
+    assert list(events) == [0.0, 0.5, 1.0, 2.0, 4.0]
+
+    events = _events({'file': timestamps, 'function': 'f'}, 10)
+    assert list(events) == [0.0, 1.0, 2.0, 4.0]
+
+    # Events at or after the test duration are not replayed
+    assert list(_events({'file': timestamps}, 2)) == [0.0, 0.5, 1.0]
+
+
+def test_timestamps_in_batches(timestamps, monkeypatch):
+    monkeypatch.setattr(trace_replay, 'READ_ROWS', 2)
+    chunks = list(trace_event_stream(np.random.default_rng(1),
+                                     {'file': timestamps}, 3))
+    assert [list(c) for c in chunks] == [[0.0, 0.5], [1.0, 2.0]]
+
+
+def test_timestamps_unit_and_origin(tmp_path, timestamps):
+    path = tmp_path / 'ms.csv'
+    path.write_text("ts\n1000\n1250\n3000\n")
+    events = _events({'file': str(path), 'timestamp_column': 'ts',
+                      'timestamp_unit': 'ms'}, 10)
+    assert list(events) == [0.0, 0.25, 2.0]
+
+    # Invocations before the origin are skipped
+    events = _events({'file': timestamps, 'origin': 101.0}, 10)
+    assert list(events) == [0.0, 1.0, 3.0]
+
+
+def test_timestamps_time_scale(timestamps):
+    events = _events({'file': timestamps, 'time_scale': 2}, 10)
+    assert list(events) == [0.0, 0.25, 0.5, 1.0, 2.0]
+
+
+def test_timestamps_rate_multiplier(timestamps):
+    events = _events({'file': timestamps, 'rate_multiplier': 2}, 10)
+    assert list(events) == [0.0, 0.0, 0.5, 0.5, 1.0, 1.0, 2.0, 2.0, 4.0, 4.0]
+
+    # A fractional multiplier keeps each invocation once or twice
+    events = _events({'file': timestamps, 'rate_multiplier': 1.5}, 10)
+    assert set(events) == {0.0, 0.5, 1.0, 2.0, 4.0}
+    assert 5 <= len(events) <= 10
+
+    assert len(_events({'file': timestamps, 'rate_multiplier': 0}, 10)) == 0
+
+
+def test_counts(counts):
+    events = _events({'file': counts, 'format': 'counts', 'function': 'f',
+                      'bin_seconds': 10}, 30)
+    assert len(events) == 5
+    assert np.all(np.diff(events) >= 0)
+    assert np.sum(events < 10) == 2
+    assert np.sum(events >= 20) == 3
+
+    # The counts of several functions are summed per bin
+    events = _events({'file': counts, 'format': 'counts', 'bin_seconds': 10}, 30)
+    assert np.histogram(events, bins=[0, 10, 20, 30])[0].tolist() == [3, 1, 4]
+
+
+def test_counts_time_scale_and_origin(counts):
+    # Bins of 10 seconds replayed in 1 second, from the second bin on
+    events = _events({'file': counts, 'format': 'counts', 'function': 'g',
+                      'bin_seconds': 10, 'time_scale': 10, 'origin': 10}, 5)
+    assert len(events) == 2
+    assert np.histogram(events, bins=[0, 1, 2])[0].tolist() == [1, 1]
+
+    # The test duration cuts the replay within a bin
+    events = _events({'file': counts, 'format': 'counts', 'function': 'g',
+                      'bin_seconds': 10}, 5)
+    assert len(events) <= 1
+    assert np.all(events < 5)
+
+
+def test_counts_rate_multiplier(counts):
+    events = _events({'file': counts, 'format': 'counts', 'function': 'f',
+                      'bin_seconds': 10, 'rate_multiplier': 3}, 30)
+    assert np.histogram(events, bins=[0, 10, 20, 30])[0].tolist() == [6, 0, 9]
+
+
+def test_reproducible(counts):
+    trace = {'file': counts, 'format': 'counts', 'bin_seconds': 10}
+    assert list(_events(trace, 30, seed=3)) == list(_events(trace, 30, seed=3))
@@ -0,0 +1,75 @@
+import pytest
+
+from commons import util
+
+WSKPROPS = """# wsk CLI properties
+APIHOST=172.17.0.1
+AUTH=23bc46b1-71f6-4ed5-8c54-816aa4f8c502:123zO3xZCLrMN6v2BKK1dXYFpXlPkccOFqm12CdAsMgRU4VrNZ9lyGVCGuMDGIwP
+NAMESPACE = guest
+
+INSECURE_SSL=true
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    util.read_wsk_properties.cache_clear()
+    util.git_commit_hash.cache_clear()
+    yield
+    util.read_wsk_properties.cache_clear()
+    util.git_commit_hash.cache_clear()
+
+
+def test_read_wsk_properties(tmp_path):
+    path = tmp_path / '.wskprops'
+    path.write_text(WSKPROPS)
+    props = util.read_wsk_properties(str(path))
+    assert props == {'apihost': '172.17.0.1',
+                     'auth': '23bc46b1-71f6-4ed5-8c54-816aa4f8c502:123zO3xZCLrMN6v2BKK1dXYFpXlPkccOFqm12CdAsMgRU4VrNZ9lyGVCGuMDGIwP',
+                     'namespace': 'guest'}
+
+
+def test_read_wsk_properties_from_environment(tmp_path, monkeypatch):
+    path = tmp_path / 'wskprops'
+    path.write_text("APIHOST=localhost\nAUTH=a:b\n")
+    monkeypatch.setenv('WSK_CONFIG_FILE', str(path))
+    props = util.read_wsk_properties()
+    assert props['apihost'] == 'localhost'
+    assert props['namespace'] == '_'
+
+
+def test_read_wsk_properties_missing(tmp_path):
+    path = str(tmp_path / 'missing')
+    with pytest.raises(Exception, match='Cannot read wsk properties file'):
+        util.read_wsk_properties(path)
+    (tmp_path / 'incomplete').write_text("APIHOST=localhost\n")
+    with pytest.raises(Exception, match='No AUTH property'):
+        util.read_wsk_properties(str(tmp_path / 'incomplete'))
+
+
+def test_git_commit_hash_from_ref(tmp_path):
+    git_dir = tmp_path / '.git'
+    (git_dir / 'refs' / 'heads').mkdir(parents=True)
+    (git_dir / 'HEAD').write_text('ref: refs/heads/master\n')
+    (git_dir / 'refs' / 'heads' / 'master').write_text('a' * 40 + '\n')
+    assert util.git_commit_hash(str(tmp_path)) == 'a' * 40
+
+
+def test_git_commit_hash_from_packed_refs(tmp_path):
+    git_dir = tmp_path / '.git'
+    git_dir.mkdir()
+    (git_dir / 'HEAD').write_text('ref: refs/heads/main\n')
+    (git_dir / 'packed-refs').write_text('# pack-refs with: peeled\n' +
+                                         'b' * 40 + ' refs/heads/main\n')
+    assert util.git_commit_hash(str(tmp_path)) == 'b' * 40
+
+
+def test_git_commit_hash_detached(tmp_path):
+    (tmp_path / '.git').mkdir()
+    (tmp_path / '.git' / 'HEAD').write_text('c' * 40 + '\n')
+    assert util.git_commit_hash(str(tmp_path)) == 'c' * 40
+
+
+def test_git_commit_hash_outside_a_repository(tmp_path, monkeypatch):
+    monkeypatch.setenv('GIT_CEILING_DIRECTORIES', str(tmp_path))
+    assert util.git_commit_hash(str(tmp_path)) == 'unknown'
@@ -0,0 +1,253 @@
+# Copyright (c) 2019 Princeton University
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Local
+from GenConfigs import *
+from commons import util
+
+MANIFEST_FILE = 'store.json'
+SCHEMA_FILE = 'schema.json'
+
+# Activation records are only written to CouchDB when they complete, so an
+# activation may show up after activations which started later. Every sync
+# therefore reads again the activations which started up to this many
+# milliseconds (OpenWhisk's maximum action timeout) before the latest
+# stored one.
+SYNC_OVERLAP_MS = 5 * 60 * 1000
+
+# Segments are merged into one when there are more than this many
+MAX_SEGMENTS = 32
+
+NUMERIC_COLUMNS = {
+    'start': np.dtype('i8'),
+    'end': np.dtype('i8'),
+    'duration': np.dtype('i8'),
+    'waitTime': np.dtype('i8'),
+    'initTime': np.dtype('i8'),
+    'latency': np.dtype('i8'),
+}
+# Columns stored as codes into a list of their distinct values
+DICTIONARY_COLUMNS = ['func_name', 'lang', 'runid']
+COLUMNS = ['func_name', 'activationId', 'start', 'end', 'duration',
+           'waitTime', 'initTime', 'latency', 'lang', 'runid']
+
+
+class ActivationStore:
+    """
+    A local, columnar copy of the activation records of the tests, keyed
+    by activationId, so that tests can be analyzed and compared again
+    without reading CouchDB. The store is a directory of segments, each
+    holding one flat binary file per column (activationId as fixed width
+    bytes, func_name, lang and runid as codes into a list of distinct
+    values kept in the segment's schema.json). store.json lists the
+    segments with their number of activations and range of start times,
+    so reads skip the segments outside the requested time range, and the
+    earliest start time synced from CouchDB.
+    """
+
+    def __init__(self, path=ACTIVATION_STORE_DIR):
+        self.path = util.ensure_directory_exists(path)
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {'segments': [], 'next_segment': 0, 'max_start': None,
+                             'synced_since': None}
+
+    def _write_manifest(self):
+        tmp = os.path.join(self.path, MANIFEST_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(self.manifest))
+        os.replace(tmp, os.path.join(self.path, MANIFEST_FILE))
+
+    def count(self):
+        """
+        Returns the number of stored activations.
+        """
+        return sum(segment['count'] for segment in self.manifest['segments'])
+
+    def sync_start(self, since):
+        """
+        Returns the start time (in milliseconds) from which activations
+        are read from CouchDB by the next sync, which must cover the
+        activations since the given tick. Only the activations after the
+        stored ones are read, unless since precedes the synced range.
+        """
+        synced_since = self.manifest.get('synced_since')
+        if synced_since is None or since < synced_since:
+            return since
+        if self.manifest['max_start'] is None:
+            return synced_since
+        return max(synced_since, self.manifest['max_start'] - SYNC_OVERLAP_MS)
+
+    def synced(self, since):
+        """
+        Records that the activations since the given tick have been
+        synced from CouchDB.
+        """
+        synced_since = self.manifest.get('synced_since')
+        if synced_since is None or since < synced_since:
+            self.manifest['synced_since'] = since
+            self._write_manifest()
+
+    def _segment_columns(self, segment):
+        path = os.path.join(self.path, segment['name'])
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        columns = {name: np.memmap(os.path.join(path, name + '.bin'), dtype=dtype,
+                                   mode='r', shape=(schema['count'],))
+                   for (name, dtype) in schema['columns'].items()}
+        return (columns, schema['dictionaries'])
+
+    def _write_segment(self, columns, dictionaries):
+        """
+        Writes a segment from column arrays and adds it to the manifest.
+        """
+        count = len(columns['start'])
+        name = 'segment_%d' % self.manifest['next_segment']
+        tmp = os.path.join(self.path, '.' + name)
+        util.ensure_directory_exists(tmp)
+        for (column, values) in columns.items():
+            values.tofile(os.path.join(tmp, column + '.bin'))
+        schema = {'count': count,
+                  'columns': {column: values.dtype.str for (column, values) in columns.items()},
+                  'dictionaries': dictionaries}
+        with open(os.path.join(tmp, SCHEMA_FILE), 'w') as f:
+            f.write(json.dumps(schema))
+        os.rename(tmp, os.path.join(self.path, name))
+
+        self.manifest['next_segment'] += 1
+        self.manifest['segments'].append({'name': name, 'count': count,
+                                          'min_start': int(columns['start'].min()),
+                                          'max_start': int(columns['start'].max())})
+        self.manifest['max_start'] = max(self.manifest['max_start'] or 0,
+                                         int(columns['start'].max()))
+
+    def append(self, df):
+        """
+        Adds the activations of a dataframe (with the columns of COLUMNS)
+        to the store as a new segment. Activations must not be stored
+        already, see activation_ids.
+        """
+        if len(df) == 0:
+            return
+        columns = {'activationId': np.array(df['activationId'], dtype=np.bytes_)}
+        for (column, dtype) in NUMERIC_COLUMNS.items():
+            columns[column] = df[column].to_numpy(dtype=dtype)
+        dictionaries = {}
+        for column in DICTIONARY_COLUMNS:
+            (values, codes) = np.unique(df[column].fillna('').astype(str), return_inverse=True)
+            columns[column] = codes.astype(np.uint32)
+            dictionaries[column] = values.tolist()
+        self._write_segment(columns, dictionaries)
+        if len(self.manifest['segments']) > MAX_SEGMENTS:
+            self.compact()
+        else:
+            self._write_manifest()
+
+    def compact(self):
+        """
+        Merges all segments into one, one segment and column at a time.
+        """
+        segments = self.manifest['segments']
+        if len(segments) <= 1:
+            return
+        name = 'segment_%d' % self.manifest['next_segment']
+        tmp = os.path.join(self.path, '.' + name)
+        util.ensure_directory_exists(tmp)
+
+        opened = [self._segment_columns(segment) for segment in segments]
+        dictionaries = {column: sorted(set(v for (_, d) in opened for v in d[column]))
+                        for column in DICTIONARY_COLUMNS}
+        id_width = max(columns['activationId'].dtype.itemsize for (columns, _) in opened)
+        dtypes = dict(NUMERIC_COLUMNS, activationId=np.dtype('S%d' % id_width),
+                      **{column: np.dtype('u4') for column in DICTIONARY_COLUMNS})
+        files = {column: open(os.path.join(tmp, column + '.bin'), 'wb') for column in dtypes.keys()}
+        for (columns, segment_dictionaries) in opened:
+            for column in dtypes.keys():
+                values = columns[column]
+                if column in DICTIONARY_COLUMNS:
+                    index = {v: i for (i, v) in enumerate(dictionaries[column])}
+                    recode = np.array([index[v] for v in segment_dictionaries[column]],
+                                      dtype=np.uint32)
+                    values = recode[values]
+                np.asarray(values, dtype=dtypes[column]).tofile(files[column])
+        for f in files.values():
+            f.close()
+
+        count = sum(segment['count'] for segment in segments)
+        schema = {'count': count,
+                  'columns': {column: dtype.str for (column, dtype) in dtypes.items()},
+                  'dictionaries': dictionaries}
+        with open(os.path.join(tmp, SCHEMA_FILE), 'w') as f:
+            f.write(json.dumps(schema))
+        os.rename(tmp, os.path.join(self.path, name))
+
+        self.manifest['next_segment'] += 1
+        self.manifest['segments'] = [{'name': name, 'count': count,
+                                      'min_start': min(s['min_start'] for s in segments),
+                                      'max_start': max(s['max_start'] for s in segments)}]
+        self._write_manifest()
+        for segment in segments:
+            shutil.rmtree(os.path.join(self.path, segment['name']), ignore_errors=True)
+
+    def read(self, runid=None, names=None, since=None, until=None, columns=None):
+        """
+        Returns the stored activations as a dataframe, optionally only
+        those of the test run with the given runid, of the functions in
+        names, or which started between since and until (inclusive, in
+        milliseconds). columns selects the columns to read.
+        """
+        columns = columns or COLUMNS
+        frames = []
+        for segment in self.manifest['segments']:
+            if since is not None and segment['max_start'] < since:
+                continue
+            if until is not None and segment['min_start'] > until:
+                continue
+            (data, dictionaries) = self._segment_columns(segment)
+
+            selected = np.ones(segment['count'], dtype=bool)
+            if since is not None:
+                selected &= data['start'] >= since
+            if until is not None:
+                selected &= data['start'] <= until
+            if runid is not None:
+                if runid not in dictionaries['runid']:
+                    continue
+                selected &= data['runid'] == dictionaries['runid'].index(runid)
+            if names is not None:
+                codes = [i for (i, v) in enumerate(dictionaries['func_name']) if v in names]
+                selected &= np.isin(data['func_name'], codes)
+            if not selected.any():
+                continue
+
+            frame = {}
+            for column in columns:
+                values = data[column][selected]
+                if column in DICTIONARY_COLUMNS:
+                    values = np.array(dictionaries[column], dtype=object)[values]
+                elif column == 'activationId':
+                    values = values.astype(str)
+                frame[column] = values
+            frames.append(pd.DataFrame(frame))
+
+        if len(frames) == 0:
+            return pd.DataFrame({column: [] for column in columns})
+        return pd.concat(frames, ignore_index=True)
+
+    def activation_ids(self, since=None):
+        """
+        Returns the set of the stored activationIds, optionally only of
+        the activations which started since the given tick.
+        """
+        return set(self.read(since=since, columns=['activationId'])['activationId'])
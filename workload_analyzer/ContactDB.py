@@ -3,9 +3,11 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-import json
 import os
-from .wskutil import request
+import queue
+import threading
+import time
+from .CouchClient import CouchClient
 
 # Local
 from GenConfigs import *
@@ -13,17 +15,56 @@ from GenConfigs import *
 DB_CONFIG_FILE = os.path.expanduser(
     os.path.join(OPENWHISK_PATH, 'ansible', 'db_local.ini'))
 
+# Number of activation records fetched per _find request
+PAGE_SIZE = 2000
+
+# Seconds to wait for the threads of a parallel fetch to stop once it
+# ends. Threads still waiting for CouchDB are daemons and left behind.
+JOIN_TIMEOUT = 5.0
+
+# Fields of activation records used by the workload analyzer
+ANALYZER_FIELDS = ['_id', 'name', 'start', 'end', 'duration', 'annotations']
+RESULT_FIELDS = ['response.result']
+RUNID_FIELDS = ['response.result.testid']
+
+# JSON indexes on activation records used by the _find queries, all kept
+# in one design document
+INDEX_DDOC = 'faas-profiler'
+ACTIVATION_INDEXES = {
+    'start': ['start'],
+    'start-name': ['start', 'name'],
+}
+
+ACTIVATIONS_DB = 'whisk_local_activations'
+
+# Warning CouchDB returns with the results of a _find query which no
+# index could answer, i.e. which scanned the whole database
+FULL_SCAN_WARNING = 'No matching index found'
+
+# DB configs and client, created on first use
+_db_configs = None
+_client = None
+
 # Examples:
 # print(GetDBConfigs())
 # print(GetActivation(activation_id='e107e05a84cf469c87e05a84cf669c16', namespace='guest'))
 # print(GetActivationRecordsSince(1536032293317, 100))
 # print(GetActivationIDsSince(1536032293317, 100))
+# for page in GetActivationPagesSince(1536032293317, fields=ANALYZER_FIELDS):
+#     print(len(page))
+# print(EnsureActivationIndexes())
+# for page in GetActivationPagesSince(1536032293317, slices=8):
+#     print(len(page))
 
 
 def GetDBConfigs():
     """
-    Retrieves DB configs from a configuration file.
+    Retrieves DB configs from a configuration file. The file is only read
+    once.
     """
+    global _db_configs
+    if _db_configs is not None:
+        return _db_configs
     configs = {}
     with open(DB_CONFIG_FILE, 'r') as config_file:
         lines = config_file.readlines()
@@ -39,71 +80,271 @@ def GetDBConfigs():
                     continue
                 configs[last_dom][key] = line[line.index('=')+1:-1]
 
-    return configs['db_creds']
+    _db_configs = configs['db_creds']
+    return _db_configs
+
+
+def GetClient():
+    """
+    Returns the CouchDB client shared by all queries.
+    """
+    global _client
+    if _client is None:
+        _client = CouchClient(GetDBConfigs())
+    return _client
+
+
+def _Checked(doc):
+    if 'error' in doc.keys():
+        raise Exception('DB error: ' + str(doc['error']) + ': ' +
+                        str(doc.get('reason')))
+    return doc
+
+
+def GetActivationIndexes():
+    """
+    Returns the fields of the JSON indexes on activation records by index
+    name, for the indexes of the analyzer's design document.
+    """
+    doc = _Checked(GetClient().request('GET', ACTIVATIONS_DB + '/_index'))
+
+    indexes = {}
+    for index in doc['indexes']:
+        if index['ddoc'] == '_design/' + INDEX_DDOC:
+            indexes[index['name']] = [list(field.keys())[0]
+                                      for field in index['def']['fields']]
+    return indexes
+
+
+def EnsureActivationIndexes():
+    """
+    Creates the JSON indexes of ACTIVATION_INDEXES which do not exist yet.
+    Returns the state ('exists' or 'created') of every index by name.
+    """
+    existing = GetActivationIndexes()
+    report = {}
+    for (name, fields) in ACTIVATION_INDEXES.items():
+        if existing.get(name) == fields:
+            report[name] = 'exists'
+            continue
+        body = {
+            "index": {
+                "fields": fields
+            },
+            "ddoc": INDEX_DDOC,
+            "name": name,
+            "type": "json"
+        }
+        _Checked(GetClient().request('POST', ACTIVATIONS_DB + '/_index', body))
+        report[name] = 'created'
+
+    return report
 
 
 def GetAllActivationDocs():
     """
     Returns all activation record keys.
     """
-    configs = GetDBConfigs()
-    url = configs['db_protocol']+'://'+configs['db_host']+':' + \
-        configs['db_port']+'/'+'whisk_local_activations/_all_docs'
-    headers = {
-        'Content-Type': 'application/json',
-    }
-    res = request('GET', url, headers=headers, auth='%s:%s' %
-                  (configs['db_username'], configs['db_password']))
-
-    return json.loads(res.read())
+    return GetClient().request('GET', ACTIVATIONS_DB + '/_all_docs')
 
 
 def GetActivationRecordsSince(since, limit=100):
     """
     Returns details on activation records since a given tick in milliseconds
     """
-    configs = GetDBConfigs()
-    url = configs['db_protocol']+'://'+configs['db_host']+':' + \
-        configs['db_port']+'/'+'whisk_local_activations/_find'
-    headers = {
-        'Content-Type': 'application/json',
+    body = {
+        "selector": {
+            "start": {
+                "$gte": since
+            }
+        },
+        "limit": limit,
+        "use_index": [INDEX_DDOC, 'start']
+    }
+
+    return GetClient().request('POST', ACTIVATIONS_DB + '/_find', body)
+
+
+def GetActivationPages(selector, fields=None, page_size=PAGE_SIZE,
+                       use_index=None, warn=None):
+    """
+    Yields the activation records matching a Mango selector page by page.
+    Each request continues from the bookmark of the previous page, so all
+    matching records are read without holding them in memory at once and
+    without a server-side limit truncating the result. If fields is given,
+    only these fields of the records are returned. If use_index is given,
+    the query is run on that index of ACTIVATION_INDEXES. The first warning
+    CouchDB returns with the results is passed to warn, and reported as a
+    full scan of the database only if it says that no index was used.
+    """
+    body = {
+        "selector": selector,
+        "limit": page_size
     }
+    if fields is not None:
+        body['fields'] = fields
+    if use_index is not None:
+        body['use_index'] = [INDEX_DDOC, use_index]
+
+    warned = False
+    while True:
+        page = _Checked(GetClient().request('POST', ACTIVATIONS_DB + '/_find', body))
+        if 'warning' in page.keys() and warn is not None and not warned:
+            if FULL_SCAN_WARNING in page['warning']:
+                warn('Activation query fell back to a full scan: ' + page['warning'])
+            else:
+                warn('CouchDB warning on activation query: ' + page['warning'])
+            warned = True
+        if len(page['docs']) > 0:
+            yield page['docs']
+        if len(page['docs']) < page_size:
+            return
+        body['bookmark'] = page['bookmark']
+
+
+def _ActivationStartBound(since, order):
     body = {
         "selector": {
             "start": {
                 "$gte": since
             }
         },
-        "limit": limit
+        "fields": ["start"],
+        "sort": [{"start": order}],
+        "limit": 1,
+        "use_index": [INDEX_DDOC, 'start']
     }
+    docs = _Checked(GetClient().request('POST', ACTIVATIONS_DB + '/_find', body))['docs']
+
+    return docs[0]['start'] if len(docs) > 0 else None
+
+
+def GetEarliestActivationStart(since):
+    """
+    Returns the start of the earliest activation record since a given tick
+    in milliseconds, or None if there is none.
+    """
+    return _ActivationStartBound(since, "asc")
+
 
-    res = request('POST', url, body=json.dumps(body), headers=headers,
-                  auth='%s:%s' % (configs['db_username'], configs['db_password']))
+def GetLatestActivationStart(since):
+    """
+    Returns the start of the latest activation record since a given tick
+    in milliseconds, or None if there is none.
+    """
+    return _ActivationStartBound(since, "desc")
+
+
+def GetActivationPagesParallel(selector, since, until, slices, fields=None,
+                               page_size=PAGE_SIZE, use_index=None, warn=None):
+    """
+    Yields the activation records matching a Mango selector which started
+    between since and until (both inclusive, in milliseconds) page by page.
+    The time range is split into slices of equal length, which are fetched
+    concurrently, each on its own connection. Pages are yielded in the
+    order they arrive. At most two pages per slice are buffered.
+    """
+    bounds = [since + (until + 1 - since) * i // slices for i in range(slices)]
+    bounds.append(until + 1)
+    pages = queue.Queue(maxsize=2 * slices)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        # Returns False once the consumer has stopped reading
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch(start, end):
+        try:
+            slice_selector = dict(selector, start={"$gte": start, "$lt": end})
+            for page in GetActivationPages(slice_selector, fields=fields,
+                                           page_size=page_size,
+                                           use_index=use_index, warn=warn):
+                if not put(page):
+                    return
+            put(done)
+        except Exception as e:
+            put(e)
+        finally:
+            GetClient().close()
 
-    return json.loads(res.read())
+    threads = [threading.Thread(target=fetch, args=(bounds[i], bounds[i + 1]), daemon=True)
+               for i in range(slices) if bounds[i] < bounds[i + 1]]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining > 0:
+            page = pages.get()
+            if page is done:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        stopped.set()
+        deadline = time.monotonic() + JOIN_TIMEOUT
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def GetActivationPagesSince(since, fields=None, page_size=PAGE_SIZE,
+                            names=None, warn=None, slices=1, until=None,
+                            runid=None):
+    """
+    Yields the activation records since a given tick in milliseconds page
+    by page, optionally only those which started until a given tick, of
+    the functions in names, or of the test run with the given runid (as
+    echoed by the functions in the testid of their results). With more
+    than one slice, the time range from the earliest activation up to until
+    or the latest activation is fetched in that many concurrent slices.
+    """
+    selector = {"start": {"$gte": since}}
+    use_index = 'start'
+    if until is not None:
+        selector['start']['$lte'] = until
+    if names is not None:
+        selector['name'] = {"$in": names}
+        use_index = 'start-name'
+    if runid is not None:
+        selector['response.result.testid'] = runid
+    if slices <= 1:
+        return GetActivationPages(selector, fields=fields, page_size=page_size,
+                                  use_index=use_index, warn=warn)
+    # Slices are only spread over the range which holds activations, so
+    # that a since far in the past does not leave all but one slice empty
+    first = GetEarliestActivationStart(since)
+    if until is None:
+        until = GetLatestActivationStart(since)
+    if first is None or until is None or first > until:
+        return iter([])
+    since = first
+    return GetActivationPagesParallel(selector, since, until, slices, fields=fields,
+                                      page_size=page_size, use_index=use_index,
+                                      warn=warn)
 
 
 def GetActivationIDsSince(since, limit=100):
     """
     Returns the activation IDs (including the namespace)
     """
-    configs = GetDBConfigs()
-    url = configs['db_protocol']+'://'+configs['db_host']+':' + \
-        configs['db_port']+'/'+'whisk_local_activations/_find'
-    headers = {
-        'Content-Type': 'application/json',
-    }
     body = {
         "selector": {
             "start": {
                 "$gte": since
             }
         },
-        "limit": limit
+        "limit": limit,
+        "use_index": [INDEX_DDOC, 'start']
     }
-    res = request('POST', url, body=json.dumps(body), headers=headers,
-                  auth='%s:%s' % (configs['db_username'], configs['db_password']))
-    doc = json.loads(res.read())
+    doc = GetClient().request('POST', ACTIVATIONS_DB + '/_find', body)
     IDs = [x['_id'] for x in doc["docs"]]
 
     return IDs
@@ -113,13 +354,4 @@ def GetActivation(activation_id, namespace='guest'):
     """
     Returns details for an activation id.
     """
-    configs = GetDBConfigs()
-    url = configs['db_protocol']+'://'+configs['db_host']+':'+configs['db_port'] + \
-        '/'+'whisk_local_activations'+'/'+namespace+'%2F'+activation_id
-    headers = {
-        'Content-Type': 'application/json',
-    }
-    res = request('GET', url, headers=headers, auth='%s:%s' %
-                  (configs['db_username'], configs['db_password']))
-
-    return json.loads(res.read())
+    return GetClient().request('GET', ACTIVATIONS_DB + '/' + namespace + '%2F' + activation_id)
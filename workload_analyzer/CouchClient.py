@@ -0,0 +1,80 @@
+# Copyright (c) 2019 Princeton University
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import base64
+import gzip
+import json
+import ssl
+import threading
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+
+
+class CouchClient:
+    """
+    A CouchDB client keeping one persistent (keep-alive) connection per
+    thread and asking for gzip compressed responses. It can be shared by
+    threads fetching concurrently.
+    """
+
+    def __init__(self, configs, timeout=60):
+        self.protocol = configs['db_protocol']
+        self.netloc = configs['db_host'] + ':' + configs['db_port']
+        self.timeout = timeout
+        credentials = '%s:%s' % (configs['db_username'], configs['db_password'])
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip',
+            'Authorization': 'Basic ' + base64.b64encode(
+                credentials.encode()).decode(),
+        }
+        self.local = threading.local()
+
+    def _connect(self):
+        if self.protocol == 'http':
+            return HTTPConnection(self.netloc, timeout=self.timeout)
+        return HTTPSConnection(self.netloc, timeout=self.timeout,
+                               context=ssl._create_unverified_context())
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn
+
+    def close(self):
+        """
+        Closes the connection of the calling thread.
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def request(self, method, path, body=None):
+        """
+        Sends a request for path (relative to the server) and returns the
+        decoded JSON response. Error responses of CouchDB are returned
+        as they are, i.e. with an 'error' and a 'reason' key.
+        """
+        data = json.dumps(body) if body is not None else None
+        # A kept-alive connection may have been closed by the server in
+        # the meantime, so a failed request is retried once on a new one
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, '/' + path, body=data, headers=self.headers)
+                res = conn.getresponse()
+                content = res.read()
+                break
+            except (HTTPException, ConnectionError):
+                self.close()
+                if attempt > 0:
+                    raise
+        if res.getheader('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        try:
+            return json.loads(content)
+        except ValueError:
+            return {'error': 'invalid_response', 'reason': 'HTTP status ' + str(res.status)}
@@ -16,11 +16,20 @@ from typing import Dict, List, Any
 
 # Local
 from GenConfigs import *
-from .ContactDB import GetActivationRecordsSince
+from .ActivationStore import ActivationStore
+from .ContactDB import ANALYZER_FIELDS, RESULT_FIELDS, RUNID_FIELDS, \
+    EnsureActivationIndexes, GetActivationPagesSince
 from .Logger import ScriptLogger
 from .PerfMonAnalyzer import *
 from .TestDataframePlotting import *
 
+# Time (in milliseconds) after the end of a test run until which its
+# activations may still start, e.g. when queued by the platform
+RUN_END_MARGIN_MS = 5 * 60 * 1000
+
+# Number of activations written to the activation store at a time
+STORE_SEGMENT_ROWS = 262144
+
 logger = ScriptLogger(loggername='workload_analyzer',
                       filename=FAAS_ROOT+'/logs/WA.log')
 
@@ -43,6 +52,25 @@ def get_test_metadata():
         raise e
 
 
+def get_run_metadata(path):
+    """
+    Returns the start time, config file, end time and runid of a test run
+    from the test_metadata.json written by SWI. path is the metadata file
+    or the result directory of the run.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, 'test_metadata.json')
+    try:
+        with open(path) as f:
+            metadata = json.load(f)
+    except (OSError, JSONDecodeError) as e:
+        logger.error("Error reading the test metadata!")
+        raise e
+    print('Invocations by Workload Invoker :' + str(metadata['expected']))
+    return metadata['start_time'], metadata['test_config'], \
+        metadata.get('end_time'), metadata['runid']
+
+
 def extract_extra_annotations(json_annotations_data):
     """
     Extracts deep information from activation json record.
@@ -77,23 +105,29 @@ def construct_config_dataframe(config_file):
     return [workload['test_name'], pd.DataFrame(workload['instances']).transpose()]
 
 
-def construct_test_dataframe(since, limit=1000, read_results=False):
+def run_id_of(activation):
     """
-    Constructs a dataframe for the performance information of all invocations.
+    Returns the runid echoed as testid in the result of an activation, or
+    None.
+    """
+    try:
+        return activation['response']['result']['testid']
+    except (KeyError, TypeError):
+        return None
+
+
+def construct_page_dataframe(activations, read_results=False, read_runids=False):
+    """
+    Constructs a dataframe for the performance information of a page of
+    activation records.
     """
     perf_data: Dict[str, List[Any]] = {'func_name': [],
                                        'activationId': [], 'start': [], 'end': [ ], 'duration': [],
                                        'waitTime': [], 'initTime': [], 'latency': [], 'lang': []}
     if read_results:
         perf_data['results'] = []
-
-    activations = GetActivationRecordsSince(since=since, limit=limit)
-    if 'error' in activations.keys():
-        logger.error('DB error: ' + activations['reason'])
-        raise Exception('Encountered an error getting data from the DB!'
-                        'Check the logs for more info.')
-
-    activations = activations['docs']
+    if read_runids:
+        perf_data['runid'] = []
 
     for activation in activations:
         if 'invokerHealthTestAction' in activation['name']:
@@ -112,11 +146,106 @@ def construct_test_dataframe(since, limit=1000, read_results=False):
             perf_data['duration'][-1]+perf_data['waitTime'][-1])
         if read_results:
             perf_data['results'].append(activation['response']['result'])
+        if read_runids:
+            perf_data['runid'].append(run_id_of(activation))
         # perf_data['statusCode'].append(activation['response']['statusCode'])
 
     return pd.DataFrame(perf_data)
 
 
+def construct_test_dataframe(since, limit=None, read_results=False, slices=1,
+                             until=None, runid=None):
+    """
+    Constructs a dataframe for the performance information of all invocations.
+    Activation records are fetched page by page, reading only the fields
+    the analyzer uses, and each page is converted before the next one is
+    fetched. If limit is given, at most limit records are read. With more
+    than one slice, the test's time range is split into that many slices
+    which are fetched concurrently. If until is given, only activations
+    which started until then are read, and if runid is given, only those
+    of the test run with that runid. If none of them carries the runid
+    (i.e. the functions do not echo the testid), all activations between
+    since and until are read instead.
+    """
+    fields = ANALYZER_FIELDS + RESULT_FIELDS if read_results else ANALYZER_FIELDS
+    frames = []
+    count = 0
+    try:
+        for (name, state) in EnsureActivationIndexes().items():
+            logger.info('Activation index ' + name + ': ' + state)
+        for page in GetActivationPagesSince(since=since, fields=fields,
+                                            warn=logger.warning, slices=slices,
+                                            until=until, runid=runid):
+            if limit is not None:
+                page = page[:limit - count]
+            frames.append(construct_page_dataframe(page, read_results))
+            count += len(page)
+            if limit is not None and count >= limit:
+                break
+    except Exception as e:
+        logger.error(str(e))
+        raise Exception('Encountered an error getting data from the DB!'
+                        'Check the logs for more info.')
+
+    if len(frames) == 0:
+        if runid is not None:
+            logger.warning('No activations carry the runid ' + runid +
+                           ', reading all activations of the run\'s time range')
+            return construct_test_dataframe(since, limit, read_results, slices,
+                                            until=until)
+        return construct_page_dataframe([], read_results)
+    return pd.concat(frames, ignore_index=True)
+
+
+
+def sync_activation_store(store, since, slices=1):
+    """
+    Adds the activations stored in CouchDB since the last sync to the local
+    activation store. The first sync starts at since, the start of the
+    analyzed test, rather than copying the whole history. Activations
+    which are already stored are skipped.
+    """
+    start = store.sync_start(since)
+    known = store.activation_ids(since=start)
+    frames = []
+    rows = added = 0
+    try:
+        for (name, state) in EnsureActivationIndexes().items():
+            logger.info('Activation index ' + name + ': ' + state)
+        for page in GetActivationPagesSince(since=start,
+                                            fields=ANALYZER_FIELDS + RUNID_FIELDS,
+                                            warn=logger.warning, slices=slices):
+            page_df = construct_page_dataframe(page, read_runids=True)
+            page_df = page_df[~page_df['activationId'].isin(known)]
+            frames.append(page_df)
+            rows += len(page_df)
+            if rows >= STORE_SEGMENT_ROWS:
+                store.append(pd.concat(frames, ignore_index=True))
+                (frames, added, rows) = ([], added + rows, 0)
+    except Exception as e:
+        logger.error(str(e))
+        raise Exception('Encountered an error getting data from the DB!'
+                        'Check the logs for more info.')
+    if rows > 0:
+        store.append(pd.concat(frames, ignore_index=True))
+        added += rows
+    store.synced(since)
+    logger.info('Activation store: ' + str(added) + ' activations added, ' +
+                str(store.count()) + ' stored')
+
+
+def read_store_dataframe(store, since, until=None, runid=None):
+    """
+    Reads the performance information of the invocations of a test from
+    the activation store, like construct_test_dataframe.
+    """
+    test_df = store.read(runid=runid, since=since, until=until)
+    if len(test_df) == 0 and runid is not None:
+        logger.warning('No activations carry the runid ' + runid +
+                       ', reading all activations of the run\'s time range')
+        test_df = store.read(since=since, until=until)
+    return test_df.drop(columns=['runid'])
+
 
 def create_statistical_summary(test_df, config_df, test_start_time):
     """
@@ -247,7 +376,14 @@ def main(options):
     logger.info("Workload Analyzer started")
     print("Log file -> logs/WA.log")
 
-    test_start_time, config_file = get_test_metadata()
+    test_end_time = runid = None
+    if options.run_metadata:
+        test_start_time, config_file, test_end_time, runid = \
+            get_run_metadata(options.run_metadata)
+        if test_end_time is not None:
+            test_end_time += RUN_END_MARGIN_MS
+    else:
+        test_start_time, config_file = get_test_metadata()
     if FAAS_ROOT in config_file:
         [test_name, config_df] = construct_config_dataframe(config_file)
     else:
@@ -255,8 +391,19 @@ def main(options):
             FAAS_ROOT + '/' + config_file)
 
     read_results = True if options.read_results else False
-    test_df = construct_test_dataframe(since=test_start_time, limit=100000,
-                                     read_results=read_results)
+    if options.store and read_results:
+        logger.warning('The activation store holds no results, reading from CouchDB')
+    if options.store and not read_results:
+        store = ActivationStore()
+        sync_activation_store(store, since=test_start_time,
+                              slices=options.parallel or 1)
+        test_df = read_store_dataframe(store, since=test_start_time,
+                                       until=test_end_time, runid=runid)
+    else:
+        test_df = construct_test_dataframe(since=test_start_time,
+                                           read_results=read_results,
+                                           slices=options.parallel or 1,
+                                           until=test_end_time, runid=runid)
     if (test_df is None):
         logger.error('Test result dataframe could not be constructed!')
         return False